@@ -1,21 +1,36 @@
-from flask import Flask, request, jsonify
-from flask_login import LoginManager
+from flask import Flask, request, jsonify, Response, stream_with_context, g
+from flask_login import LoginManager, current_user
 from flask_cors import CORS
 from models.lstm_model import StockPredictor
-from utils.metrics import MetricsManager
-from utils.logger_config import setup_logging
+from models.serving import inference_pool, InferenceQueueFull, InferenceTimeout
+from models.registry import model_registry
+from utils.metrics import MetricsManager, model_quality
+from utils.logger_config import setup_logging, get_logging_stats
+from utils.log_reader import log_reader, MAX_TAIL_LINES
+from utils.instrumentation import init_instrumentation
+from utils.tracing import init_tracing, get_spans, timing_requested
+from utils.profiler import profiler
+from utils.memory import memory_monitor, current_rss
+from utils.health import health_checks
 from database.db import db, migrate
+from database.market_data import HistoricalDataCache
 from models.user import User
 import logging
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 from sqlalchemy import text
 import yfinance as yf
 import os
 import json
+import multiprocessing
 from auth.routes import auth, login_manager
 from auth.api_keys import api_keys
+from auth.key_cache import last_used_tracker, key_cache
+from auth.user_cache import user_cache
+from auth.middleware import require_api_key
+from auth.password_hasher import password_hasher
 from dotenv import load_dotenv
-from background.tasks import init_background_tasks
+from background.tasks import BackgroundTaskManager
+from background import PredictionLogBuffer, TickerPopularity, BackgroundConfig, quality_feed
 from config import init_config
 
 
@@ -35,10 +50,13 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SESSION_TYPE'] = 'filesystem'
 
 #initialize all configurations
 config = init_config(app)
+init_instrumentation(app)
+init_tracing(app)
+profiler.init_app(app)
+memory_monitor.init_app(app)
 
 #initialize extensions
 db.init_app(app)
@@ -48,26 +66,31 @@ login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 
 #initialize stock predictor
-predictor = StockPredictor()
+predictor = StockPredictor(data_cache=HistoricalDataCache())
+memory_monitor.register_size('predictor', predictor.memory_usage)
+memory_monitor.register_size('api_key_local_cache', key_cache.memory_usage)
+memory_monitor.register_size('user_local_cache', user_cache.memory_usage)
 app.register_blueprint(auth, url_prefix='/auth')
 app.register_blueprint(api_keys, url_prefix='/api')
 
-#initialize background tasks
-background_tasks = init_background_tasks(app)
+#background tasks and write-behind logging of served predictions; started by start_services()
+background_tasks = BackgroundTaskManager()
 app.task_manager = background_tasks
+prediction_log = PredictionLogBuffer()
+app.prediction_log = prediction_log
+ticker_popularity = TickerPopularity()
 
 
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(user_id)
-
 def validate_ticker(ticker):
     """validate if ticker exists and can be fetched"""
+    #only successful lookups are cached so a new listing is picked up on the next request
+    if app.cache.get('tickers', ticker):
+        return True
     try:
         stock = yf.Ticker(ticker)
         #try to get info - will fall if ticker doesn't exist
         info = stock.info
+        app.cache.set('tickers', ticker, True)
         return True
     except:
         return False
@@ -99,13 +122,36 @@ def validate_dates(start_date, end_date):
     except ValueError:
         return False, "Invalid date format. Use YYY-MM-DD"
 
-# Load pre-trained model on startup
+def log_served_predictions(result):
+    """Queue the most recent predictions of a request and count the ticker's popularity"""
+    ticker_popularity.record(result.ticker)
+    #API key callers are attributed to the key's owner, browser sessions to the logged in user
+    key_record = g.get('api_key_record')
+    if key_record:
+        user_id = key_record['user_id']
+    else:
+        user_id = current_user.get_id() if current_user.is_authenticated else None
+    tail = BackgroundConfig.PREDICTION_LOG_TAIL
+    for target_date, value in list(zip(result.target_dates, result.predictions))[-tail:]:
+        prediction_log.record(result.ticker, target_date, value, user_id=user_id, model_id=result.model_id)
+
+def start_services():
+    """Start the scheduler and flush threads and load the pre-trained model"""
+    last_used_tracker.init_app(app)
+    background_tasks.init_app(app)
+    prediction_log.init_app(app)
+    try:
+        with app.app_context():
+            model_registry.sync_from_directory()
+            predictor.load_model()
+        logging.info("Model loaded successfully")
+    except Exception as e:
+        logging.error(f"Error loading model: {str(e)}")
 
-try:
-    predictor.load_model()
-    logging.info("Model loaded successfully")
-except Exception as e:
-    logging.error(f"Error loading model: {str(e)}")
+#multiprocessing workers (the password hashing pool) re-run the main script when they start;
+#only the serving process runs the cron jobs, flush threads and model
+if multiprocessing.current_process().name == 'MainProcess':
+    start_services()
 
 @app.route('/', methods=['GET'])
 def home():
@@ -119,19 +165,18 @@ def home():
 
 @app.route('/models', methods=['GET'])
 def list_models():
-    """List all available model versions"""
+    """List model versions, newest first"""
     try:
-        models_path = 'models_saved/'
-        versions = []
-
-        for version_dir in sorted(os.listdir(models_path)):
-            metadata_path = os.path.join(models_path, version_dir, 'metadata.json')
-            if os.path.exists(metadata_path):
-                with open(metadata_path, 'r') as f:
-                    metadata = json.load(f)
-                    versions.append(metadata)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+        ticker = request.args.get('ticker')
+
+        entries, total = model_registry.list(page=page, per_page=per_page, ticker=ticker)
         return jsonify({
-            'versions': versions
+            'versions': [model_registry.describe(entry) for entry in entries],
+            'page': page,
+            'per_page': per_page,
+            'total': total
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -140,37 +185,23 @@ def list_models():
 def model_info(version):
     """Get information about a specific model version"""
     try:
-        models_path = 'models_saved/'
-        #list all directories that start with v{version}_
-        matching_dirs = [d for d in os.listdir(models_path) if d.startswith(f'v{version}_')]
-
-        if not matching_dirs:
+        #the most recent model with this version string
+        entry = model_registry.get(version)
+        if entry is None:
             return jsonify({'error': 'Version not found'}), 404
-        
-        #get the most recent version if multiple exist
-        version_dir = sorted(matching_dirs)[-1]
-        metadata_path = os.path.join(models_path, version_dir, 'metadata.json')
 
-        if not os.path.exists(metadata_path):
-            return jsonify({'error': 'Version metadata not found'}), 404
-        
-        with open(metadata_path, 'r') as f:
-            metadata = json.load(f)
-
-        return jsonify(metadata)
+        return jsonify(model_registry.describe(entry))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/predict', methods=['POST'])
+@require_api_key
 def predict():
     try:
         data = request.get_json()
         if not data:
             return jsonify({'error': f'No data provided'}), 400
         version = data.get('model_version', None) #version parameter
-
-        if version:
-            predictor.load_model(version=version)
         
         #Extract and validate ticker
         ticker = data.get('ticker', 'SPY')
@@ -188,25 +219,43 @@ def predict():
         dates_valid, date_message = validate_dates(start_date, end_date)
         if not dates_valid:
             return jsonify({'error': date_message}), 400
+
+        #the request predicts with this session even if another model is loaded meanwhile;
+        #looked up only for valid requests, since a version's first use loads it from disk
+        session = predictor.session(version)
         
         #check if model is loaded
-        if predictor.model is None:
+        if session is None:
             return jsonify({'error': 'Model not loaded. Please train the model first'}), 500
 
-        predictions = predictor.predict(ticker, start_date, end_date)
-        return jsonify({
+        result = inference_pool.predict(session, ticker, start_date, end_date)
+        predictor.last_result = result
+        log_served_predictions(result)
+        response = {
             'ticker': ticker,
-            'predictions': predictions.tolist(),
+            'predictions': result.predictions.tolist(),
             'start_date': start_date,
             'end_date': end_date
-        })
+        }
+        if timing_requested():
+            response['timing'] = get_spans()
+        return jsonify(response)
     
+    except InferenceQueueFull:
+        response = jsonify({'error': 'Too many prediction requests, try again shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except InferenceTimeout:
+        response = jsonify({'error': 'Prediction timed out, try again shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as e:
         logging.error(f"Prediction error: {str(e)}")
         return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
     
 
 @app.route('/train', methods=['POST'])
+@require_api_key
 def train():
     try:
         data = request.get_json()
@@ -227,10 +276,13 @@ def train():
         if not dates_valid:
             return jsonify({'error': date_message}), 400
 
-        model, history, X_test, y_test = predictor.train(ticker, start_date, end_date)
-        predictor.save_model()
+        #train on a predictor of this request, then serve its model; running predictions keep their session
+        trainer = predictor.untrained_copy()
+        model, history, X_test, y_test = trainer.train(ticker, start_date, end_date)
+        trainer.save_model()
+        predictor.use(trainer)
 
-        return jsonify({
+        response = {
             'message': 'Model trained successfully',
             'training_history': {
                 'loss': history.history['loss'],
@@ -241,7 +293,10 @@ def train():
                 'start_date': start_date,
                 'end_date': end_date
             }
-        })
+        }
+        if timing_requested():
+            response['timing'] = get_spans()
+        return jsonify(response)
     except Exception as e:
         logging.error(f"training error: {str(e)}")
         return jsonify({'error': f'Training failed: {str(e)}'}), 500
@@ -250,103 +305,112 @@ def train():
 def health_status():
     return jsonify({'status': 'healthy'}), 200
 
-@app.route('/health/check', methods=['GET'])
-def health_check():
-    health_status = {
+#component probes for /health/check; health_checks runs them concurrently in the background
+@health_checks.probe('database', impact='unhealthy')
+def probe_database():
+    db.session.execute(text('SELECT 1'))
+    db.session.commit()
+    return {
         'status': 'healthy',
-        'timestamp': datetime.now(timezone.utc).isoformat(),
-        'components': {}
+        'message': 'Database connection successful'
     }
 
-    #Check database
-    try:
-        #test query
-        test_query = text('SELECT 1')
-        db.session.execute(test_query)
-        db.session.commit()
-        health_status['components']['database'] = {
-            'status': 'healthy',
-            'message': 'Database connection successful'
+@health_checks.probe('redis', impact='unhealthy')
+def probe_redis():
+    if not getattr(app, 'redis_client', None):
+        return {
+            'status': 'warning',
+            'message': 'Redis client not initialized'
         }
-    except Exception as e:
-        health_status['components']['database'] = {
-            'status': 'error',
-            'message': str(e)
-        }
-        health_status['status'] = 'unhealthy'
+    test_key = 'health_check_test'
+    app.redis_client.set(test_key, 'test_value', ex=60) #60 second expiry
+    test_value = app.redis_client.get(test_key)
+    if test_value not in (b'test_value', 'test_value'):
+        raise Exception('Redis value mismatch')
+    return {
+        'status': 'healthy',
+        'message': 'Redis connection successful'
+    }
 
-    #check redis
-    try:
-        if hasattr(app, 'redis_client') and app.redis_client:
-            test_key = 'health_check_test'
-            app.redis_client.set(test_key, 'test_value', ex=60) #60 second expiry
-            test_value = app.redis_client.get(test_key)
-            if test_value == b'test_value':
-                health_status['components']['redis'] = {
-                    'status': 'healthy',
-                    'message': 'Redis connection successful'
-                }
-            else:
-                raise Exception('Redis value mismatch')
-        else:
-            health_status['components']['redis'] = {
-                'status': 'warning',
-                'message': 'Redis client not initialized'
-            }
-    except Exception as e:
-        health_status['components']['redis'] = {
-            'status': 'error',
-            'message': str(e)
+@health_checks.probe('background_tasks')
+def probe_background_tasks():
+    if not getattr(app, 'task_manager', None):
+        return {
+            'status': 'warning',
+            'message': 'Task manager not initialized'
         }
-        health_status['status'] = 'unhealthy'
-
-    #Check backgroudn Tasks
-    try:
-        if hasattr(app, 'task_manager') and app.task_manager:
-            jobs = app.task_manager.scheduler.get_jobs()
-            job_status = {}
-            for job in jobs:
-                job_status[job.id] = {
-                    'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
-                    'last_run': getattr(job, 'last_run_time', None),
-                    'status': 'scheduled' if job.next_run_time else 'paused'
-                }
-            health_status['components']['background_tasks'] = {
-                'status': 'healthy',
-                'jobs': job_status
-            }
-        else:
-            health_status['components']['background_tasks'] = {
-                'status': 'warning',
-                'message': 'Task manager not initialized'
-            }
-    except Exception as e:
-        health_status['components']['background_tasks'] = {
-            'status': 'error',
-            'message': str(e)
+    job_status = {}
+    for job in app.task_manager.scheduler.get_jobs():
+        job_status[job.id] = {
+            'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
+            'last_run': getattr(job, 'last_run_time', None),
+            'status': 'scheduled' if job.next_run_time else 'paused'
         }
-        health_status['status'] = 'degraded'
+    return {
+        'status': 'healthy',
+        'jobs': job_status
+    }
 
-    #check model availability
-    try:
-        models_path = 'models_saved/'
-        available_models = [d for d in os.listdir(models_path) if os.path.isdir(os.path.join(models_path, d))]
-        if available_models:
-            health_status['components']['models'] = {
-                'status': 'healthy',
-                'available_models': available_models
-            }
-        else:
-            health_status['components']['models'] = {
-                'status': 'warning',
-                'message': 'No models available'
-            }
-    except Exception as e:
-        health_status['components']['models'] = {
-            'status': 'error',
-            'message': str(e)
+@health_checks.probe('password_hashing')
+def probe_password_hashing():
+    #password hashing pool load
+    hashing_stats = password_hasher.get_stats()
+    return {
+        'status': 'warning' if hashing_stats['pending'] >= hashing_stats['max_pending'] else 'healthy',
+        **hashing_stats
+    }
+
+@health_checks.probe('inference')
+def probe_inference():
+    #prediction thread pool load
+    inference_stats = inference_pool.get_stats()
+    return {
+        'status': 'warning' if inference_stats['pending'] >= inference_stats['max_pending'] else 'healthy',
+        **inference_stats
+    }
+
+@health_checks.probe('logging')
+def probe_logging():
+    #logging pipeline backlog and records it had to drop
+    logging_stats = get_logging_stats()
+    if not logging_stats:
+        return None
+    return {
+        'status': 'warning' if logging_stats['queue_size'] >= logging_stats['queue_capacity'] else 'healthy',
+        **logging_stats
+    }
+
+@health_checks.probe('memory')
+def probe_memory():
+    #resident memory and any endpoint whose memory keeps growing
+    memory_alert = memory_monitor.recent_alert()
+    return {
+        'status': 'warning' if memory_alert else 'healthy',
+        'rss': current_rss(),
+        'growth_alert': memory_alert
+    }
+
+@health_checks.probe('models')
+def probe_models():
+    latest_model = model_registry.latest()
+    if not latest_model:
+        return {
+            'status': 'warning',
+            'message': 'No models available'
         }
-        health_status['status'] = 'degraded'
+    return {
+        'status': 'healthy',
+        'model_count': model_registry.count(),
+        'latest': model_registry.describe(latest_model)
+    }
+
+health_checks.init_app(app)
+
+@app.route('/health/check', methods=['GET'])
+def health_check():
+    """Latest component snapshot (see age_seconds); ?fresh=1 probes every component now"""
+    fresh = request.args.get('fresh', 'false').lower() in ('1', 'true')
+    health_status = health_checks.report(fresh=fresh)
     response = jsonify(health_status)
     response.status_code = 200 if health_status['status'] == 'healthy' else 207
     return response
@@ -358,12 +422,13 @@ def get_metrics():
         metrics_manager = MetricsManager()
 
         #Get latest predictions and actual values
-        if not hasattr(predictor, 'last_predictions') or not hasattr(predictor, 'last_actual'):
+        last_result = predictor.last_result
+        if last_result is None:
             return jsonify({'error': 'No predictions available yet'}), 404
         
         metrics = metrics_manager.calculate_basic_metrics(
-            predictor.last_actual,
-            predictor.last_predictions
+            last_result.actual,
+            last_result.predictions
         )
 
         return jsonify({
@@ -374,27 +439,62 @@ def get_metrics():
     except Exception as e:
         logging.error(f"Error getting metrics: {str(e)}")
         return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics/quality', methods=['GET'])
+def get_quality_metrics():
+    """Streaming accuracy of served predictions per ticker and model"""
+    try:
+        ticker = request.args.get('ticker')
+        model_id = request.args.get('model_id')
+        version = request.args.get('model_version')
+        #pick up what other workers scored since this one last read the feed
+        quality_feed.consume()
+        series = model_quality.report(ticker=ticker, model_id=model_id, version=version)
+        if not series:
+            return jsonify({'error': 'No scored predictions yet'}), 404
+
+        return jsonify({
+            'series': series,
+            'windows': list(model_quality.windows),
+            'started_at': datetime.fromtimestamp(model_quality.started_at).isoformat(),
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        logging.error(f"Error getting quality metrics: {str(e)}")
+        return jsonify({'error': str(e)}), 500
     
     
 @app.route('/logs', methods=['GET'])
 def get_logs():
     try:
         log_type = request.args.get('type', 'app') #app or error
-        lines = int(request.args.get('lines', 100)) #number of lines to return
+        lines = min(int(request.args.get('lines', 100)), MAX_TAIL_LINES) #number of lines to return
+        level = request.args.get('level') #minimum level, e.g. WARNING
+        logger_name = request.args.get('logger') #logger and its children, e.g. api
+        stream = request.args.get('stream', 'false').lower() == 'true'
+        try:
+            since = _parse_log_time(request.args.get('since'))
+            until = _parse_log_time(request.args.get('until'))
+        except ValueError:
+            return jsonify({'error': 'since and until must be ISO 8601 timestamps'}), 400
+        if level and isinstance(logging.getLevelName(level.upper()), str):
+            return jsonify({'error': f"Unknown log level: {level}"}), 400
 
         log_file = 'app.log' if log_type == 'app' else 'error.log'
-        log_path = os.path.join('logs', log_file)
-
-        if not os.path.exists(log_path):
+        if not log_reader.log_files(log_file):
             return jsonify({'error': 'Log file not found'}), 404
-        
-        with open(log_path, 'r') as f:
-            #get last N lines
-            all_logs = f.readlines()
-            #Ensure we don't try to get more lines than there are
-            num_lines = min(lines, len(all_logs))
-            last_n_logs = all_logs[-num_lines:]
 
+        records = log_reader.tail(log_file, lines=lines, level=level, logger=logger_name, since=since, until=until)
+
+        if stream:
+            #newest first, one JSON object per line as the files are read
+            def generate():
+                for record in records:
+                    yield json.dumps({**record, 'timestamp': record['timestamp'].isoformat()}) + '\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        last_n_logs = [record['line'] for record in records][::-1]
         return jsonify({
             'log_type': log_type,
             'lines_requested': lines,
@@ -405,7 +505,17 @@ def get_logs():
         logging.error(f"Error retrieving logs: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def _parse_log_time(value):
+    """Naive local time for comparing with log timestamps"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
-    app.run(debug=True)
\ No newline at end of file
+    #requests are served from threads; predictions run in inference_pool
+    app.run(debug=True, threaded=True)
\ No newline at end of file
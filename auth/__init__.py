@@ -1,7 +1,10 @@
 from .routes import auth, login_manager
 from .api_keys import api_keys
-from .middleware import APIKey, SecurityTracker, RateLimit
+from .middleware import APIKey, SecurityTracker, RateLimit, require_admin_token
 from .config import AuthConfig
+from .key_cache import APIKeyCache, LastUsedTracker, key_cache, last_used_tracker
+from .user_cache import UserCache, user_cache
+from .password_hasher import PasswordHasher, HashingQueueFull, HashingTimeout, password_hasher
 
 __all__ = [
     'auth',
@@ -10,5 +13,16 @@ __all__ = [
     'APIKey',
     'SecurityTracker',
     'RateLimit',
-    'AuthConfig'
+    'require_admin_token',
+    'AuthConfig',
+    'APIKeyCache',
+    'LastUsedTracker',
+    'key_cache',
+    'last_used_tracker',
+    'UserCache',
+    'user_cache',
+    'PasswordHasher',
+    'HashingQueueFull',
+    'HashingTimeout',
+    'password_hasher'
 ]
\ No newline at end of file
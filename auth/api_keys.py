@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from database.db import db
 from .middleware import APIKey, SecurityTracker, RateLimit
 from .config import AuthConfig
+from .key_cache import key_cache
 import logging
 from datetime import datetime, timedelta, timezone
 import uuid
@@ -57,8 +58,9 @@ def create_key():
             "api_ley": new_key,
             "expires_at": expires_at.isoformat(),
             "rate_limit": {
-                "max_requests": AuthConfig.RATE_LIMIT_REQUESTS,
-                "window_seconds": AuthConfig.RATE_LIMIT_WINDOW
+                "max_requests": AuthConfig.TIER_QUOTAS.get(current_user.subscription_tier, AuthConfig.RATE_LIMIT_REQUESTS),
+                "window_seconds": AuthConfig.RATE_LIMIT_WINDOW,
+                "endpoint_costs": AuthConfig.ENDPOINT_COSTS
             }
         })
     
@@ -111,6 +113,7 @@ def revoke_key(api_key):
             return jsonify({"error": "Key not found"}), 404
         
         db.session.commit()
+        key_cache.invalidate(api_key)
         logger.info(f"API key revoked for user {current_user.user_id}")
 
         return jsonify({"message": "Key revoked successfully"})
@@ -135,7 +138,7 @@ def key_status(api_key):
         if not key_info:
             return jsonify({"error": "Key not found"}), 404
         
-        rate_limiter = RateLimit()
+        rate_limiter = RateLimit(current_user.subscription_tier)
         remaining_requests = rate_limiter.get_remaining_requests(current_user.user_id)
 
         return jsonify({
@@ -149,7 +152,9 @@ def key_status(api_key):
             "rate_limit": {
                 "remaining_requests": remaining_requests,
                 "reset_in": AuthConfig.RATE_LIMIT_WINDOW,
-                "max_requests": AuthConfig.RATE_LIMIT_REQUESTS
+                "max_requests": rate_limiter.max_requests,
+                "usage_by_endpoint": rate_limiter.get_usage(current_user.user_id),
+                "endpoint_costs": AuthConfig.ENDPOINT_COSTS
             }
         })
     except Exception as e:
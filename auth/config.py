@@ -1,5 +1,6 @@
 from datetime import timedelta
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,11 +13,45 @@ class AuthConfig:
     KEY_EXPIRY_DAYS = int(os.getenv('KEY_EXPIRY_DAYS', '365'))
     MIN_KEY_LENGTH = 64
 
+    #api key verification cache
+    KEY_CACHE_LOCAL_TTL = int(os.getenv('KEY_CACHE_LOCAL_TTL', '30')) #seconds, bounds staleness across processes
+    KEY_CACHE_REDIS_TTL = int(os.getenv('KEY_CACHE_REDIS_TTL', '300')) #seconds
+    KEY_CACHE_MAX_ENTRIES = int(os.getenv('KEY_CACHE_MAX_ENTRIES', '10000'))
+    LAST_USED_FLUSH_SECONDS = float(os.getenv('LAST_USED_FLUSH_SECONDS', '5'))
+
+    #logged-in user identity cache
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '60')) #seconds
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', '10000'))
+
+    #password hashing pool
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2')) #0 hashes on the request thread
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '16'))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10')) #seconds
+
     #Rate limiting
     RATE_LIMIT_REQUESTS = int(os.getenv('RATE_LIMIT_REQUESTS', '100'))
     RATE_LIMIT_WINDOW = int(os.getenv('RATE_LIMIT_WINDOW', '3600')) # 1 hour 
     RATE_LIMIT_CLEANUP_INTERVAL = timedelta(hours=1)
 
+    #Cost-weighted quotas: routes spend units from a per-tier budget every RATE_LIMIT_WINDOW.
+    #Both maps can be overridden with a JSON object in the environment
+    TIER_QUOTAS = {
+        'free': RATE_LIMIT_REQUESTS,
+        'pro': 1000,
+        'enterprise': 10000,
+        **json.loads(os.getenv('TIER_QUOTAS', '{}'))
+    }
+    ENDPOINT_COSTS = {
+        'train': 50,
+        'batch_predict': 10,
+        'predict': 1,
+        **json.loads(os.getenv('ENDPOINT_COSTS', '{}'))
+    }
+    DEFAULT_ENDPOINT_COST = 1
+
+    #operator endpoints (profiling, memory), disabled while unset
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
     #Security
     FAILED_ATTEMPTS_LIMIT = int(os.getenv('FAILED_ATTEMPTS_LIMIT', '5'))
     FAILED_ATTEMPTS_WINDOW = timedelta(minutes=15)
@@ -0,0 +1,11 @@
+from werkzeug.security import generate_password_hash, check_password_hash
+
+#runs in PasswordHasher's worker processes, which preload only this module; keep app, model and database imports out
+
+def hash_password(password, method):
+    """Hash a new password with method"""
+    return generate_password_hash(password, method)
+
+def verify_password(password_hash, password):
+    """Check a password against its stored hash"""
+    return check_password_hash(password_hash, password)
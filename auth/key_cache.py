@@ -0,0 +1,183 @@
+from flask import current_app
+from database.db import db
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from .config import AuthConfig
+from .local_cache import LocalTTLCache
+from utils.instrumentation import record_cache_lookup
+import threading
+import hashlib
+import logging
+import atexit
+import json
+
+logger = logging.getLogger('auth')
+
+class APIKeyCache:
+    """
+    Two-tier cache of API key verification state.
+
+    Records are kept in a small in-process LRU with a short TTL in front of
+    Redis, both keyed by the SHA-256 of the key so raw keys never reach Redis.
+    Unknown keys are cached locally as well so floods of bad keys stay off the database.
+    """
+
+    KEY_PREFIX = 'api_key_state'
+
+    def __init__(self, local_ttl=AuthConfig.KEY_CACHE_LOCAL_TTL,
+                 redis_ttl=AuthConfig.KEY_CACHE_REDIS_TTL,
+                 max_entries=AuthConfig.KEY_CACHE_MAX_ENTRIES):
+        self.redis_ttl = redis_ttl
+        self._local = LocalTTLCache(local_ttl, max_entries, name='api_key_local')
+
+    @staticmethod
+    def hash_key(api_key):
+        """Digest used as the cache key for an API key"""
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+    @property
+    def redis_client(self):
+        return getattr(current_app, 'redis_client', None)
+
+    def _load_from_db(self, api_key):
+        sql = text("""
+            SELECT ak.key_id, ak.user_id, ak.is_active, ak.created_at, u.is_active as user_active,
+                   u.subscription_tier
+            FROM api_keys ak
+            JOIN users u ON ak.user_id = u.user_id
+            WHERE ak.api_key = :api_key
+        """)
+        row = db.session.execute(sql, {'api_key': api_key}).first()
+        if not row:
+            return {'exists': False}
+
+        created_at = row.created_at
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+
+        return {
+            'exists': True,
+            'key_id': str(row.key_id),
+            'user_id': str(row.user_id),
+            'is_active': bool(row.is_active),
+            'user_active': bool(row.user_active),
+            'subscription_tier': row.subscription_tier or 'free',
+            'expires_at': (created_at + timedelta(days=AuthConfig.KEY_EXPIRY_DAYS)).timestamp()
+        }
+
+    def lookup(self, api_key):
+        """Return the verification record for a key, or None if the key does not exist"""
+        key_hash = self.hash_key(api_key)
+
+        record = self._local.get(key_hash)
+        if record is None:
+            record = self._get_redis(key_hash)
+            if record is None:
+                record = self._load_from_db(api_key)
+                if record['exists']:
+                    self._set_redis(key_hash, record)
+            self._local.set(key_hash, record)
+
+        return record if record['exists'] else None
+
+    def _get_redis(self, key_hash):
+        redis_client = self.redis_client
+        if not redis_client:
+            return None
+        try:
+            value = redis_client.get(f"{self.KEY_PREFIX}:{key_hash}")
+            record_cache_lookup('api_key_redis', bool(value))
+            return json.loads(value) if value else None
+        except Exception as e:
+            logger.error(f"API key cache read failed: {str(e)}")
+            return None
+
+    def _set_redis(self, key_hash, record):
+        redis_client = self.redis_client
+        if not redis_client:
+            return
+        try:
+            redis_client.set(f"{self.KEY_PREFIX}:{key_hash}", json.dumps(record), ex=self.redis_ttl)
+        except Exception as e:
+            logger.error(f"API key cache write failed: {str(e)}")
+
+    def invalidate(self, api_key):
+        """Forget a key in this process and in Redis; other processes catch up within local_ttl"""
+        key_hash = self.hash_key(api_key)
+        self._local.pop(key_hash)
+        redis_client = self.redis_client
+        if redis_client:
+            try:
+                redis_client.delete(f"{self.KEY_PREFIX}:{key_hash}")
+            except Exception as e:
+                logger.error(f"API key cache invalidation failed: {str(e)}")
+
+    def memory_usage(self):
+        return self._local.memory_usage()
+
+class LastUsedTracker:
+    """Coalesces api_keys.last_used updates in memory and writes them in bulk"""
+
+    def __init__(self, flush_interval=AuthConfig.LAST_USED_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self.app = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        """Start the periodic flush for a flask app"""
+        self.app = app
+        self._thread = threading.Thread(target=self._run, name='api-key-last-used', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def touch(self, key_id):
+        """Record a use of a key; only the latest timestamp per key is kept"""
+        with self._lock:
+            self._pending[key_id] = datetime.now(timezone.utc)
+
+    def flush(self):
+        """Write all pending last_used values in one executemany"""
+        if self.app is None:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        sql = text("""
+            UPDATE api_keys
+            SET last_used = :last_used
+            WHERE key_id = :key_id
+        """)
+        with self.app.app_context():
+            try:
+                db.session.execute(sql, [{'key_id': key_id, 'last_used': last_used} for key_id, last_used in pending.items()])
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Error updating last_used for {len(pending)} API keys: {str(e)}")
+                db.session.rollback()
+                #keep the values for the next flush unless a newer use arrived meanwhile
+                with self._lock:
+                    for key_id, last_used in pending.items():
+                        self._pending.setdefault(key_id, last_used)
+                return 0
+        return len(pending)
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        """Stop the flush thread and write anything pending"""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(self.flush_interval + 1)
+        self.flush()
+
+key_cache = APIKeyCache()
+last_used_tracker = LastUsedTracker()
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from utils.instrumentation import record_cache_lookup
+import threading
+import time
+import sys
+
+class LocalTTLCache:
+    """Small thread-safe in-process LRU whose entries also expire after ttl seconds"""
+
+    def __init__(self, ttl, max_entries, name=None):
+        self.ttl = ttl
+        self.name = name #reported in cache_requests_total when set
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if self.name:
+            record_cache_lookup(self.name, entry is not None)
+        return entry[0] if entry is not None else None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def memory_usage(self):
+        """Entry count and shallow size of the keys and values in bytes"""
+        with self._lock:
+            entries = list(self._entries.items())
+        return {
+            'entries': len(entries),
+            'bytes': sum(sys.getsizeof(key) + sys.getsizeof(entry[0]) for key, entry in entries)
+        }
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,14 +1,19 @@
 from functools import wraps
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g
 from models.user import User
 from database.db import db
 import uuid
 from datetime import datetime, timedelta, timezone
 import hashlib
+import hmac
 import os
 import logging
 import json
+import time
+import math
 from .config import AuthConfig
+from .rate_limiter import GCRA_SCRIPT, RateLimitResult, local_rate_limiter
+from .key_cache import key_cache, last_used_tracker
 from sqlalchemy import text
 
 logger = logging.getLogger('auth')
@@ -62,53 +67,98 @@ class APIKey:
 class RateLimit:
     """Handles rate limiting logic"""
 
-    def __init__(self):
+    #registered scripts per redis client, so EVALSHA is used after the first call
+    _scripts = {}
+
+    def __init__(self, tier=None):
         self.redis_client = current_app.redis_client
-        self.max_requests = AuthConfig.RATE_LIMIT_REQUESTS
+        self.max_requests = AuthConfig.TIER_QUOTAS.get(tier, AuthConfig.RATE_LIMIT_REQUESTS) if tier else AuthConfig.RATE_LIMIT_REQUESTS
         self.window_size = AuthConfig.RATE_LIMIT_WINDOW
 
+    @staticmethod
+    def get_endpoint_cost(endpoint):
+        """Quota units charged for one call to an endpoint"""
+        return AuthConfig.ENDPOINT_COSTS.get(endpoint, AuthConfig.DEFAULT_ENDPOINT_COST)
+
     def get_rate_limit_key(self, user_id):
         """Generate redis key for rate limiting"""
-        return f"rate_lmit:{user_id}"
-    
-    def is_rate_limited(self, user_id):
-        """Check if user is rate limited"""
-        if not self.redis_client:
-            return False #Fail open if redis is not available
-        
-        key = self.get_rate_limit_key(user_id)
-        pipe = self.redis_client.pipeline()
+        return f"rate_limit:gcra:{user_id}"
 
-        try:
-            #Atomic rate limit check
-            pipe.incr(key)
-            pipe.expire(key, self.window_size)
-            current_count = pipe.execute()[0]
+    def get_usage_key(self, user_id):
+        """Redis hash of quota units spent per endpoint in the current window"""
+        return f"rate_limit:usage:{user_id}"
 
-            if current_count == 1: #First request in new window
-                self.redis_client.expire(key, self.window_size)
+    def _get_script(self):
+        script = self._scripts.get(id(self.redis_client))
+        if script is None:
+            script = self.redis_client.register_script(GCRA_SCRIPT)
+            self._scripts[id(self.redis_client)] = script
+        return script
 
-            is_limited = current_count > self.max_requests
+    def check(self, user_id, cost=1, endpoint=None):
+        """
+        Charge a request against the user's limit in a single redis round trip.
 
-            if is_limited:
-                logger.warning(f"Rate limit exceeded for user {user_id}")
+        Returns a RateLimitResult with allowed, remaining, reset_in and
+        retry_after (seconds). When an endpoint is given the charged units are
+        also added to the user's per-endpoint usage. Falls back to an
+        in-process limiter when redis is unavailable rather than failing open.
+        """
+        key = self.get_rate_limit_key(user_id)
+        #a call costing more than the whole quota spends all of it instead of never being allowed
+        cost = min(cost, self.max_requests)
+        if self.redis_client:
+            try:
+                keys, args = [key], [self.max_requests, self.window_size * 1000, cost]
+                if endpoint:
+                    keys.append(self.get_usage_key(user_id))
+                    args.append(endpoint)
+                allowed, remaining, reset_ms, retry_ms = self._get_script()(keys=keys, args=args)
+                result = RateLimitResult(bool(allowed), max(0, int(remaining)),
+                                         math.ceil(int(reset_ms) / 1000), math.ceil(int(retry_ms) / 1000))
+                if not result.allowed:
+                    logger.warning(f"Rate limit exceeded for user {user_id}")
+                return result
+            except Exception as e:
+                logger.error(f"Rate limiting error, using local limiter: {str(e)}")
 
-            return is_limited
-        except Exception as e:
-            logger.error(f"Rate limiting error: {str(e)}")
-            return False #fall open if redis is down
-        
+        result = local_rate_limiter.check(key, self.max_requests, self.window_size, cost)
+        if not result.allowed:
+            logger.warning(f"Rate limit exceeded for user {user_id} (local limiter)")
+        return result
+    
+    def is_rate_limited(self, user_id):
+        """Check if user is rate limited"""
+        return not self.check(user_id).allowed
 
     def get_remaining_requests(self, user_id):
         """get remaining requests in current window"""
-        if not self.redis_client:
-            return self.max_requests
-        
         key = self.get_rate_limit_key(user_id)
-        current_count = self.redis_client.get(key)
-        if current_count is None:
-            return self.max_requests
-        return max(0, self.max_requests - int(current_count))
+        if self.redis_client:
+            try:
+                tat = self.redis_client.get(key)
+                if tat is None:
+                    return self.max_requests
+                backlog = max(0.0, float(tat) / 1000 - time.time())
+                interval = self.window_size / self.max_requests
+                return max(0, math.floor((self.window_size - backlog) / interval))
+            except Exception as e:
+                logger.error(f"Rate limiting error: {str(e)}")
+        return local_rate_limiter.peek(key, self.max_requests, self.window_size)
+
+    def get_usage(self, user_id):
+        """Quota units spent per endpoint in the current window"""
+        if not self.redis_client:
+            return {}
+        try:
+            usage = self.redis_client.hgetall(self.get_usage_key(user_id))
+        except Exception as e:
+            logger.error(f"Rate limiting error: {str(e)}")
+            return {}
+        return {
+            (endpoint.decode() if isinstance(endpoint, bytes) else endpoint): int(units)
+            for endpoint, units in usage.items()
+        }
     
 class SecurityTracker:
     """Tracks security-related events"""
@@ -133,8 +183,18 @@ class SecurityTracker:
             return True
         return False
     
-def require_api_key(f):
-    """Decorator for routes requiring API key authentication"""
+def require_api_key(f=None, cost=None):
+    """
+    Decorator for routes requiring API key authentication.
+
+    Each call spends quota units from the user's subscription tier budget.
+    The cost comes from AuthConfig.ENDPOINT_COSTS by endpoint name unless
+    given explicitly, e.g. @require_api_key(cost=10). The verified key's
+    record is available to the view as g.api_key_record.
+    """
+    if f is None:
+        return lambda view: require_api_key(view, cost=cost)
+
     @wraps(f)
     def decorated(*args, **kwargs):
         try:
@@ -146,39 +206,35 @@ def require_api_key(f):
             if not APIKey.validate_key_format(api_key):
                 return jsonify({"error": "invalid API key format"}), 401
             
-            #Check if API key exists and is active
-            sql = text("""
-                SELECT ak.user_id, ak.is_active, ak.created_at, u.is_active as user_active
-                FROM api_keys ak
-                JOIN users u ON ak.user_id = u.user_id
-                WHERE ak.api_key = :api_key
-            """)
-            key_record = db.session.execute(sql, {'api_key': api_key}).first()
+            #Check if API key exists and is active (cached, database only on a miss)
+            key_record = key_cache.lookup(api_key)
             if not key_record:
                 return jsonify({"error": "Invalid API Key"}), 401
             
-            if not key_record.is_active or not key_record.user_active:
+            if not key_record['is_active'] or not key_record['user_active']:
                 return jsonify({"error": "Inactive API Key or user account"}), 401
             
             #check key expiration
-            if key_record.created_at + timedelta(days=AuthConfig.KEY_EXPIRY_DAYS) < datetime.now(timezone.utc):
+            if key_record['expires_at'] < time.time():
                 return jsonify({"error": "Expired API key"}), 401
             
-            sql = text("""
-                UPDATE api_keys
-                SET last_used = :now
-                WHERE api_key = :api_key
-            """)
-            db.session.execute(sql, {'now': datetime.now(timezone.utc), 'api_key': api_key})
+            #last_used is written in bulk by the tracker thread
+            last_used_tracker.touch(key_record['key_id'])
+            g.api_key_record = key_record
             
-            #Check rate liimit
-            rate_limiter = RateLimit()
-            if rate_limiter.is_rate_limited(key_record.user_id):
-                remaining_time = rate_limiter.window_size
-                return jsonify({
+            #Check rate liimit (one round trip returns the header values too)
+            endpoint = request.endpoint or f.__name__
+            request_cost = cost if cost is not None else RateLimit.get_endpoint_cost(endpoint)
+            rate_limiter = RateLimit(key_record.get('subscription_tier'))
+            limit_result = rate_limiter.check(key_record['user_id'], request_cost, endpoint)
+            if not limit_result.allowed:
+                response = jsonify({
                     "error": "Rate limit exceeded",
-                    "reset_in": remaining_time,
-                }), 429
+                    "reset_in": limit_result.retry_after,
+                    "cost": request_cost
+                })
+                response.headers['Retry-After'] = str(limit_result.retry_after)
+                return response, 429
             
             #Add rate limit headers
             response = f(*args, **kwargs)
@@ -191,10 +247,10 @@ def require_api_key(f):
             if isinstance(response_obj, dict):
                 response_obj = jsonify(response_obj)
 
-            remaining = rate_limiter.get_remaining_requests(key_record.user_id)
-            response_obj.headers['X-RateLimit-Limit'] = str(AuthConfig.RATE_LIMIT_REQUESTS)
-            response_obj.headers['X-RateLimit-Remaining'] = str(remaining)
-            response_obj.headers['X-RateLimit-Reset'] = str(rate_limiter.window_size)
+            response_obj.headers['X-RateLimit-Limit'] = str(rate_limiter.max_requests)
+            response_obj.headers['X-RateLimit-Cost'] = str(request_cost)
+            response_obj.headers['X-RateLimit-Remaining'] = str(limit_result.remaining)
+            response_obj.headers['X-RateLimit-Reset'] = str(limit_result.reset_in)
 
             return response_obj, status_code
         
@@ -202,4 +258,21 @@ def require_api_key(f):
             logger.error(f"API key authentication error: {str(e)}")
             return jsonify({"error": "Authentication failed"}), 500
         
-    return decorated
\ No newline at end of file
+    return decorated
+
+def is_admin_request():
+    """Whether the request carries the operator token in X-Admin-Token"""
+    token = request.headers.get('X-Admin-Token')
+    return bool(AuthConfig.ADMIN_TOKEN and token and hmac.compare_digest(token, AuthConfig.ADMIN_TOKEN))
+
+def require_admin_token(f):
+    """Decorator for operator endpoints, which are off unless ADMIN_TOKEN is set"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not AuthConfig.ADMIN_TOKEN:
+            return jsonify({"error": "Admin endpoints are disabled"}), 403
+        if not is_admin_request():
+            logger.warning(f"Rejected admin request to {request.path} from {request.remote_addr}")
+            return jsonify({"error": "Invalid admin token"}), 403
+        return f(*args, **kwargs)
+    return decorated
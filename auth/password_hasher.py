@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor
+from utils.bounded_executor import BoundedExecutor
+from .hashing_worker import hash_password, verify_password
+from .config import AuthConfig
+import multiprocessing
+import logging
+
+logger = logging.getLogger('auth')
+
+class HashingQueueFull(Exception):
+    """Raised when too many password hashes are already queued"""
+    pass
+
+class HashingTimeout(Exception):
+    """Raised when a password hash does not finish within the timeout"""
+    pass
+
+class PasswordHasher(BoundedExecutor):
+    """
+    Runs scrypt password hashing in a bounded process pool.
+
+    Hashing is CPU bound, so on the request thread a burst of logins holds
+    the GIL and the worker's cores away from prediction requests. Jobs go to
+    a small process pool instead, and once max_pending jobs are queued or
+    running new ones are rejected immediately with HashingQueueFull rather
+    than piling up. A job still unfinished after timeout seconds raises
+    HashingTimeout. max_workers=0 hashes inline on the calling thread.
+    """
+
+    METHOD = 'scrypt'
+    label = 'Password hashing'
+    queue_full = HashingQueueFull
+    timed_out = HashingTimeout
+    log_failures = True
+    logger = logger
+
+    def __init__(self, max_workers=AuthConfig.PASSWORD_HASH_WORKERS,
+                 max_pending=AuthConfig.PASSWORD_HASH_MAX_PENDING,
+                 timeout=AuthConfig.PASSWORD_HASH_TIMEOUT):
+        super().__init__(max_workers, max_pending, timeout)
+
+    def _create_executor(self):
+        #not fork: the app process runs threads (redis pool, schedulers, flushers). Workers are forked
+        #from a single threaded server that only imports the hashing functions, not the app
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['auth.hashing_worker'])
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+
+    def hash(self, password):
+        """Hash a new password"""
+        return self._run(hash_password, password, self.METHOD)
+
+    def verify(self, password_hash, password):
+        """Check a password against its stored hash"""
+        return self._run(verify_password, password_hash, password)
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,97 @@
+from collections import namedtuple
+import threading
+import math
+import time
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'remaining', 'reset_in', 'retry_after'])
+
+#GCRA (generic cell rate algorithm) token bucket evaluated inside redis.
+#One key per caller holds the theoretical arrival time (TAT) in milliseconds,
+#so a check is a single round trip and uses O(1) memory per caller.
+#KEYS[1] = bucket key, KEYS[2] = optional per-endpoint usage hash
+#ARGV[1] = limit per window, ARGV[2] = window in ms, ARGV[3] = cost of this request,
+#ARGV[4] = endpoint name (when KEYS[2] is given)
+#returns {allowed, remaining, reset_ms, retry_after_ms}
+GCRA_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local interval = window / limit
+
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+
+local new_tat = tat + cost * interval
+local allow_at = new_tat - window
+if now < allow_at then
+    local remaining = math.floor((window - (tat - now)) / interval)
+    return {0, remaining, math.ceil(tat - now), math.ceil(allow_at - now)}
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now))
+if KEYS[2] then
+    redis.call('HINCRBY', KEYS[2], ARGV[4], cost)
+    redis.call('PEXPIRE', KEYS[2], window)
+end
+local remaining = math.floor((window - (new_tat - now)) / interval)
+return {1, remaining, math.ceil(new_tat - now), 0}
+"""
+
+def gcra(tat, now, limit, window, cost):
+    """
+    Apply one GCRA step in Python; same arithmetic as GCRA_SCRIPT.
+
+    Returns (new_tat or None if denied, RateLimitResult) with times in seconds.
+    """
+    interval = window / limit
+    tat = max(tat or now, now)
+    new_tat = tat + cost * interval
+    allow_at = new_tat - window
+    if now < allow_at:
+        remaining = math.floor((window - (tat - now)) / interval)
+        return None, RateLimitResult(False, max(0, remaining), math.ceil(tat - now), math.ceil(allow_at - now))
+
+    remaining = math.floor((window - (new_tat - now)) / interval)
+    return new_tat, RateLimitResult(True, max(0, remaining), math.ceil(new_tat - now), 0)
+
+class LocalRateLimiter:
+    """
+    In-process GCRA limiter used while redis is unavailable.
+
+    Every worker enforces the limit on its own, so the global limit is only
+    approximate, but callers are still limited instead of failing open.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def check(self, key, limit, window, cost=1):
+        """Charge cost against key; window in seconds"""
+        now = time.monotonic()
+        with self._lock:
+            new_tat, result = gcra(self._buckets.get(key), now, limit, window, cost)
+            if new_tat is not None:
+                self._buckets[key] = new_tat
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return result
+
+    def peek(self, key, limit, window):
+        """Remaining capacity without charging"""
+        now = time.monotonic()
+        with self._lock:
+            tat = max(self._buckets.get(key, now), now)
+        return max(0, math.floor((window - (tat - now)) / (window / limit)))
+
+    def _prune(self, now):
+        #a bucket whose TAT has passed is full again and carries no state
+        self._buckets = {key: tat for key, tat in self._buckets.items() if tat > now}
+
+local_rate_limiter = LocalRateLimiter()
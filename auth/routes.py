@@ -1,10 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, session
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from oauthlib.oauth2 import WebApplicationClient
-import requests
-from werkzeug.security import generate_password_hash, check_password_hash
+from config.session import regenerate_session
+from config.http_client import http_client
 from models.user import User
 from database import db
+from .user_cache import user_cache
+from .password_hasher import password_hasher, HashingQueueFull, HashingTimeout
 import os
 import json
 
@@ -14,17 +16,24 @@ login_manager = LoginManager()
 google_client_id = os.getenv('GOOGLE_CLIENT_ID')
 google_client_secret = os.getenv('GOOGLE_CLIENT_SECRET')
 client = WebApplicationClient(google_client_id)
+google_discovery_url = os.getenv('GOOGLE_DISCOVERY_URL', 'https://accounts.google.com/.well-known/openid-configuration')
 
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(user_id)
+    return user_cache.get(user_id)
 
 def get_google_provider_cfg():
-    return requests.get(
-        "https://accounts.google.com/.well-known/openid-configuration"
-    ).json()
+    """Google's OpenID discovery document, cached for as long as its Cache-Control allows"""
+    return http_client.get_json_cached(google_discovery_url)
+
+@auth.errorhandler(HashingQueueFull)
+@auth.errorhandler(HashingTimeout)
+def hashing_queue_full(e):
+    response = jsonify({"error": "Too many authentication requests, try again shortly"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 @auth.route("/register", methods=['POST'])
 def register():
@@ -40,7 +49,7 @@ def register():
     
     user = User(
         email = email,
-        password_hash=generate_password_hash(password, method='scrypt')
+        password_hash=password_hasher.hash(password)
     )
     db.session.add(user)
     db.session.commit()
@@ -60,9 +69,10 @@ def login():
     password = data.get("password")
 
     user = User.query.filter_by(email=email).first()
-    if not user or not check_password_hash(user.password_hash, password):
+    if not user or not password_hasher.verify(user.password_hash, password):
         return jsonify({"error": "Invalid email or password"}), 401
     
+    regenerate_session(session)
     login_user(user)
     return jsonify({
         "message": "Logged in successfully",
@@ -98,7 +108,7 @@ def google_callback():
         code=code
     )
 
-    token_response = requests.post(
+    token_response = http_client.post(
         token_url, 
         headers = headers,
         data = body,
@@ -109,7 +119,7 @@ def google_callback():
 
     userinfo_endpoint = google_provider_cfg["userinfo_endpoint"]
     uri, headers, body = client.add_token(userinfo_endpoint)
-    userinfo_response = requests.get(uri, headers = headers, data=body)
+    userinfo_response = http_client.get(uri, headers = headers, data=body)
 
     if userinfo_response.json().get("email_verified"):
         email = userinfo_response.json()["email"]
@@ -120,6 +130,7 @@ def google_callback():
             db.session.add(user)
             db.session.commit()
 
+        regenerate_session(session)
         login_user(user)
         return jsonify({
             "message": "Logged in successfully via Google",
@@ -136,6 +147,8 @@ def google_callback():
 @login_required
 def logout():
     logout_user()
+    #drops the server side session and its cookie
+    session.clear()
     return jsonify({"message": "Logged out successfully"})
 
 
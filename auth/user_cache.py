@@ -0,0 +1,64 @@
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from database.db import db
+from models.user import User
+from .config import AuthConfig
+from .local_cache import LocalTTLCache
+import logging
+import uuid
+
+logger = logging.getLogger('auth')
+
+class UserCache:
+    """
+    In-process cache of the user identity loaded for each logged-in request.
+
+    Only the identity columns are cached. A hit is rebuilt into a User and
+    merged into the session without loading, so current_user works as usual
+    and any other column is lazy loaded on first access. Entries are dropped
+    whenever a User is updated or deleted through the ORM; raw SQL writes to
+    users must call invalidate() themselves.
+    """
+
+    FIELDS = ('email', 'is_active', 'subscription_tier')
+
+    def __init__(self, ttl=AuthConfig.USER_CACHE_TTL, max_entries=AuthConfig.USER_CACHE_MAX_ENTRIES):
+        self._local = LocalTTLCache(ttl, max_entries, name='user_local')
+
+    def get(self, user_id):
+        """Return the User for a session user id, or None if it does not exist"""
+        try:
+            user_id = uuid.UUID(str(user_id))
+        except ValueError:
+            return None
+
+        fields = self._local.get(user_id)
+        if fields is None:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                self._local.set(user_id, {field: getattr(user, field) for field in self.FIELDS})
+            return user
+
+        user = User(user_id=user_id, **fields)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        """Forget a user after an account change"""
+        try:
+            self._local.pop(uuid.UUID(str(user_id)))
+        except ValueError:
+            pass
+
+    def clear(self):
+        self._local.clear()
+
+    def memory_usage(self):
+        return self._local.memory_usage()
+
+user_cache = UserCache()
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_changed_user(mapper, connection, target):
+    user_cache.invalidate(target.user_id)
@@ -1,5 +1,9 @@
 from .tasks import BackgroundTaskManager
 from .config import BackgroundConfig
+from .prediction_log import PredictionLogBuffer
+from .popularity import TickerPopularity
+from .model_gc import collect_model_artifacts
+from .prediction_outcomes import score_predictions, load_scored_predictions, QualityFeed, quality_feed
 
 def init_background_tasks(app):
     return BackgroundTaskManager(app)
\ No newline at end of file
@@ -13,6 +13,13 @@ class BackgroundConfig:
     RETRAINING_HOUR = int(os.getenv('RETRAINING_HOUR', '1')) #1 am
     TRAINING_HISTORY_DAYS = int(os.getenv('TRAINING_HISTORY_DAYS', '3650')) #ten years
     MAX_RETRAIN_ATTEMPTS = int(os.getenv('MAX_RETRAINING_ATTEMPTS', '3'))
+    RETRAINING_TICKER_COUNT = int(os.getenv('RETRAINING_TICKER_COUNT', '5'))
+    POPULARITY_WINDOW_DAYS = int(os.getenv('POPULARITY_WINDOW_DAYS', '7'))
+
+    #model artifact retention
+    MODEL_GC_HOUR = int(os.getenv('MODEL_GC_HOUR', '3')) #3 am, after retraining
+    MODELS_KEPT_PER_TICKER = int(os.getenv('MODELS_KEPT_PER_TICKER', '5'))
+    ARTIFACT_GC_GRACE_SECONDS = int(os.getenv('ARTIFACT_GC_GRACE_SECONDS', '3600'))
 
 
     #MARKET DATA UPDATE settings
@@ -24,8 +31,22 @@ class BackgroundConfig:
     #CACHE management settings
     CACHE_CLEANUP_HOUR = int(os.getenv('CACHE_CLEANUP_HOUR', '2')) #2am
     PREDICTION_RETENTION_DAYS = int(os.getenv('PREDICTION_RETENTION_DAYS', '30'))
+    PREDICTION_PARTITIONS_AHEAD = int(os.getenv('PREDICTION_PARTITIONS_AHEAD', '3')) #months
     REDIS_CACHE_TTL = timedelta(hours = int(os.getenv('REDIS_CACHE_TTL_HOURS', '24')))
 
+    #PREDICTION LOG (write-behind) settings
+    PREDICTION_LOG_BATCH_SIZE = int(os.getenv('PREDICTION_LOG_BATCH_SIZE', '500'))
+    PREDICTION_LOG_FLUSH_SECONDS = float(os.getenv('PREDICTION_LOG_FLUSH_SECONDS', '5'))
+    PREDICTION_LOG_MAX_PENDING = int(os.getenv('PREDICTION_LOG_MAX_PENDING', '10000'))
+    PREDICTION_LOG_ENQUEUE_TIMEOUT = float(os.getenv('PREDICTION_LOG_ENQUEUE_TIMEOUT', '0.05')) #seconds
+    PREDICTION_LOG_TAIL = int(os.getenv('PREDICTION_LOG_TAIL', '1')) #most recent predictions logged per request
+
+    #PREDICTION SCORING settings
+    PREDICTION_SCORING_MINUTE = int(os.getenv('PREDICTION_SCORING_MINUTE', '30')) #hourly, at this minute
+    QUALITY_FEED_MAXLEN = int(os.getenv('QUALITY_FEED_MAXLEN', '100000')) #outcomes kept on the shared stream
+    #outcomes published this long after a worker loaded the table may already be in what it loaded
+    QUALITY_FEED_GRACE_SECONDS = int(os.getenv('QUALITY_FEED_GRACE_SECONDS', '300'))
+
     #DATABASE Settings
     DB_BATCH_SIZE = int(os.getenv('DB_BATCH_SIZE', '1000'))
     MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '5'))
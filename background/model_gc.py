@@ -0,0 +1,72 @@
+from models.registry import model_registry
+from models.artifact_store import artifact_store, read_manifest
+from .config import BackgroundConfig
+import logging
+import shutil
+import os
+
+logger = logging.getLogger('background_tasks')
+
+LEGACY_ARTIFACTS = ['lstm_model.keras', 'scaler.pkl']
+
+def select_retained(entries, keep_per_ticker):
+    """Model ids to keep: the newest keep_per_ticker per ticker plus every active model"""
+    by_ticker = {}
+    for entry in entries:
+        by_ticker.setdefault(entry['ticker'], []).append(entry)
+
+    retained = {entry['model_id'] for entry in entries if entry['is_active']}
+    for ticker_entries in by_ticker.values():
+        ticker_entries.sort(key=lambda entry: entry['created_at'])
+        retained.update(entry['model_id'] for entry in ticker_entries[-keep_per_ticker:])
+    return retained
+
+def collect_model_artifacts(registry=model_registry, store=artifact_store,
+                            keep_per_ticker=BackgroundConfig.MODELS_KEPT_PER_TICKER,
+                            grace_seconds=BackgroundConfig.ARTIFACT_GC_GRACE_SECONDS):
+    """
+    Apply model retention and garbage collect the artifact store.
+
+    Retired versions lose their directory and are marked in model_versions,
+    complete directories saved before the artifact store are moved into it
+    (which deduplicates identical files), and then objects that no remaining
+    manifest refers to are deleted. Needs an app context.
+    """
+    stats = {'retired': 0, 'migrated': 0}
+    registry.refresh(force=True)
+    entries = registry.entries()
+    retained = select_retained(entries, keep_per_ticker)
+
+    retired = [entry for entry in entries if entry['model_id'] not in retained]
+    #commit the rows first, so a failure never leaves an active row pointing at a deleted directory
+    stats['retired'] = registry.retire([entry['model_id'] for entry in retired])
+    for entry in retired:
+        shutil.rmtree(entry['path'], ignore_errors=True)
+
+    #every manifest on disk counts as a reference, registered or not
+    referenced = set()
+    if os.path.isdir(registry.path):
+        for version_dir in os.listdir(registry.path):
+            version_path = os.path.join(registry.path, version_dir)
+            if not os.path.isdir(version_path) or version_dir.startswith('.'):
+                continue
+            manifest = read_manifest(version_path)
+            if manifest is None:
+                legacy = [name for name in LEGACY_ARTIFACTS if os.path.exists(os.path.join(version_path, name))]
+                if not legacy:
+                    continue
+                if len(legacy) < len(LEGACY_ARTIFACTS):
+                    #a half-written save; a manifest would only point the loader at missing files
+                    logger.warning(f"Skipping {version_path}: only {', '.join(legacy)} present")
+                    continue
+                try:
+                    manifest = store.put_directory(version_path, legacy)
+                    stats['migrated'] += 1
+                except Exception as e:
+                    logger.error(f"Error moving {version_path} into the artifact store: {str(e)}")
+                    continue
+            referenced.update(record['digest'] for record in manifest.values())
+
+    stats.update(store.sweep(referenced, grace_seconds))
+    logger.info(f"Model artifact GC: {stats}")
+    return stats
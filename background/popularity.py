@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from .config import BackgroundConfig
+import logging
+import uuid
+
+logger = logging.getLogger('background_tasks')
+
+class TickerPopularity:
+    """Day-bucketed ticker request counters kept in Redis sorted sets"""
+
+    KEY_PREFIX = 'popularity:tickers'
+
+    def __init__(self, redis_client=None, window_days=BackgroundConfig.POPULARITY_WINDOW_DAYS):
+        self._redis_client = redis_client
+        self.window_days = window_days
+        #buckets outlive the window by a day so a full window is always available
+        self.bucket_ttl = int(timedelta(days=window_days + 1).total_seconds())
+
+    @property
+    def redis_client(self):
+        """Explicit client if given, otherwise the app's shared client"""
+        if self._redis_client is not None:
+            return self._redis_client
+        return getattr(current_app, 'redis_client', None)
+
+    def bucket_key(self, day):
+        """Sorted set holding one UTC day of counts"""
+        return f"{self.KEY_PREFIX}:{day.strftime('%Y%m%d')}"
+
+    def record(self, ticker, count=1):
+        """Increment today's counter for a ticker in one round trip"""
+        redis_client = self.redis_client
+        if not redis_client:
+            return False
+
+        key = self.bucket_key(datetime.now(timezone.utc))
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.zincrby(key, count, ticker)
+            pipe.expire(key, self.bucket_ttl)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error recording popularity for {ticker}: {str(e)}")
+            return False
+
+    def top(self, limit=5, days=None):
+        """
+        Return the most requested tickers over the last N days as (ticker, count) tuples.
+
+        Cost depends on the number of distinct tickers in the window, not on
+        how many predictions were served. Returns None when Redis is unavailable
+        so callers can fall back to the predictions table.
+        """
+        redis_client = self.redis_client
+        if not redis_client:
+            return None
+
+        days = days or self.window_days
+        today = datetime.now(timezone.utc)
+        keys = [self.bucket_key(today - timedelta(days=offset)) for offset in range(days)]
+        union_key = f"{self.KEY_PREFIX}:union:{uuid.uuid4().hex}"
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.zunionstore(union_key, keys)
+            pipe.zrevrange(union_key, 0, limit - 1, withscores=True)
+            pipe.delete(union_key)
+            _, ranked, _ = pipe.execute()
+        except Exception as e:
+            logger.error(f"Error reading ticker popularity: {str(e)}")
+            return None
+
+        return [
+            (ticker.decode('utf-8') if isinstance(ticker, bytes) else ticker, int(score))
+            for ticker, score in ranked
+        ]
@@ -0,0 +1,167 @@
+from datetime import datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from database.db import db
+from utils.instrumentation import metrics_registry
+from .config import BackgroundConfig
+import threading
+import logging
+import atexit
+import queue
+import uuid
+
+logger = logging.getLogger('background_tasks')
+
+rejected_entries = metrics_registry.counter(
+    'prediction_log_rejected_total', 'Prediction log entries the database refused, e.g. for a retired model_id')
+
+class PredictionLogBuffer:
+    """Write-behind buffer that batches served predictions into the predictions table"""
+
+    def __init__(self, app=None,
+                 batch_size=BackgroundConfig.PREDICTION_LOG_BATCH_SIZE,
+                 flush_interval=BackgroundConfig.PREDICTION_LOG_FLUSH_SECONDS,
+                 max_pending=BackgroundConfig.PREDICTION_LOG_MAX_PENDING,
+                 enqueue_timeout=BackgroundConfig.PREDICTION_LOG_ENQUEUE_TIMEOUT):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.app = None
+        self.dropped = 0
+        self.rejected = 0
+        self.written = 0
+        self._stats_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Start the background writer for a flask app"""
+        self.app = app
+        self._thread = threading.Thread(target=self._run, name='prediction-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def record(self, ticker, target_date, predicted_value, user_id=None, model_id=None):
+        """
+        Queue a served prediction without touching the database.
+
+        When the buffer is full the caller waits at most enqueue_timeout for the
+        writer to catch up, after which the entry is dropped and counted so that
+        a burst can never stall the request path or grow memory without bound.
+        """
+        entry = {
+            'prediction_id': str(uuid.uuid4()),
+            'user_id': str(user_id) if user_id else None,
+            'model_id': str(model_id) if model_id else None,
+            'ticker': ticker,
+            'prediction_date': datetime.now(timezone.utc),
+            'target_date': target_date,
+            'predicted_value': float(predicted_value)
+        }
+        try:
+            self.pending.put(entry, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"Prediction log buffer full, {dropped} entries dropped so far")
+            return False
+
+        if self.pending.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def _drain(self):
+        """Take up to batch_size queued entries"""
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write everything currently queued in bulk inserts of batch_size rows"""
+        sql = text("""
+            INSERT INTO predictions
+            (prediction_id, user_id, model_id, ticker, prediction_date, target_date, predicted_value)
+            VALUES (:prediction_id, :user_id, :model_id, :ticker, :prediction_date, :target_date, :predicted_value)
+        """)
+
+        if self.app is None:
+            return 0
+
+        with self._flush_lock, self.app.app_context():
+            written = 0
+            batch = self._drain()
+            while batch:
+                written += self._insert(sql, batch)
+                batch = self._drain()
+
+            with self._stats_lock:
+                self.written += written
+            return written
+
+    def _insert(self, sql, batch):
+        """
+        Insert a batch in one transaction.
+
+        A constraint violation rolls back the whole transaction, so the batch
+        is split in halves until the offending rows are alone; only those are
+        left out and counted as rejected. Returns the number of rows written.
+        """
+        try:
+            db.session.execute(sql, batch)
+            db.session.commit()
+            return len(batch)
+        except IntegrityError as e:
+            db.session.rollback()
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                return self._insert(sql, batch[:middle]) + self._insert(sql, batch[middle:])
+            logger.error(f"Rejected prediction log entry for {batch[0]['ticker']} (model {batch[0]['model_id']}): {str(e.orig)}")
+            with self._stats_lock:
+                self.rejected += 1
+            rejected_entries.inc()
+            return 0
+        except Exception as e:
+            #drop the batch rather than retrying forever and blocking newer entries
+            logger.error(f"Error writing {len(batch)} prediction log entries: {str(e)}")
+            db.session.rollback()
+            with self._stats_lock:
+                self.dropped += len(batch)
+            return 0
+
+    def _run(self):
+        """Flush when the batch size is reached or the flush interval passes"""
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stop(self, timeout=10):
+        """Stop the writer and flush anything still queued"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush()
+
+    def get_stats(self):
+        """Buffer health for monitoring"""
+        with self._stats_lock:
+            return {
+                'pending': self.pending.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,221 @@
+from datetime import date, datetime, time, timedelta, timezone
+from flask import current_app
+from sqlalchemy import text
+from database.db import db
+from utils.metrics import model_quality
+from .config import BackgroundConfig
+import threading
+import logging
+import time as clock
+
+logger = logging.getLogger('background_tasks')
+
+#served predictions joined with the adjusted close of their target date and the one before it;
+#the model predicts Adj Close, so raw closes would count every dividend and split as error
+OUTCOMES_SQL = """
+    SELECT p.prediction_id, p.ticker, p.target_date, p.predicted_value,
+           h.adjusted_close AS actual_value,
+           (SELECT prev.adjusted_close FROM historical_data prev
+            WHERE prev.ticker = p.ticker AND prev.date < p.target_date
+            ORDER BY prev.date DESC LIMIT 1) AS reference_value,
+           p.model_id, m.version AS model_version, m.created_at AS model_created_at
+    FROM predictions p
+    JOIN historical_data h ON h.ticker = p.ticker AND h.date = p.target_date
+    LEFT JOIN model_versions m ON m.model_id = p.model_id
+"""
+
+def _target_time(value):
+    """Epoch seconds of a target date at midnight UTC"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        value = value.date()
+    return datetime.combine(value, time(), tzinfo=timezone.utc).timestamp()
+
+#fields of an outcome as published on the quality feed
+FEED_FIELDS = ('prediction_id', 'ticker', 'model_id', 'model_version', 'model_created_at',
+               'target_date', 'actual_value', 'predicted_value', 'reference_value')
+
+def _record(tracker, row):
+    created_at = row['model_created_at']
+    tracker.record(
+        row['ticker'],
+        str(row['model_id']) if row['model_id'] else 'unknown',
+        row['actual_value'],
+        row['predicted_value'],
+        reference=row['reference_value'],
+        at=_target_time(row['target_date']),
+        version=row['model_version'],
+        created_at=created_at.isoformat() if isinstance(created_at, datetime) else created_at
+    )
+
+def _scored_rows(days):
+    sql = text(OUTCOMES_SQL + """
+        WHERE p.actual_value IS NOT NULL AND p.target_date >= :since
+    """)
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).date()
+    return db.session.execute(sql, {'since': since}).mappings().all()
+
+def load_scored_predictions(tracker=model_quality, days=None):
+    """Feed tracker the predictions already scored within its longest window, e.g. after a restart"""
+    rows = _scored_rows(days or max(tracker.windows.values()) // 86400)
+    for row in rows:
+        _record(tracker, row)
+    logger.info(f"Loaded {len(rows)} scored predictions into the quality tracker")
+    return len(rows)
+
+class QualityFeed:
+    """
+    Outcomes scored by any worker, shared through a Redis stream.
+
+    A prediction is scored by the one worker that claims it, so that worker
+    publishes the outcome and every worker, itself included, adds the
+    entries after the last one it read to its own tracker. load() seeds the
+    tracker from the predictions table and starts reading from the end of
+    the stream. Without Redis a worker only tracks what it scored itself.
+    """
+
+    STREAM_KEY = 'quality:outcomes'
+
+    def __init__(self, tracker=model_quality, redis_client=None, maxlen=BackgroundConfig.QUALITY_FEED_MAXLEN):
+        self.tracker = tracker
+        self._redis_client = redis_client
+        self.maxlen = maxlen
+        self.loaded = False
+        self.last_id = None #None reads nothing, the worker records its own outcomes
+        self._loaded_ids = set()
+        self._loaded_until = 0
+        self._lock = threading.Lock()
+
+    @property
+    def redis_client(self):
+        """Explicit client if given, otherwise the app's shared client"""
+        if self._redis_client is not None:
+            return self._redis_client
+        return getattr(current_app, 'redis_client', None)
+
+    @property
+    def shared(self):
+        return self.last_id is not None
+
+    def load(self, days=None):
+        """Seed the tracker with the predictions already scored and start following the stream"""
+        with self._lock:
+            redis_client = self.redis_client
+            last_id = None
+            if redis_client:
+                try:
+                    newest = redis_client.xrevrange(self.STREAM_KEY, count=1)
+                    last_id = _text(newest[0][0]) if newest else '0-0'
+                except Exception as e:
+                    logger.error(f"Quality feed unavailable, tracking this worker's outcomes only: {str(e)}")
+            rows = _scored_rows(days or max(self.tracker.windows.values()) // 86400)
+            for row in rows:
+                _record(self.tracker, row)
+            #rows committed before the query may be published after it; skip those when they arrive
+            self._loaded_ids = {str(row['prediction_id']) for row in rows}
+            self._loaded_until = (clock.time() + BackgroundConfig.QUALITY_FEED_GRACE_SECONDS) * 1000
+            self.last_id = last_id
+            self.loaded = True
+        logger.info(f"Loaded {len(rows)} scored predictions into the quality tracker")
+        return len(rows) + self.consume()
+
+    def publish(self, rows):
+        """Send outcomes to every worker; False when they must be recorded locally instead"""
+        redis_client = self.redis_client
+        if not self.shared or not redis_client:
+            return False
+        if not rows:
+            return True
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for row in rows:
+                fields = {name: _field(row[name]) for name in FEED_FIELDS}
+                pipe.xadd(self.STREAM_KEY, fields, maxlen=self.maxlen, approximate=True)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error publishing {len(rows)} prediction outcomes: {str(e)}")
+            return False
+
+    def consume(self, count=1000):
+        """Record the outcomes published since the last call; returns how many were recorded"""
+        recorded = 0
+        with self._lock:
+            redis_client = self.redis_client
+            if not self.shared or not redis_client:
+                return 0
+            try:
+                while True:
+                    batch = redis_client.xread({self.STREAM_KEY: self.last_id}, count=count)
+                    entries = batch[0][1] if batch else []
+                    for entry_id, fields in entries:
+                        self.last_id = _text(entry_id)
+                        row = {_text(name): _text(value) for name, value in fields.items()}
+                        if self._loaded_ids:
+                            if int(self.last_id.split('-')[0]) > self._loaded_until:
+                                self._loaded_ids = set()
+                            elif row['prediction_id'] in self._loaded_ids:
+                                continue
+                        for name in ('model_id', 'model_version', 'model_created_at', 'reference_value'):
+                            row[name] = row[name] or None
+                        _record(self.tracker, row)
+                        recorded += 1
+                    if len(entries) < count:
+                        break
+            except Exception as e:
+                logger.error(f"Error reading the quality feed: {str(e)}")
+        return recorded
+
+def _field(value):
+    if value is None:
+        return ''
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+quality_feed = QualityFeed()
+
+def score_predictions(tracker=model_quality, batch_size=1000, feed=None):
+    """
+    Fill in actual_value of predictions whose target date now has market data.
+
+    Each row is claimed with a conditional update, so when several workers
+    run this job a prediction is counted by exactly one of them. The rows
+    this call claimed are published on feed for every worker to record, or
+    added to tracker directly when there is no shared feed.
+    """
+    select_sql = text(OUTCOMES_SQL + """
+        WHERE p.actual_value IS NULL
+        ORDER BY p.target_date
+        LIMIT :limit
+    """)
+    claim_sql = text("""
+        UPDATE predictions
+        SET actual_value = :actual_value
+        WHERE prediction_id = :prediction_id AND actual_value IS NULL
+    """)
+
+    scored = 0
+    while True:
+        rows = db.session.execute(select_sql, {'limit': batch_size}).mappings().all()
+        claimed = []
+        for row in rows:
+            result = db.session.execute(claim_sql, {
+                'actual_value': row['actual_value'],
+                'prediction_id': row['prediction_id']
+            })
+            if result.rowcount:
+                claimed.append(row)
+        db.session.commit()
+
+        if not (feed and feed.publish(claimed)):
+            for row in claimed:
+                _record(tracker, row)
+        scored += len(claimed)
+        if len(rows) < batch_size:
+            break
+
+    logger.info(f"Scored {scored} predictions against actual prices")
+    return scored
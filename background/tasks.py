@@ -5,6 +5,13 @@ import yfinance as yf
 import pandas as pd
 from models.lstm_model import StockPredictor
 from database.db import db
+from database.market_data import HistoricalDataCache
+from database.partitions import ensure_prediction_partitions, purge_expired_predictions
+from .config import BackgroundConfig
+from .popularity import TickerPopularity
+from .model_gc import collect_model_artifacts
+from .prediction_outcomes import score_predictions, quality_feed
+from config.cache import CacheStore
 from sqlalchemy import text
 import logging
 import json
@@ -18,7 +25,8 @@ logger = logging.getLogger('background_tasks')
 class BackgroundTaskManager:
     def __init__(self, app=None):
         self.scheduler = BackgroundScheduler()
-        self.predictor = StockPredictor()
+        self.predictor = StockPredictor(data_cache=HistoricalDataCache())
+        self.popularity = TickerPopularity()
         self.app = app
         if app:
             self.init_app(app)
@@ -81,19 +89,28 @@ class BackgroundTaskManager:
         """Database-agnostic way to get recent tickers"""
         try:
             with self.app.app_context():
-                #SQLite-compatible date query
-                sql = text("""
-                    SELECT ticker, COUNT(*) as request_count
-                    FROM predictions
-                    WHERE predictions_date >= datetime('now', ?)
-                    GROUP BY ticker
-                    ORDER BY request_count DESC
-                    LIMIT 5
-                """)
-                return db.session.execute(sql, [f'-{days} days']).fetchall()
+                return self.get_popular_tickers(days=days)
         except Exception as e:
             self.set_task_status('model_retraining', 'error', str(e))
             raise
+
+    def get_popular_tickers(self, limit=BackgroundConfig.RETRAINING_TICKER_COUNT, days=BackgroundConfig.POPULARITY_WINDOW_DAYS):
+        """Most requested tickers from the Redis counters, falling back to the predictions table"""
+        popular_tickers = self.popularity.top(limit, days)
+        if popular_tickers:
+            return popular_tickers
+
+        logger.info("Ticker popularity counters unavailable, counting predictions table")
+        sql = text("""
+            SELECT ticker, COUNT(*) as request_count
+            FROM predictions
+            WHERE prediction_date >= :since
+            GROUP BY ticker
+            ORDER BY request_count DESC
+            LIMIT :limit
+        """)
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        return [tuple(row) for row in db.session.execute(sql, {'since': since, 'limit': limit}).fetchall()]
     
     def init_app(self, app):
         """Initialize with flask app context"""
@@ -124,21 +141,30 @@ class BackgroundTaskManager:
             id = 'cache_cleanup'
         )
 
+        #model retention and artifact garbage collection - daily after retraining
+        self.scheduler.add_job(
+            self.collect_model_artifacts,
+            CronTrigger(hour = BackgroundConfig.MODEL_GC_HOUR, minute=0),
+            id = 'model_artifact_gc'
+        )
+
+        #score served predictions once their actual prices are in - hourly
+        self.scheduler.add_job(
+            self.score_predictions,
+            CronTrigger(minute = BackgroundConfig.PREDICTION_SCORING_MINUTE),
+            id = 'prediction_scoring'
+        )
+
+        #load the quality metrics once at startup instead of waiting for the first scoring run
+        self.scheduler.add_job(self.load_prediction_quality, id='prediction_quality_load')
+
     def retrain_model(self):
         """Periodic model retraining"""
         try:
             logger.info(f"Starting model retraining task at {datetime.now(timezone.utc)}")         
             with self.app.app_context():
                 #get list of most requested tickers
-                sql = text("""
-                    SELECT ticker, COUNT(*) as request_count
-                    FROM predictions
-                    WHERE predictions_date > NOW() - INTERVAL '7 days'
-                    GROUP BY ticker
-                    ORDER BY request_count DESC
-                    LIMIT 5
-                """)
-                popular_tickers = db.session.execute(sql).fetchall()
+                popular_tickers = self.get_popular_tickers()
 
                 for ticker, _ in popular_tickers:
                     logger.info(f"Retraining model for {ticker}")
@@ -146,27 +172,15 @@ class BackgroundTaskManager:
                         # Train model with latest data
                         model, history, X_test, y_test = self.predictor.train(
                             ticker, 
-                            start_date = (datetime.now(timezone.utc) - timedelta(days = 3650)).strftime('%Y-%m-%d'),
-                            end_date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+                            (datetime.now(timezone.utc) - timedelta(days = BackgroundConfig.TRAINING_HISTORY_DAYS)).strftime('%Y-%m-%d'),
+                            datetime.now(timezone.utc).strftime('%Y-%m-%d')
                         )
 
-                        #save new model
-                        model_path = self.predictor.save_model()
-
-                        #Update model metadata in database
-                        sql = text("""
-                            INSERT INTO model_versions (version, parameters, metrics)
-                            VALUES (:version, :parameters, :metrics)
-                        """)
-                        db.session.execute(sql, {
-                            'versions': self.predictor.version,
-                            'parameters': json.dumps(self.predictor.training_metadata),
-                            'metrics': json.dumps({
-                                'training_loss': history.history['loss'][-1],
-                                'val_loss': history.history['val_loss'][-1]
-                            })
+                        #save new model; save_model registers it in model_versions
+                        model_path = self.predictor.save_model(metrics={
+                            'training_loss': history.history['loss'][-1],
+                            'val_loss': history.history['val_loss'][-1]
                         })
-                        db.session.commit()
 
                         logger.info(f"Successfully retraining model for {ticker}")
                     except Exception as e:
@@ -235,12 +249,13 @@ class BackgroundTaskManager:
         try:
             logger.info(f"Starting cache management task at {datetime.now(timezone.utc)}") 
             with self.app.app_context():
-                #clean up old predictions
-                sql = text("""
-                    DELETE FROM predictions
-                    WHERE prediction_data < NOW() - INTERVAL '30 days'
-                """)
-                db.session.execute(sql)
+                #keep partitions ahead of incoming predictions and apply retention
+                ensure_prediction_partitions(BackgroundConfig.PREDICTION_PARTITIONS_AHEAD)
+                retention = purge_expired_predictions(
+                    BackgroundConfig.PREDICTION_RETENTION_DAYS,
+                    BackgroundConfig.DB_BATCH_SIZE
+                )
+                logger.info(f"Prediction retention applied: {retention}")
 
                 #clean up expired API keys
                 sql = text("""
@@ -250,14 +265,13 @@ class BackgroundTaskManager:
                 """)
                 db.session.execute(sql)
 
-                #clean up redis cache
-                for key in self.redis.scan_iter("cache:*"):
-                    try:
-                        #check if cache entry is expired (older than 24 hours)
-                        if float(self.redis.get(f"{key}:timestamp") or 0) < (datetime.now(timezone.utc) - timedelta(hours = 24)).timestamp():
-                            self.redis.delete(key)
-                    except Exception as e:
-                        logger.error(f"Error cleaning up Redis key {key}: {str(e)}")
+                #cache entries expire natively; only keys written without a TTL need sweeping
+                cache = CacheStore(self.redis_client, BackgroundConfig.REDIS_CACHE_TTL)
+                if self.redis_client:
+                    sweep_stats = cache.sweep_legacy(batch_size=BackgroundConfig.DB_BATCH_SIZE)
+                    memory_usage = cache.memory_usage()
+                    self.redis_client.set('task:cache_cleanup:memory_usage', json.dumps(memory_usage))
+                    logger.info(f"Cache sweep {sweep_stats}, memory usage by namespace {memory_usage}")
 
                 db.session.commit()
                 logger.info("Cache cleanup completed succcessfully")
@@ -267,6 +281,47 @@ class BackgroundTaskManager:
             logger.error(f"Cache management job failed: {str(e)}")
             db.session.rollback()
     
+    def collect_model_artifacts(self):
+        """Retire old model versions and delete unreferenced artifacts"""
+        try:
+            logger.info(f"Starting model artifact GC at {datetime.now(timezone.utc)}")
+            with self.app.app_context():
+                stats = collect_model_artifacts()
+                if self.redis_client:
+                    self.redis_client.set('task:model_artifact_gc:last_run', json.dumps(stats))
+            logger.info(f"Completed model artifact GC at {datetime.now(timezone.utc)}")
+        except Exception as e:
+            logger.error(f"Model artifact GC job failed: {str(e)}")
+            db.session.rollback()
+
+    def load_prediction_quality(self):
+        """Seed this worker's quality metrics with the predictions scored before it started"""
+        try:
+            with self.app.app_context():
+                if not quality_feed.loaded:
+                    quality_feed.load()
+        except Exception as e:
+            logger.error(f"Loading prediction quality failed: {str(e)}")
+            db.session.rollback()
+
+    def score_predictions(self):
+        """Record actual prices of past predictions and update the streaming quality metrics"""
+        try:
+            logger.info(f"Starting prediction scoring at {datetime.now(timezone.utc)}")
+            with self.app.app_context():
+                #retries the startup load if it failed
+                if not quality_feed.loaded:
+                    quality_feed.load()
+                scored = score_predictions(batch_size=BackgroundConfig.DB_BATCH_SIZE, feed=quality_feed)
+                #outcomes other workers scored since the last run
+                quality_feed.consume()
+                if self.redis_client:
+                    self.redis_client.set('task:prediction_scoring:last_run', json.dumps({'scored': scored}))
+            logger.info(f"Completed prediction scoring at {datetime.now(timezone.utc)}")
+        except Exception as e:
+            logger.error(f"Prediction scoring job failed: {str(e)}")
+            db.session.rollback()
+
     def get_task_metrics(self):
         """Get metrics for background tasks"""
         metrics = {
@@ -1,10 +1,19 @@
 from .redis import init_redis
+from .cache import CacheStore, init_cache
+from .session import RedisSessionInterface, init_session
+from .http_client import HTTPClient, http_client, init_http_client
 
 def init_config(app):
     """Initialize all configuration components"""
     init_redis(app)
+    init_cache(app)
+    init_session(app)
+    init_http_client(app)
 
     #return configuration objects for access elsewhere
     return {
-        'redis_client': app.redis_client
+        'redis_client': app.redis_client,
+        'cache': app.cache,
+        'session_interface': app.session_interface,
+        'http_client': app.http_client
     }
\ No newline at end of file
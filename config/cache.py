@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta, timezone
+import os
+import json
+import time
+import logging
+from utils.instrumentation import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+#same setting as BackgroundConfig.REDIS_CACHE_TTL
+DEFAULT_CACHE_TTL = timedelta(hours=int(os.getenv('REDIS_CACHE_TTL_HOURS', '24')))
+GENERATION_REFRESH_SECONDS = float(os.getenv('CACHE_GENERATION_REFRESH_SECONDS', '5'))
+
+def _to_str(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+class CacheStore:
+    """
+    Namespaced Redis cache whose entries expire through native TTLs.
+
+    Keys look like cache:<namespace>:v<generation>:<key>. Invalidating a
+    namespace bumps its generation so old entries become unreachable and
+    simply age out, instead of being scanned and deleted.
+    """
+
+    KEY_PREFIX = 'cache'
+    NAMESPACES_KEY = 'cache:namespaces'
+
+    def __init__(self, redis_client=None, default_ttl=DEFAULT_CACHE_TTL):
+        self.redis_client = redis_client
+        self.default_ttl = int(default_ttl.total_seconds()) if isinstance(default_ttl, timedelta) else int(default_ttl)
+        #namespace -> (generation, fetched_at); other processes see a bump within GENERATION_REFRESH_SECONDS
+        self._generations = {}
+        self._known_namespaces = set()
+
+    def _generation_key(self, namespace):
+        return f"{self.KEY_PREFIX}:{namespace}:generation"
+
+    def generation(self, namespace):
+        """Current generation of a namespace"""
+        cached = self._generations.get(namespace)
+        if cached and time.monotonic() - cached[1] < GENERATION_REFRESH_SECONDS:
+            return cached[0]
+
+        generation = int(self.redis_client.get(self._generation_key(namespace)) or 0)
+        self._generations[namespace] = (generation, time.monotonic())
+        return generation
+
+    def make_key(self, namespace, key):
+        """Full redis key for an entry in the namespace's current generation"""
+        return f"{self.KEY_PREFIX}:{namespace}:v{self.generation(namespace)}:{key}"
+
+    def get(self, namespace, key):
+        """Return a cached value or None"""
+        if not self.redis_client:
+            return None
+        try:
+            value = self.redis_client.get(self.make_key(namespace, key))
+            record_cache_lookup(namespace, value is not None)
+            return json.loads(value) if value is not None else None
+        except Exception as e:
+            logger.error(f"Cache get failed for {namespace}:{key}: {str(e)}")
+            return None
+
+    def set(self, namespace, key, value, ttl=None):
+        """Store a JSON-serialisable value with a native TTL"""
+        if not self.redis_client:
+            return False
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.set(self.make_key(namespace, key), json.dumps(value), ex=ttl or self.default_ttl)
+            if namespace not in self._known_namespaces:
+                pipe.sadd(self.NAMESPACES_KEY, namespace)
+            pipe.execute()
+            self._known_namespaces.add(namespace)
+            return True
+        except Exception as e:
+            logger.error(f"Cache set failed for {namespace}:{key}: {str(e)}")
+            return False
+
+    def invalidate(self, namespace):
+        """Drop every entry of a namespace by starting a new generation"""
+        if not self.redis_client:
+            return None
+        generation = self.redis_client.incr(self._generation_key(namespace))
+        self._generations[namespace] = (generation, time.monotonic())
+        logger.info(f"Cache namespace {namespace} invalidated, now at generation {generation}")
+        return generation
+
+    def _is_internal(self, key):
+        return key == self.NAMESPACES_KEY or key.endswith(':generation')
+
+    def sweep_legacy(self, batch_size=500, max_age=None):
+        """
+        Expire cache:* keys written before native TTLs were used.
+
+        Keys are scanned in batches and each batch costs three pipelined round
+        trips (TTL, timestamp sidecar GET, UNLINK/EXPIRE). Entries older than
+        max_age are unlinked together with their :timestamp sidecar, younger
+        ones get a TTL for their remaining lifetime so they never need sweeping again.
+        """
+        if not self.redis_client:
+            return {'scanned': 0, 'deleted': 0, 'expiring': 0}
+
+        max_age = max_age or self.default_ttl
+        now = datetime.now(timezone.utc).timestamp()
+        stats = {'scanned': 0, 'deleted': 0, 'expiring': 0}
+
+        batch = []
+        for key in self.redis_client.scan_iter(match=f"{self.KEY_PREFIX}:*", count=batch_size):
+            batch.append(_to_str(key))
+            if len(batch) >= batch_size:
+                self._sweep_batch(batch, now, max_age, stats)
+                batch = []
+        if batch:
+            self._sweep_batch(batch, now, max_age, stats)
+
+        logger.info(f"Legacy cache sweep: {stats}")
+        return stats
+
+    def _sweep_batch(self, keys, now, max_age, stats):
+        stats['scanned'] += len(keys)
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+        ttls = pipe.execute()
+
+        #-1 means the key exists without an expiry
+        legacy = [key for key, ttl in zip(keys, ttls) if ttl == -1 and not self._is_internal(key)]
+        entries = list(dict.fromkeys(key[:-len(':timestamp')] if key.endswith(':timestamp') else key for key in legacy))
+        if not entries:
+            return
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for entry in entries:
+            pipe.get(f"{entry}:timestamp")
+        stamps = pipe.execute()
+
+        expired = []
+        pipe = self.redis_client.pipeline(transaction=False)
+        for entry, stamp in zip(entries, stamps):
+            try:
+                age = now - float(stamp or 0)
+            except ValueError:
+                age = max_age
+            if age >= max_age:
+                expired.extend([entry, f"{entry}:timestamp"])
+            else:
+                remaining = int(max_age - age) + 1
+                pipe.expire(entry, remaining)
+                pipe.expire(f"{entry}:timestamp", remaining)
+                stats['expiring'] += 1
+        if expired:
+            pipe.unlink(*expired)
+            stats['deleted'] += len(expired) // 2
+        pipe.execute()
+
+    def memory_usage(self, batch_size=500):
+        """Key count and approximate bytes used per namespace"""
+        if not self.redis_client:
+            return {}
+
+        usage = {}
+        for namespace in sorted(_to_str(ns) for ns in self.redis_client.smembers(self.NAMESPACES_KEY)):
+            keys = [_to_str(key) for key in self.redis_client.scan_iter(match=f"{self.KEY_PREFIX}:{namespace}:*", count=batch_size)]
+            keys = [key for key in keys if not self._is_internal(key)]
+            total_bytes = 0
+            for i in range(0, len(keys), batch_size):
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key in keys[i:i + batch_size]:
+                    pipe.memory_usage(key)
+                #MEMORY USAGE is unavailable on some redis-compatible servers
+                total_bytes += sum(size for size in pipe.execute(raise_on_error=False) if isinstance(size, int))
+            usage[namespace] = {
+                'keys': len(keys),
+                'bytes': total_bytes,
+                'generation': self.generation(namespace)
+            }
+        return usage
+
+def init_cache(app):
+    """Attach a CacheStore on top of the app's redis client"""
+    app.cache = CacheStore(getattr(app, 'redis_client', None))
+    return app.cache
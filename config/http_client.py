@@ -0,0 +1,106 @@
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import threading
+import logging
+import time
+import re
+import os
+
+logger = logging.getLogger(__name__)
+
+class HTTPClient:
+    """
+    Shared client for outbound HTTP calls.
+
+    One requests.Session keeps connections alive per host so repeat calls
+    skip the TCP and TLS handshakes, every request gets a timeout, and
+    idempotent requests are retried with backoff on connection errors and
+    5xx/429 responses. get_json_cached() keeps small JSON documents (like
+    OAuth discovery) for as long as their Cache-Control allows.
+    """
+
+    def __init__(self, timeout=None, retries=None, pool_maxsize=None, default_ttl=None):
+        connect_timeout = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3'))
+        read_timeout = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+        self.timeout = timeout or (connect_timeout, read_timeout)
+        self.default_ttl = default_ttl if default_ttl is not None else int(os.getenv('HTTP_CACHE_DEFAULT_TTL', '3600'))
+
+        retry = Retry(
+            total=retries if retries is not None else int(os.getenv('HTTP_RETRIES', '2')),
+            backoff_factor=0.2,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=pool_maxsize or int(os.getenv('HTTP_POOL_MAXSIZE', '10')),
+            max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    @staticmethod
+    def cache_ttl(response, default_ttl):
+        """Seconds a response may be reused according to its Cache-Control header"""
+        cache_control = response.headers.get('Cache-Control', '').lower()
+        if 'no-store' in cache_control or 'no-cache' in cache_control:
+            return 0
+        match = re.search(r'max-age=(\d+)', cache_control)
+        if match:
+            return int(match.group(1))
+        return default_ttl
+
+    def get_json_cached(self, url):
+        """GET a JSON document, reusing it until its max-age runs out"""
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._cache.get(url)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        try:
+            response = self.get(url)
+            response.raise_for_status()
+            document = response.json()
+        except Exception as e:
+            if cached:
+                #serve the stale copy rather than failing logins while the provider is flaky
+                logger.warning(f"Refreshing {url} failed, using cached copy: {str(e)}")
+                return cached[0]
+            raise
+
+        ttl = self.cache_ttl(response, self.default_ttl)
+        if ttl > 0:
+            with self._cache_lock:
+                self._cache[url] = (document, now + ttl)
+        return document
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def close(self):
+        self.session.close()
+
+http_client = HTTPClient()
+
+def init_http_client(app):
+    """Expose the shared outbound HTTP client on the app"""
+    app.http_client = http_client
+    return http_client
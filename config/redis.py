@@ -53,7 +53,7 @@ class RedisConfig:
             #dont raise - allow app to function without redis
             app.redis_client = None
 
-    def _test_connection(self) _> bool:
+    def _test_connection(self) -> bool:
         """Test Redis connection with ping"""
         try:
             self.redis_client.ping()
@@ -0,0 +1,122 @@
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from werkzeug.datastructures import CallbackDict
+from datetime import timedelta
+import secrets
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+class RedisSession(CallbackDict, SessionMixin):
+    """Session data kept server side; the cookie only carries the session id"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the session to a fresh id; the old id's key is deleted when the session is saved"""
+        if not self.new and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+def regenerate_session(session):
+    """Give the current session a new id, e.g. on login so an id planted before it is useless"""
+    if isinstance(session, RedisSession):
+        session.regenerate()
+
+class RedisSessionInterface(SessionInterface):
+    """
+    Stores flask sessions in redis so every app node sees the same sessions.
+
+    Expiry slides: each request that uses a session pushes its TTL out by
+    another lifetime, so only idle sessions expire.
+    """
+
+    KEY_PREFIX = 'session'
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, redis_client, lifetime=timedelta(days=7)):
+        self.redis_client = redis_client
+        self.lifetime = lifetime
+
+    def make_key(self, sid):
+        return f"{self.KEY_PREFIX}:{sid}"
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return RedisSession(sid=secrets.token_urlsafe(32), new=True)
+        try:
+            value = self.redis_client.get(self.make_key(sid))
+        except Exception as e:
+            logger.error(f"Session read failed: {str(e)}")
+            value = None
+        if value is None:
+            #unknown or expired id: start over with a fresh id instead of trusting the client's
+            return RedisSession(sid=secrets.token_urlsafe(32), new=True)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return RedisSession(self.serializer.loads(value), sid=sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        key = self.make_key(session.sid)
+
+        if session.previous_sid:
+            try:
+                self.redis_client.delete(self.make_key(session.previous_sid))
+            except Exception as e:
+                logger.error(f"Session delete failed: {str(e)}")
+
+        if not session:
+            if session.modified:
+                try:
+                    self.redis_client.delete(key)
+                except Exception as e:
+                    logger.error(f"Session delete failed: {str(e)}")
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        try:
+            if session.modified or session.new:
+                self.redis_client.set(key, self.serializer.dumps(dict(session)), ex=self.lifetime)
+            else:
+                self.redis_client.expire(key, self.lifetime)
+        except Exception as e:
+            logger.error(f"Session write failed: {str(e)}")
+            return
+
+        if session.modified or session.new or session.permanent:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+def init_session(app):
+    """Store sessions in redis when it is available, otherwise keep flask's cookie sessions"""
+    redis_client = getattr(app, 'redis_client', None)
+    if not redis_client:
+        logger.warning("Redis unavailable, using cookie sessions")
+        return None
+
+    lifetime = timedelta(seconds=int(os.getenv('SESSION_LIFETIME_SECONDS', str(7 * 24 * 3600))))
+    app.config['SESSION_TYPE'] = 'redis'
+    app.config['PERMANENT_SESSION_LIFETIME'] = lifetime
+    app.session_interface = RedisSessionInterface(redis_client, lifetime)
+    return app.session_interface
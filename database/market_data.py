@@ -0,0 +1,286 @@
+import pandas as pd
+import yfinance as yf
+from flask import has_app_context
+from sqlalchemy import text
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+from .db import db
+from utils.market_calendar import trading_days, find_gaps
+from utils.instrumentation import data_fetch_duration, record_cache_lookup
+
+logger = logging.getLogger('market_data')
+
+DB_BATCH_SIZE = int(os.getenv('DB_BATCH_SIZE', '1000'))
+#sessions the provider returned nothing for are not asked for again for this long
+EMPTY_RANGE_TTL_DAYS = int(os.getenv('MARKET_DATA_EMPTY_TTL_DAYS', '30'))
+#bars for the last few sessions can lag at the provider, so they are never recorded as empty
+EMPTY_RANGE_MIN_AGE_DAYS = 7
+#dividends and splits restate the provider's adjusted closes; cached bars older than this are checked again
+ADJUSTED_MAX_AGE_DAYS = int(os.getenv('MARKET_DATA_ADJUSTED_MAX_AGE_DAYS', '7'))
+#both sides are rounded to the stored 2 dp, so any larger difference is a restatement
+ADJUSTED_TOLERANCE = 0.005
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+def download_ticker_data(ticker, start_date, end_date):
+    """Fetch daily bars from yfinance in the layout the predictor expects"""
+    data = yf.download(ticker, start=start_date, end=end_date, auto_adjust=False, progress=False)
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    return data
+
+class HistoricalDataCache:
+    """Read-through cache of daily bars backed by the historical_data table"""
+
+    def __init__(self, provider=download_ticker_data, batch_size=DB_BATCH_SIZE):
+        self.provider = provider
+        self.batch_size = batch_size
+
+    def _download(self, ticker, start_date, end_date):
+        with data_fetch_duration.time(stage='provider'):
+            return self.provider(ticker, start_date, end_date)
+
+    def get_ticker_data(self, ticker, start_date, end_date):
+        """
+        Return daily bars for [start_date, end_date), fetching only missing sessions.
+
+        Sessions already in historical_data are streamed from the database. Any
+        trading days missing against the market calendar are downloaded in as few
+        ranges as possible, written back, and merged into one contiguous frame.
+        Sessions the provider has no bars for (before a listing, unscheduled
+        closures) are recorded in historical_data_empty and skipped until
+        EMPTY_RANGE_TTL_DAYS have passed.
+
+        Each gap is downloaded from the cached session before it, and if that
+        session's adjusted close no longer matches, or any cached bar is older
+        than ADJUSTED_MAX_AGE_DAYS, the whole range is downloaded again so a
+        frame never mixes adjusted prices from before and after a dividend or
+        split.
+        """
+        if not has_app_context():
+            return self._download(ticker, start_date, end_date)
+
+        start = pd.Timestamp(start_date).normalize()
+        end = pd.Timestamp(end_date).normalize()
+
+        try:
+            cached = self.read_range(ticker, start, end)
+        except Exception as e:
+            logger.error(f"Error reading cached data for {ticker}: {str(e)}")
+            db.session.rollback()
+            return self._download(ticker, start_date, end_date)
+
+        if not cached.empty and self.has_stale_bars(ticker, start, end):
+            return self.refresh(ticker, start, end, cached)
+
+        #today's session is still trading, so only closed sessions count as gaps
+        today = pd.Timestamp(datetime.now(timezone.utc).date())
+        expected = trading_days(start, min(end, today))
+        for empty_start, empty_end in self.read_empty_ranges(ticker, start, end):
+            expected = expected[(expected < empty_start) | (expected > empty_end)]
+        gaps = find_gaps(expected, cached.index)
+        record_cache_lookup('historical_data', not gaps)
+
+        frames = [cached]
+        empty = []
+        for gap_start, gap_end in gaps:
+            #one cached session is fetched again to check its adjusted close is still current
+            previous = cached.index[cached.index < gap_start]
+            fetch_start = previous[-1] if len(previous) else gap_start
+            fetched = self._download(ticker, fetch_start.strftime('%Y-%m-%d'),
+                                    (gap_end + pd.Timedelta(days=1)).strftime('%Y-%m-%d'))
+            if fetched is None or fetched.empty:
+                logger.warning(f"No provider data for {ticker} between {gap_start.date()} and {gap_end.date()}")
+                fetched = pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([]))
+            else:
+                fetched = fetched[PRICE_COLUMNS].dropna()
+                if self.restated(cached, fetched):
+                    return self.refresh(ticker, start, end, cached)
+                self.store(ticker, fetched)
+                frames.append(fetched)
+
+            #expected sessions of the gap that neither the cache nor the provider has
+            gap_days = expected[(expected >= gap_start) & (expected <= gap_end)]
+            empty += find_gaps(gap_days, cached.index.append(fetched.index), merge_within=1)
+
+        if empty:
+            self.store_empty_ranges(ticker, empty, today)
+
+        if gaps:
+            logger.info(f"Filled {len(gaps)} gap(s) for {ticker} from provider")
+
+        frames = [frame for frame in frames if not frame.empty]
+        data = pd.concat(frames) if frames else cached
+        data = data[~data.index.duplicated(keep='last')].sort_index()
+        data = data[(data.index >= start) & (data.index < end)]
+        data.index.name = 'Date'
+        return data
+
+    @staticmethod
+    def restated(cached, fetched):
+        """Whether fetched has a different adjusted close for any session also in cached"""
+        common = cached.index.intersection(fetched.index)
+        if common.empty:
+            return False
+        difference = (fetched.loc[common, 'Adj Close'].astype(float).round(2) - cached.loc[common, 'Adj Close']).abs()
+        return bool(difference.max() > ADJUSTED_TOLERANCE)
+
+    def refresh(self, ticker, start, end, cached):
+        """
+        Download [start, end) again and replace the cached bars.
+
+        When the provider has restated adjusted closes, the ticker's cached
+        bars outside the range carry the old adjustment too, so they are
+        deleted and fetched again when next requested.
+        """
+        fetched = self._download(ticker, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+        if fetched is None or fetched.empty:
+            logger.warning(f"No provider data for {ticker} while refreshing, serving cached bars")
+            return cached
+        fetched = fetched[PRICE_COLUMNS].dropna()
+
+        if self.restated(cached, fetched):
+            logger.info(f"Adjusted prices of {ticker} were restated, dropping its other cached bars")
+            try:
+                db.session.execute(text("""
+                    DELETE FROM historical_data
+                    WHERE ticker = :ticker AND (date < :start OR date >= :end)
+                """), {'ticker': ticker, 'start': start.date(), 'end': end.date()})
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Error invalidating cached data for {ticker}: {str(e)}")
+                db.session.rollback()
+        self.store(ticker, fetched)
+
+        data = fetched[(fetched.index >= start) & (fetched.index < end)]
+        data.index.name = 'Date'
+        return data
+
+    def has_stale_bars(self, ticker, start, end):
+        """Whether any cached bar in [start, end) was fetched more than ADJUSTED_MAX_AGE_DAYS ago"""
+        sql = text("""
+            SELECT 1 FROM historical_data
+            WHERE ticker = :ticker AND date >= :start AND date < :end AND last_updated < :before
+            LIMIT 1
+        """)
+        try:
+            return db.session.execute(sql, {
+                'ticker': ticker,
+                'start': start.date(),
+                'end': end.date(),
+                'before': datetime.now(timezone.utc) - timedelta(days=ADJUSTED_MAX_AGE_DAYS)
+            }).first() is not None
+        except Exception as e:
+            logger.error(f"Error checking cached data age for {ticker}: {str(e)}")
+            db.session.rollback()
+            return False
+
+    def read_range(self, ticker, start, end):
+        """Stream cached bars for a ticker in batches of batch_size rows"""
+        sql = text("""
+            SELECT date, open, high, low, close, adjusted_close, volume
+            FROM historical_data
+            WHERE ticker = :ticker AND date >= :start AND date < :end
+            ORDER BY date
+        """).execution_options(stream_results=True, yield_per=self.batch_size)
+
+        result = db.session.execute(sql, {
+            'ticker': ticker,
+            'start': start.date(),
+            'end': end.date()
+        })
+
+        columns = ['Date'] + PRICE_COLUMNS
+        chunks = [pd.DataFrame(rows, columns=columns) for rows in result.partitions()]
+        if not chunks:
+            return pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype=float)
+
+        data = pd.concat(chunks, ignore_index=True)
+        data['Date'] = pd.to_datetime(data['Date'])
+        data = data.set_index('Date')
+        data[PRICE_COLUMNS[:-1]] = data[PRICE_COLUMNS[:-1]].astype(float)
+        data['Volume'] = data['Volume'].astype('int64')
+        return data
+
+    def read_empty_ranges(self, ticker, start, end):
+        """Ranges within [start, end) recently found to have no bars at the provider"""
+        sql = text("""
+            SELECT start_date, end_date
+            FROM historical_data_empty
+            WHERE ticker = :ticker AND end_date >= :start AND start_date < :end AND checked_at >= :since
+        """)
+        try:
+            rows = db.session.execute(sql, {
+                'ticker': ticker,
+                'start': start.date(),
+                'end': end.date(),
+                'since': datetime.now(timezone.utc) - timedelta(days=EMPTY_RANGE_TTL_DAYS)
+            }).fetchall()
+        except Exception as e:
+            logger.error(f"Error reading empty ranges for {ticker}: {str(e)}")
+            db.session.rollback()
+            return []
+        return [(pd.Timestamp(row[0]), pd.Timestamp(row[1])) for row in rows]
+
+    def store_empty_ranges(self, ticker, ranges, today):
+        """Record (first_day, last_day) session ranges the provider returned no bars for"""
+        cutoff = today - pd.Timedelta(days=EMPTY_RANGE_MIN_AGE_DAYS)
+        rows = [{
+            'ticker': ticker,
+            'start_date': range_start.date(),
+            'end_date': min(range_end, cutoff).date()
+        } for range_start, range_end in ranges if range_start <= cutoff]
+        if not rows:
+            return
+
+        sql = text("""
+            INSERT INTO historical_data_empty (ticker, start_date, end_date, checked_at)
+            VALUES (:ticker, :start_date, :end_date, CURRENT_TIMESTAMP)
+            ON CONFLICT (ticker, start_date, end_date)
+            DO UPDATE SET checked_at = CURRENT_TIMESTAMP
+        """)
+        try:
+            db.session.execute(sql, rows)
+            db.session.commit()
+            logger.info(f"Recorded {len(rows)} range(s) without provider data for {ticker}")
+        except Exception as e:
+            logger.error(f"Error recording empty ranges for {ticker}: {str(e)}")
+            db.session.rollback()
+
+    def store(self, ticker, data):
+        """Upsert downloaded bars into historical_data in batches"""
+        sql = text("""
+            INSERT INTO historical_data
+            (ticker, date, open, high, low, close, adjusted_close, volume, last_updated)
+            VALUES (:ticker, :date, :open, :high, :low, :close, :adj_close, :volume, CURRENT_TIMESTAMP)
+            ON CONFLICT (ticker, date)
+            DO UPDATE SET
+                open = EXCLUDED.open,
+                high = EXCLUDED.high,
+                low = EXCLUDED.low,
+                close = EXCLUDED.close,
+                adjusted_close = EXCLUDED.adjusted_close,
+                volume = EXCLUDED.volume,
+                last_updated = CURRENT_TIMESTAMP
+        """)
+
+        rows = [{
+            'ticker': ticker,
+            'date': index.date(),
+            'open': float(row['Open']),
+            'high': float(row['High']),
+            'low': float(row['Low']),
+            'close': float(row['Close']),
+            'adj_close': float(row['Adj Close']),
+            'volume': int(row['Volume'])
+        } for index, row in data.iterrows()]
+
+        try:
+            for i in range(0, len(rows), self.batch_size):
+                db.session.execute(sql, rows[i:i + self.batch_size])
+            db.session.commit()
+        except Exception as e:
+            #the cache is best effort - the caller still gets the downloaded data
+            logger.error(f"Error caching market data for {ticker}: {str(e)}")
+            db.session.rollback()
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+import logging
+import re
+from .db import db
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PATTERN = re.compile(r'^predictions_y(\d{4})m(\d{2})$')
+#catches rows for months whose partition does not exist yet
+DEFAULT_PARTITION = 'predictions_default'
+
+def month_start(value):
+    """First instant of the month containing value (UTC)"""
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+def add_months(value, months):
+    """Shift a month start by a number of months"""
+    month_index = value.year * 12 + value.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+def partition_name(start):
+    """Name of the monthly predictions partition starting at start"""
+    return f"predictions_y{start.year:04d}m{start.month:02d}"
+
+def is_partitioned():
+    """Whether predictions is a PostgreSQL partitioned table"""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return False
+    sql = text("""
+        SELECT COUNT(*) FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = 'predictions'
+    """)
+    return bool(db.session.execute(sql).scalar())
+
+def list_prediction_partitions():
+    """Monthly partitions currently attached to predictions, oldest first"""
+    sql = text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'predictions'::regclass
+    """)
+    partitions = []
+    for (name,) in db.session.execute(sql):
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append((datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc), name))
+    return sorted(partitions)
+
+def has_default_partition():
+    """Whether predictions has its DEFAULT partition"""
+    sql = text("SELECT to_regclass(:name) IS NOT NULL")
+    return bool(db.session.execute(sql, {'name': DEFAULT_PARTITION}).scalar())
+
+def create_prediction_partition(start):
+    """
+    Create the monthly partition starting at start.
+
+    Rows that already landed in the default partition for that month are
+    moved into the new table before it is attached, since PostgreSQL
+    refuses to add a partition whose range the default partition holds.
+    """
+    name = partition_name(start)
+    bounds = {'start': start, 'end': add_months(start, 1)}
+    strays = 0
+    if has_default_partition():
+        strays = db.session.execute(text(f"""
+            SELECT COUNT(*) FROM {DEFAULT_PARTITION}
+            WHERE prediction_date >= :start AND prediction_date < :end
+        """), bounds).scalar()
+
+    if not strays:
+        db.session.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {name}
+            PARTITION OF predictions
+            FOR VALUES FROM ('{start.isoformat()}') TO ('{bounds['end'].isoformat()}')
+        """))
+        return name
+
+    logger.warning(f"Moving {strays} predictions from {DEFAULT_PARTITION} into {name}")
+    db.session.execute(text(f"CREATE TABLE {name} (LIKE predictions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.session.execute(text(f"""
+        INSERT INTO {name}
+        SELECT * FROM {DEFAULT_PARTITION}
+        WHERE prediction_date >= :start AND prediction_date < :end
+    """), bounds)
+    db.session.execute(text(f"""
+        DELETE FROM {DEFAULT_PARTITION}
+        WHERE prediction_date >= :start AND prediction_date < :end
+    """), bounds)
+    db.session.execute(text(f"""
+        ALTER TABLE predictions ATTACH PARTITION {name}
+        FOR VALUES FROM ('{start.isoformat()}') TO ('{bounds['end'].isoformat()}')
+    """))
+    return name
+
+def ensure_prediction_partitions(months_ahead=3):
+    """Create the current month's partition and the next months_ahead ones if missing"""
+    if not is_partitioned():
+        return []
+
+    created = []
+    current = month_start(datetime.now(timezone.utc))
+    existing = {name for _, name in list_prediction_partitions()}
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        if partition_name(start) in existing:
+            continue
+        created.append(create_prediction_partition(start))
+    db.session.commit()
+
+    if created:
+        logger.info(f"Created prediction partitions: {', '.join(created)}")
+    return created
+
+def drop_expired_prediction_partitions(retention_days):
+    """Drop every monthly partition that ends before the retention cutoff"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    dropped = []
+    for start, name in list_prediction_partitions():
+        if add_months(start, 1) <= cutoff:
+            db.session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    if has_default_partition():
+        #normally empty; only holds rows written while partition upkeep was behind
+        db.session.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE prediction_date < :cutoff"), {'cutoff': cutoff})
+    db.session.commit()
+
+    if dropped:
+        logger.info(f"Dropped expired prediction partitions: {', '.join(dropped)}")
+    return dropped
+
+def delete_expired_predictions(retention_days, batch_size=1000):
+    """Delete expired predictions in short batches so no single statement holds long locks"""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    sql = text("""
+        DELETE FROM predictions
+        WHERE prediction_id IN (
+            SELECT prediction_id FROM predictions
+            WHERE prediction_date < :cutoff
+            LIMIT :batch_size
+        )
+    """)
+
+    deleted = 0
+    while True:
+        result = db.session.execute(sql, {'cutoff': cutoff, 'batch_size': batch_size})
+        db.session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            break
+
+    logger.info(f"Deleted {deleted} expired predictions")
+    return deleted
+
+def purge_expired_predictions(retention_days, batch_size=1000):
+    """
+    Apply prediction retention.
+
+    A partitioned table drops whole months, so up to one month beyond the
+    retention period may be kept; expired rows in the default partition are
+    deleted. Anything else (SQLite, or PostgreSQL before
+    the partitioning migration) falls back to chunked deletes.
+    """
+    if is_partitioned():
+        return {'dropped_partitions': drop_expired_prediction_partitions(retention_days)}
+    return {'deleted_rows': delete_expired_predictions(retention_days, batch_size)}
@@ -40,6 +40,15 @@ CREATE TABLE historical_data (
     UNIQUE(ticker, date)
 );
 
+--session ranges the data provider has no bars for (before a listing, unscheduled closures)
+CREATE TABLE historical_data_empty (
+    ticker VARCHAR(10) NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    checked_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY(ticker, start_date, end_date)
+);
+
 -- technical indicators CACHE
 CREATE TABLE technical_indicators (
     indicator_id SERIAL PRIMARY KEY,
@@ -61,26 +70,45 @@ CREATE TABLE technical_indicators (
 CREATE TABLE model_versions (
     model_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     version VARCHAR(50) NOT NULL,
+    ticker VARCHAR(10),
+    artifact_path VARCHAR(255),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     parameters JSONB NOT NULL,
     metrics JSONB,
     is_active BOOLEAN DEFAULT true
 );
 
---predictions cache
+--predictions cache, range partitioned by month so retention can drop whole partitions
 CREATE TABLE predictions (
-    prediction_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    prediction_id UUID NOT NULL DEFAULT uuid_generate_v4(),
     user_id UUID REFERENCES users(user_id),
     model_id UUID REFERENCES model_versions(model_id),
     ticker VARCHAR(10) NOT NULL,
-    prediction_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    prediction_date TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
     target_date DATE NOT NULL,
     predicted_value DECIMAL(10,2) NOT NULL,
     actual_value DECIMAL(10,2),
     confidence_score DECIMAL(5,2),
-    CONSTRAINT fk_user FOREIGN KEY(user_id) REFERENCES users(user_id),
-    CONSTRAINT fk_model FOREIGN KEY(model_id) REFERENCES model_versions(model_id)
-);
+    PRIMARY KEY (prediction_id, prediction_date)
+) PARTITION BY RANGE (prediction_date);
+
+-- current month plus three ahead (UTC months); the nightly cache job keeps creating future months
+DO $$
+DECLARE
+    month_start TIMESTAMP := date_trunc('month', now() AT TIME ZONE 'UTC');
+BEGIN
+    FOR i IN 0..3 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF predictions FOR VALUES FROM (%L) TO (%L)',
+            to_char(month_start + make_interval(months => i), '"predictions_y"YYYY"m"MM'),
+            (month_start + make_interval(months => i)) AT TIME ZONE 'UTC',
+            (month_start + make_interval(months => i + 1)) AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END $$;
+
+-- rows for a month whose partition is missing land here instead of failing the insert
+CREATE TABLE predictions_default PARTITION OF predictions DEFAULT;
 
 -- user preferences and settings
 CREATE TABLE user_preferences(
@@ -105,4 +133,8 @@ CREATE TABLE rate_limits(
 CREATE INDEX idx_historical_data_ticker_date ON historical_data(ticker, date);
 CREATE INDEX idx_predictions_user_ticker ON predictions(user_id, ticker);
 CREATE INDEX idx_predictions_date ON predictions(target_date);
-CREATE INDEX idx_api_keys_key ON api_keys(api_key);
\ No newline at end of file
+CREATE INDEX idx_predictions_prediction_date ON predictions(prediction_date);
+CREATE INDEX idx_predictions_ticker_prediction_date ON predictions(ticker, prediction_date);
+CREATE INDEX idx_api_keys_key ON api_keys(api_key);
+CREATE INDEX idx_model_versions_ticker_created ON model_versions(ticker, created_at);
+CREATE INDEX idx_model_versions_version_created ON model_versions(version, created_at);
\ No newline at end of file
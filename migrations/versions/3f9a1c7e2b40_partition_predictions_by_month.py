@@ -0,0 +1,118 @@
+"""partition predictions by month
+
+Revision ID: 3f9a1c7e2b40
+Revises:
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime, timezone
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c7e2b40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+#months of partitions created past the current one
+PARTITIONS_AHEAD = 3
+
+PREDICTION_INDEXES = [
+    'CREATE INDEX idx_predictions_prediction_date ON predictions(prediction_date)',
+    'CREATE INDEX idx_predictions_ticker_prediction_date ON predictions(ticker, prediction_date)',
+    'CREATE INDEX idx_predictions_user_ticker ON predictions(user_id, ticker)',
+    'CREATE INDEX idx_predictions_date ON predictions(target_date)'
+]
+
+
+def _add_months(value, months):
+    month_index = value.year * 12 + value.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def upgrade():
+    #declarative partitioning is PostgreSQL only; SQLite keeps the plain table and chunked deletes
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('DROP INDEX IF EXISTS idx_predictions_user_ticker')
+    op.execute('DROP INDEX IF EXISTS idx_predictions_date')
+    op.execute('ALTER TABLE predictions RENAME TO predictions_unpartitioned')
+    op.execute('ALTER TABLE predictions_unpartitioned RENAME CONSTRAINT predictions_pkey TO predictions_unpartitioned_pkey')
+
+    #the partition key has to be part of the primary key
+    op.execute("""
+        CREATE TABLE predictions (
+            prediction_id UUID NOT NULL DEFAULT uuid_generate_v4(),
+            user_id UUID REFERENCES users(user_id),
+            model_id UUID REFERENCES model_versions(model_id),
+            ticker VARCHAR(10) NOT NULL,
+            prediction_date TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            target_date DATE NOT NULL,
+            predicted_value DECIMAL(10,2) NOT NULL,
+            actual_value DECIMAL(10,2),
+            confidence_score DECIMAL(5,2),
+            PRIMARY KEY (prediction_id, prediction_date)
+        ) PARTITION BY RANGE (prediction_date)
+    """)
+    for statement in PREDICTION_INDEXES:
+        op.execute(statement)
+
+    #one partition per month from the oldest existing row through PARTITIONS_AHEAD months from now
+    oldest = op.get_bind().execute(sa.text('SELECT MIN(prediction_date) FROM predictions_unpartitioned')).scalar()
+    now = datetime.now(timezone.utc)
+    first = (oldest or now).astimezone(timezone.utc)
+    start = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+    last = _add_months(datetime(now.year, now.month, 1, tzinfo=timezone.utc), PARTITIONS_AHEAD)
+    while start <= last:
+        end = _add_months(start, 1)
+        op.execute(f"""
+            CREATE TABLE predictions_y{start.year:04d}m{start.month:02d}
+            PARTITION OF predictions
+            FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+        """)
+        start = end
+
+    op.execute("""
+        INSERT INTO predictions
+        (prediction_id, user_id, model_id, ticker, prediction_date, target_date,
+         predicted_value, actual_value, confidence_score)
+        SELECT prediction_id, user_id, model_id, ticker, COALESCE(prediction_date, CURRENT_TIMESTAMP),
+               target_date, predicted_value, actual_value, confidence_score
+        FROM predictions_unpartitioned
+    """)
+    op.execute('DROP TABLE predictions_unpartitioned')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('ALTER TABLE predictions RENAME TO predictions_partitioned')
+    op.execute('ALTER TABLE predictions_partitioned RENAME CONSTRAINT predictions_pkey TO predictions_partitioned_pkey')
+    op.execute('DROP INDEX IF EXISTS idx_predictions_prediction_date')
+    op.execute('DROP INDEX IF EXISTS idx_predictions_ticker_prediction_date')
+    op.execute('DROP INDEX IF EXISTS idx_predictions_user_ticker')
+    op.execute('DROP INDEX IF EXISTS idx_predictions_date')
+
+    op.execute("""
+        CREATE TABLE predictions (
+            prediction_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+            user_id UUID REFERENCES users(user_id),
+            model_id UUID REFERENCES model_versions(model_id),
+            ticker VARCHAR(10) NOT NULL,
+            prediction_date TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            target_date DATE NOT NULL,
+            predicted_value DECIMAL(10,2) NOT NULL,
+            actual_value DECIMAL(10,2),
+            confidence_score DECIMAL(5,2),
+            CONSTRAINT fk_user FOREIGN KEY(user_id) REFERENCES users(user_id),
+            CONSTRAINT fk_model FOREIGN KEY(model_id) REFERENCES model_versions(model_id)
+        )
+    """)
+    op.execute('INSERT INTO predictions SELECT * FROM predictions_partitioned')
+    op.execute('DROP TABLE predictions_partitioned')
+    op.execute('CREATE INDEX idx_predictions_user_ticker ON predictions(user_id, ticker)')
+    op.execute('CREATE INDEX idx_predictions_date ON predictions(target_date)')
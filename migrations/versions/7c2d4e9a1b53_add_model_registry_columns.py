@@ -0,0 +1,30 @@
+"""add model registry columns to model_versions
+
+Revision ID: 7c2d4e9a1b53
+Revises: 3f9a1c7e2b40
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2d4e9a1b53'
+down_revision = '3f9a1c7e2b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('model_versions', sa.Column('ticker', sa.String(length=10), nullable=True))
+    op.add_column('model_versions', sa.Column('artifact_path', sa.String(length=255), nullable=True))
+    op.create_index('idx_model_versions_ticker_created', 'model_versions', ['ticker', 'created_at'])
+    op.create_index('idx_model_versions_version_created', 'model_versions', ['version', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('idx_model_versions_version_created', table_name='model_versions')
+    op.drop_index('idx_model_versions_ticker_created', table_name='model_versions')
+    op.drop_column('model_versions', 'artifact_path')
+    op.drop_column('model_versions', 'ticker')
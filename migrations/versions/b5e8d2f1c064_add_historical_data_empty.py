@@ -0,0 +1,31 @@
+"""add historical_data_empty for ranges the data provider has no bars for
+
+Revision ID: b5e8d2f1c064
+Revises: 7c2d4e9a1b53
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e8d2f1c064'
+down_revision = '7c2d4e9a1b53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'historical_data_empty',
+        sa.Column('ticker', sa.String(length=10), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('end_date', sa.Date(), nullable=False),
+        sa.Column('checked_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.PrimaryKeyConstraint('ticker', 'start_date', 'end_date')
+    )
+
+
+def downgrade():
+    op.drop_table('historical_data_empty')
@@ -0,0 +1,28 @@
+"""add a default partition to predictions
+
+Revision ID: e1a7c3b9d245
+Revises: b5e8d2f1c064
+Create Date: 2026-10-19 18:30:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1a7c3b9d245'
+down_revision = 'b5e8d2f1c064'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    #inserts for a month without a partition land here instead of failing
+    op.execute('CREATE TABLE IF NOT EXISTS predictions_default PARTITION OF predictions DEFAULT')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP TABLE IF EXISTS predictions_default')
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import shutil
+import gzip
+import json
+import time
+import uuid
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARTIFACT_ROOT = os.getenv('MODEL_ARTIFACT_ROOT', 'models_saved/.artifacts/')
+#gzip level for compressible artifacts, 0 stores everything as is
+ARTIFACT_COMPRESSION_LEVEL = int(os.getenv('MODEL_ARTIFACT_COMPRESSION_LEVEL', '6'))
+#formats that are already compressed (a .keras file is a zip archive)
+PRECOMPRESSED_SUFFIXES = ('.keras', '.zip', '.gz', '.h5')
+
+MANIFEST_NAME = 'artifacts.json'
+
+class ArtifactStore:
+    """
+    Content-addressed storage for model weights and scalers.
+
+    An artifact is stored once under the SHA-256 of its bytes, so identical
+    files saved by different model versions share one object. A model
+    version directory only keeps a small artifacts.json manifest mapping its
+    file names to digests. Objects no manifest refers to are removed by
+    sweep().
+    """
+
+    def __init__(self, root=DEFAULT_ARTIFACT_ROOT, compression_level=ARTIFACT_COMPRESSION_LEVEL):
+        self.root = root
+        self.compression_level = compression_level
+
+    @staticmethod
+    def digest_file(path, chunk_size=1024 * 1024):
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def object_path(self, record):
+        """Path of the stored object for a manifest record"""
+        digest = record['digest']
+        name = digest + record.get('suffix', '') + ('.gz' if record.get('compressed') else '')
+        return os.path.join(self.root, digest[:2], name)
+
+    def put(self, path):
+        """Store a file (unless an identical one is stored already) and return its manifest record"""
+        suffix = os.path.splitext(path)[1]
+        record = {
+            'digest': self.digest_file(path),
+            'suffix': suffix,
+            'size': os.path.getsize(path),
+            'compressed': self.compression_level > 0 and suffix not in PRECOMPRESSED_SUFFIXES
+        }
+        object_path = self.object_path(record)
+
+        if os.path.exists(object_path):
+            #refresh mtime so a concurrent sweep's grace period covers the new reference
+            os.utime(object_path)
+            record['deduplicated'] = True
+            return record
+
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        tmp_path = f"{object_path}.tmp_{uuid.uuid4().hex}"
+        try:
+            if record['compressed']:
+                with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=self.compression_level) as dst:
+                    shutil.copyfileobj(src, dst)
+            else:
+                shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, object_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        record['deduplicated'] = False
+        return record
+
+    def put_directory(self, version_path, names):
+        """Move the named files of a version directory into the store and write its manifest"""
+        manifest = {}
+        for name in names:
+            file_path = os.path.join(version_path, name)
+            manifest[name] = self.put(file_path)
+        write_manifest(version_path, manifest)
+        for name in names:
+            os.remove(os.path.join(version_path, name))
+        return manifest
+
+    def open(self, record):
+        """Binary file object with the artifact's original bytes"""
+        path = self.object_path(record)
+        return gzip.open(path, 'rb') if record.get('compressed') else open(path, 'rb')
+
+    def local_path(self, record, scratch_dir=None):
+        """
+        A filesystem path holding the artifact, for loaders that need one.
+
+        Uncompressed objects are returned in place; compressed ones are
+        unpacked into scratch_dir (or a directory next to the store).
+        """
+        if not record.get('compressed'):
+            return self.object_path(record)
+        scratch_dir = scratch_dir or os.path.join(self.root, '.unpacked')
+        os.makedirs(scratch_dir, exist_ok=True)
+        path = os.path.join(scratch_dir, record['digest'] + record.get('suffix', ''))
+        if not os.path.exists(path):
+            tmp_path = f"{path}.tmp_{uuid.uuid4().hex}"
+            with self.open(record) as src, open(tmp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_path, path)
+        return path
+
+    def iter_objects(self):
+        if not os.path.isdir(self.root):
+            return
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                yield os.path.join(prefix_dir, name)
+
+    def sweep(self, referenced_digests, grace_seconds=3600):
+        """
+        Delete objects whose digest is not referenced.
+
+        Objects modified within grace_seconds are kept, since a model being
+        saved right now has stored its artifacts but not yet its manifest.
+        """
+        now = time.time()
+        stats = {'kept': 0, 'deleted': 0, 'bytes_freed': 0}
+        for path in self.iter_objects():
+            digest = os.path.basename(path).split('.')[0]
+            if digest in referenced_digests or now - os.path.getmtime(path) < grace_seconds:
+                stats['kept'] += 1
+                continue
+            stats['bytes_freed'] += os.path.getsize(path)
+            os.remove(path)
+            stats['deleted'] += 1
+
+        scratch_dir = os.path.join(self.root, '.unpacked')
+        if os.path.isdir(scratch_dir):
+            for name in os.listdir(scratch_dir):
+                if name.split('.')[0] not in referenced_digests:
+                    os.remove(os.path.join(scratch_dir, name))
+        return stats
+
+def read_manifest(version_path):
+    """Artifact manifest of a model version directory, or None for a legacy directory"""
+    manifest_path = os.path.join(version_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def write_manifest(version_path, manifest):
+    tmp_path = os.path.join(version_path, f".{MANIFEST_NAME}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(version_path, MANIFEST_NAME))
+
+artifact_store = ArtifactStore()
@@ -9,9 +9,111 @@ import logging
 import os
 import json
 from datetime import datetime
+from collections import namedtuple, OrderedDict
+from flask import has_app_context
+from models.registry import model_registry
+from models.artifact_store import artifact_store, read_manifest
+from utils.instrumentation import data_fetch_duration, model_inference_duration
+from utils.tracing import span, run_stage, describe_output
+from utils.memory import memory_monitor
+import threading
+import tempfile
+import shutil
+import uuid
+
+#registered versions other than the loaded one that keep an inference session in memory
+SESSION_CACHE_SIZE = int(os.getenv('MODEL_SESSION_CACHE_SIZE', '4'))
+
+#pipeline settings an inference session is frozen with; refit_scaler scales each request on its own data
+InferenceConfig = namedtuple('InferenceConfig', ['backcandles', 'target_column', 'feature_columns', 'refit_scaler'])
+
+#everything one predict call produced; nothing of it is kept on the session
+PredictionResult = namedtuple('PredictionResult', ['ticker', 'predictions', 'actual', 'target_dates', 'model_id', 'version'])
+
+class InferenceSession:
+    """
+    One loaded model frozen for serving: weights, fitted scaler and pipeline config.
+
+    Attributes cannot be changed after construction, and predict() keeps
+    every intermediate (frames, the request's scaler, sequences) in local
+    variables and hands them back in a PredictionResult, so any number of
+    threads can predict with the same session at once. Loading another model
+    builds a new session instead of changing this one; requests already
+    running finish on the session they started with. The data preparation
+    stages come from pipeline (a StockPredictor), whose stage methods only
+    read its settings.
+    """
+
+    __slots__ = ('pipeline', 'model', 'scaler', 'config', 'metadata')
+
+    def __init__(self, pipeline, model, scaler, config, metadata=None):
+        for name, value in (('pipeline', pipeline), ('model', model), ('scaler', scaler),
+                            ('config', config), ('metadata', dict(metadata or {}))):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("InferenceSession is immutable")
+
+    @property
+    def model_id(self):
+        return self.metadata.get('model_id')
+
+    @property
+    def version(self):
+        return self.metadata.get('version')
+
+    def scale_data(self, data):
+        """Scale a request's numeric columns; returns the scaled array and the scaler used"""
+        data_numeric = data[data.select_dtypes(include=[np.number]).columns]
+        if self.config.refit_scaler:
+            scaler = MinMaxScaler(feature_range=(0,1))
+            return scaler.fit_transform(data_numeric), scaler
+        return self.scaler.transform(data_numeric), self.scaler
+
+    def inverse_transform(self, predictions_scaled, scaler):
+        """Map scaled target predictions back to prices"""
+        dummy = np.zeros((len(predictions_scaled), scaler.n_features_in_))
+        dummy[:, self.config.target_column] = predictions_scaled.flatten()
+        return scaler.inverse_transform(dummy)[:, self.config.target_column]
+
+    def predict(self, TICKER, START_DATE, END_DATE):
+        pipeline = self.pipeline
+        data = run_stage('predict', pipeline.get_ticker_data, TICKER, START_DATE, END_DATE)
+        data = run_stage('predict', pipeline.add_indicators, data)
+        data = run_stage('predict', pipeline.prepare_target, data)
+
+        #each row's target is the next session's close, so keep that date for the rows that survive cleaning
+        next_dates = pd.Series(data.index, index=data.index).shift(-1)
+        target_dates = next_dates[data.dropna().index].iloc[self.config.backcandles:]
+
+        data = run_stage('predict', pipeline.clean_data, data)
+        data_set_scaled, scaler = run_stage('predict', self.scale_data, data)
+
+        X, y = run_stage('predict',
+            pipeline.prepare_lstm_data,
+            data_set_scaled,
+            self.config.backcandles,
+            self.config.target_column,
+            self.config.feature_columns
+        )
+
+        #calling the model directly is thread safe and skips model.predict's per-call batching setup
+        with model_inference_duration.time(), span('predict', 'model.predict') as record:
+            predictions_scaled = np.asarray(self.model(X, training=False))
+            record['rows'], record['bytes'] = describe_output(predictions_scaled)
+
+        predictions = run_stage('predict', self.inverse_transform, predictions_scaled, scaler)
+        return PredictionResult(
+            ticker=TICKER,
+            predictions=predictions,
+            actual=y,
+            target_dates=[d.date() for d in target_dates],
+            model_id=self.model_id,
+            version=self.version
+        )
 
 class StockPredictor:
-    def __init__(self):
+    def __init__(self, data_cache=None, registry=None, artifacts=None):
         #Default parameters
         self.version = "1.0.0"
         self.training_metadata = {}
@@ -25,12 +127,24 @@ class StockPredictor:
         self.patience = 15
         self.model = None
         self.scaler = None
+        self.data_cache = data_cache #optional HistoricalDataCache for read-through market data
+        self.registry = registry or model_registry
+        self.artifacts = artifacts or artifact_store
+        self.ticker = None
+        self.last_result = None
+        self._session = None
+        self._sessions = OrderedDict() #model_id -> InferenceSession of other registered versions
+        self._session_lock = threading.Lock()
 
     
     def get_ticker_data(self, TICKER, START_DATE='2014-08-01', END_DATE='2024-08-01'):
         # Your existing get_ticker_data function
         try:
-            data = yf.download(TICKER, start=START_DATE, end=END_DATE)
+            with data_fetch_duration.time(stage='total'):
+                if self.data_cache is not None:
+                    data = self.data_cache.get_ticker_data(TICKER, START_DATE, END_DATE)
+                else:
+                    data = yf.download(TICKER, start=START_DATE, end=END_DATE)
             if data.empty:
                 raise ValueError(f"No data found for {TICKER}")
             return data
@@ -101,12 +215,13 @@ class StockPredictor:
         data.drop(columns_to_drop, axis=1, inplace=True)
         return data
     
-    def scale_data(self, data, feature_range=(0,1), save_scaler=True, scaler_path='scaler.pkl'):
+    def scale_data(self, data, feature_range=(0,1), save_scaler=True, scaler_path=None):
+        #the scaler is only written when given a path; train() passes one inside its run directory
         numeric_columns = data.select_dtypes(include=[np.number]).columns
         data_numeric = data[numeric_columns]
         scaler = MinMaxScaler(feature_range=feature_range)
         data_scaled = scaler.fit_transform(data_numeric)
-        if save_scaler:
+        if save_scaler and scaler_path:
             joblib.dump(scaler, scaler_path)
         self.scaler = scaler
         return data_scaled, scaler
@@ -139,13 +254,14 @@ class StockPredictor:
 
         return np.array(X), np.array(y).reshape(-1,1)
     
-    def create_and_train_lstm(self, X_train, y_train):
+    def create_and_train_lstm(self, X_train, y_train, checkpoint_path=None):
         """
         Creates and trains lstm model
 
         Args:
         X_train(np.ndarray): Training input data with shape (samples, backcandles, features)
         y_train(np.ndarray): training target data
+        checkpoint_path(str): where ModelCheckpoint keeps the best model, none when not given
         backcandles(int): Number of time steps to look back (default = 30)
         features(int): Number of input features (default = 9)
         lstm_units(int): Number of units in LSTM layer (default = 150)
@@ -169,7 +285,9 @@ class StockPredictor:
         model.compile(optimizer=adam, loss='mse')
 
         early_stopping = EarlyStopping(monitor='val_loss', patience=self.patience, restore_best_weights=True)
-        model_checkpoint = ModelCheckpoint('best_model.keras', save_best_only=True, monitor='val_loss')
+        callbacks = [early_stopping]
+        if checkpoint_path:
+            callbacks.append(ModelCheckpoint(checkpoint_path, save_best_only=True, monitor='val_loss'))
 
         history = model.fit(
             x=X_train,
@@ -178,7 +296,7 @@ class StockPredictor:
             epochs=self.epochs,
             shuffle=True,
             validation_split=self.validation_split,
-            callbacks=[early_stopping, model_checkpoint]
+            callbacks=callbacks
         )
 
         self.model = model
@@ -186,121 +304,217 @@ class StockPredictor:
     
     def train(self, TICKER, START_DATE='2014-08-01', END_DATE='2024-08-01'):
         # Main training pipeline
-        data = self.get_ticker_data(TICKER, START_DATE, END_DATE)
-        data = self.add_indicators(data)
-        data = self.prepare_target(data)
-        data = self.clean_data(data)
-        data_set_scaled, scaler = self.scale_data(data)
-        
-        X, y = self.prepare_lstm_data(
-            data_set_scaled, 
-            self.backcandles, 
-            self.target_column, 
-            self.feature_columns
-        )
-        
-        splitlimit = int(len(X)*0.8)
-        X_train, X_test = X[:splitlimit], X[splitlimit:]
-        y_train, y_test = y[:splitlimit], y[splitlimit:]
-        
-        model, history = self.create_and_train_lstm(X_train, y_train)
+        self.ticker = TICKER
+        #checkpoint and scaler files go into a directory of this run, so concurrent trainings never overwrite each other's
+        run_path = tempfile.mkdtemp(prefix='training_')
+        try:
+            data = run_stage('train', self.get_ticker_data, TICKER, START_DATE, END_DATE)
+            data = run_stage('train', self.add_indicators, data)
+            data = run_stage('train', self.prepare_target, data)
+            data = run_stage('train', self.clean_data, data)
+            data_set_scaled, scaler = run_stage('train', self.scale_data, data,
+                                                scaler_path=os.path.join(run_path, 'scaler.pkl'))
+
+            X, y = run_stage('train',
+                self.prepare_lstm_data,
+                data_set_scaled,
+                self.backcandles,
+                self.target_column,
+                self.feature_columns
+            )
+
+            splitlimit = int(len(X)*0.8)
+            X_train, X_test = X[:splitlimit], X[splitlimit:]
+            y_train, y_test = y[:splitlimit], y[splitlimit:]
+
+            with span('train', 'model.fit') as record:
+                model, history = self.create_and_train_lstm(X_train, y_train,
+                                                            checkpoint_path=os.path.join(run_path, 'best_model.keras'))
+                record['rows'], record['bytes'] = describe_output(X_train)
+        finally:
+            #save_model writes the model and scaler from memory, nothing here outlives the run
+            shutil.rmtree(run_path, ignore_errors=True)
         return model, history, X_test, y_test
 
     def predict(self, TICKER, START_DATE, END_DATE):
         if self.model is None:
             raise ValueError("Model not trained. Please train the model first.")
-            
-        # Use the same data preparation pipeline as training
-        data = self.get_ticker_data(TICKER, START_DATE, END_DATE)
-        data = self.add_indicators(data)
-        data = self.prepare_target(data)
-        data = self.clean_data(data)
-        data_set_scaled, _ = self.scale_data(data, save_scaler=False)
-        
-        X, y = self.prepare_lstm_data(
-            data_set_scaled, 
-            self.backcandles, 
-            self.target_column, 
-            self.feature_columns
-        )
-        
-        predictions_scaled = self.model.predict(X)
-        
-        # Inverse transform predictions
+
+        result = self.session().predict(TICKER, START_DATE, END_DATE)
+        self.last_result = result
+        return result.predictions
+
+    def inference_config(self):
+        return InferenceConfig(self.backcandles, self.target_column, tuple(self.feature_columns), True)
+
+    def session(self, version=None):
+        """
+        Inference session of the loaded model, or of a registered version.
+
+        Sessions of other versions are loaded without touching this
+        predictor's model and kept for the SESSION_CACHE_SIZE most recently
+        used versions. Returns None when no model is loaded.
+        """
+        if version is not None:
+            return self._version_session(version)
+        if self.model is None:
+            return None
+        session = self._session
+        if session is None or session.model is not self.model or session.scaler is not self.scaler:
+            session = InferenceSession(self, self.model, self.scaler, self.inference_config(), self.training_metadata)
+            self._session = session
+        return session
+
+    def untrained_copy(self):
+        """New predictor with this one's settings and data source but no model"""
+        other = StockPredictor(data_cache=self.data_cache, registry=self.registry, artifacts=self.artifacts)
+        for name in ('version', 'backcandles', 'target_column', 'lstm_units', 'batch_size',
+                     'epochs', 'validation_split', 'patience'):
+            setattr(other, name, getattr(self, name))
+        other.feature_columns = list(self.feature_columns)
+        return other
+
+    def use(self, other):
+        """Serve the model another predictor trained or loaded"""
+        session = InferenceSession(self, other.model, other.scaler, self.inference_config(), other.training_metadata)
+        self.model, self.scaler = other.model, other.scaler
+        self.training_metadata = dict(other.training_metadata)
+        self.version, self.ticker = other.version, other.ticker
+        self._session = session
+
+    def _version_session(self, version):
+        entry = self.registry.get(version)
+        if entry is None:
+            raise ValueError(f"Version {version} not found")
+        if entry['model_id'] == self.training_metadata.get('model_id') and self.model is not None:
+            return self.session()
+
+        with self._session_lock:
+            session = self._sessions.get(entry['model_id'])
+            if session is not None:
+                self._sessions.move_to_end(entry['model_id'])
+                return session
+
+        #loading takes seconds, so it runs outside the lock and requests for cached versions carry on
+        model, scaler = self._load_artifacts(entry)
+        loaded = InferenceSession(self, model, scaler, self.inference_config(), entry['metadata'])
+        with self._session_lock:
+            #a concurrent request may have loaded the same version first; serve that one
+            session = self._sessions.setdefault(entry['model_id'], loaded)
+            self._sessions.move_to_end(entry['model_id'])
+            while len(self._sessions) > SESSION_CACHE_SIZE:
+                self._sessions.popitem(last=False)
+            return session
+
+    def memory_usage(self):
+        """Bytes held by the model weights, cached version sessions and the last prediction"""
+        def weights(model):
+            return sum(w.nbytes for w in model.get_weights()) if hasattr(model, 'get_weights') else 0
+        last_run = sum(getattr(value, 'nbytes', 0) for value in (self.last_result or ()))
+        return {
+            'model_weights': int(weights(self.model)),
+            'version_sessions': int(sum(weights(session.model) for session in list(self._sessions.values()))),
+            'last_prediction': int(last_run)
+        }
+
+    def inverse_transform(self, predictions_scaled):
+        """Map scaled target predictions back to prices with the fitted scaler"""
         dummy = np.zeros((len(predictions_scaled), self.scaler.n_features_in_))
         dummy[:, self.target_column] = predictions_scaled.flatten()
-        predictions = self.scaler.inverse_transform(dummy)[:, self.target_column]
-        
-        
-        self.last_predictions = predictions
-        self.last_actual = y #store actual values
-        self.last_X = X
-        self.last_y = y
+        return self.scaler.inverse_transform(dummy)[:, self.target_column]
 
-        return predictions
-
-    def save_model(self, path='models_saved/'):
+    def save_model(self, path='models_saved/', metrics=None):
         if self.model is None:
             raise ValueError("No model to save")
         
         #create version specific filename
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         version_path = f"{path}v{self.version}_{timestamp}/"
+        model_id = str(uuid.uuid4())
 
-        #create directory if it doesn't exist
-        os.makedirs(version_path, exist_ok = True)
-
-        #Save model and associated files
-        self.model.save(f"{version_path}lstm_model.keras")
-        joblib.dump(self.scaler, f"{version_path}scaler.pkl")
+        #write into a temporary directory and rename it into place, so readers never see a partial model
+        tmp_path = f"{path}.tmp_{model_id}/"
+        os.makedirs(tmp_path, exist_ok = True)
 
-        #save metadata
-        self.training_metadata.update({
-            'version': self.version,
-            'timestamp': timestamp,
-            'model_params': {
-                'backcandles': self.backcandles,
-                'lstm_units': self.lstm_units,
-                'feature_columns': self.feature_columns
-            }
-        })
+        try:
+            #Save model and associated files
+            self.model.save(f"{tmp_path}lstm_model.keras")
+            joblib.dump(self.scaler, f"{tmp_path}scaler.pkl")
+
+            #save metadata
+            self.training_metadata.update({
+                'model_id': model_id,
+                'version': self.version,
+                'timestamp': timestamp,
+                'ticker': self.ticker,
+                'model_params': {
+                    'backcandles': self.backcandles,
+                    'lstm_units': self.lstm_units,
+                    'feature_columns': self.feature_columns
+                }
+            })
+
+            with open(f"{tmp_path}metadata.json", 'w') as f:
+                json.dump(self.training_metadata, f)
+
+            #weights and scaler live in the content-addressed store; the directory keeps their manifest
+            self.artifacts.put_directory(tmp_path, ['lstm_model.keras', 'scaler.pkl'])
+
+            try:
+                os.rename(tmp_path, version_path)
+            except OSError:
+                if not os.path.exists(version_path):
+                    raise
+                #another model was saved in the same second
+                version_path = f"{path}v{self.version}_{timestamp}_{model_id[:8]}/"
+                os.rename(tmp_path, version_path)
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
 
-        with open(f"{version_path}metadata.json", 'w') as f:
-            json.dump(self.training_metadata, f)
+        if has_app_context():
+            self.registry.register(self.version, version_path, self.training_metadata,
+                                   ticker=self.ticker, metrics=metrics, model_id=model_id)
+        else:
+            self.registry.refresh(force=True)
 
         return version_path
 
-    def load_model(self, version=None, path='models_saved/'):
+    def load_model(self, version=None, ticker=None):
         try:
             if version is None:
                 #Load latest version
-                versions = sorted(os.listdir(path))
-                if not versions:
+                entry = self.registry.latest(ticker)
+                if entry is None:
                     raise ValueError("No models found")
-                version_path = os.path.join(path, versions[-1])
             else:
                 #load specific version
-                matching_dirs = [d for d in os.listdir(path) if d.startswith(f'v{version}_')]
-                if not matching_dirs:
+                entry = self.registry.get(version)
+                if entry is None:
                     raise ValueError(f"Version {version} not found")
-                
-                version_dir = sorted(matching_dirs)[-1]
-                version_path = os.path.join(path, version_dir)
-
-            
-            model_path = os.path.join(version_path, 'lstm_model.keras')
-            scaler_path = os.path.join(version_path, "scaler.pkl")
-            metadata_path = os.path.join(version_path, "metadata.json")
+            self.model, self.scaler = self._load_artifacts(entry)
 
-            self.model = models.load_model(model_path)
-            self.scaler = joblib.load(scaler_path)
-
-            #load metadata
-            with open(metadata_path, 'r') as f:
-                self.training_metadata = json.load(f)
+            #metadata comes from the registry catalog
+            self.training_metadata = dict(entry['metadata'])
             self.version = self.training_metadata['version']
+            self.ticker = entry['ticker']
 
             return self.training_metadata
         except Exception as e:
             logging.error(f"Error loading model: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def _load_artifacts(self, entry):
+        """Model and scaler of a registry entry"""
+        version_path = entry['path']
+        manifest = read_manifest(version_path)
+        with memory_monitor.track(f"load_model {entry['version']}"):
+            if manifest:
+                model = models.load_model(self.artifacts.local_path(manifest['lstm_model.keras']))
+                with self.artifacts.open(manifest['scaler.pkl']) as f:
+                    scaler = joblib.load(f)
+            else:
+                #directory saved before the artifact store
+                model = models.load_model(os.path.join(version_path, 'lstm_model.keras'))
+                scaler = joblib.load(os.path.join(version_path, "scaler.pkl"))
+        return model, scaler
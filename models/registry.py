@@ -0,0 +1,305 @@
+from flask import current_app, has_app_context
+from sqlalchemy import text
+from database.db import db
+from datetime import datetime, timezone
+import threading
+import logging
+import uuid
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODELS_PATH = 'models_saved/'
+#reload the catalog at least this often even if no invalidation was seen (e.g. redis down)
+CATALOG_MAX_AGE_SECONDS = float(os.getenv('MODEL_CATALOG_MAX_AGE_SECONDS', '300'))
+
+def _to_dict(value):
+    if value is None:
+        return {}
+    return json.loads(value) if isinstance(value, str) else dict(value)
+
+class ModelRegistry:
+    """
+    Catalog of saved model versions backed by the model_versions table.
+
+    The table is read once into an in-memory catalog indexed by model id,
+    version string and ticker, with entries kept in creation order, so the
+    latest model for a ticker or version is a dict lookup and listings are
+    slices. Registering a model bumps the 'models' cache generation so other
+    processes reload their catalog within CACHE_GENERATION_REFRESH_SECONDS.
+    Without an app context (scripts, tests) the catalog comes from scanning
+    the models directory, repeated once it is older than max_age.
+    """
+
+    CACHE_NAMESPACE = 'models'
+
+    def __init__(self, path=DEFAULT_MODELS_PATH, max_age=CATALOG_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._generation = None
+        self._entries = []
+        self._by_id = {}
+        self._by_version = {}
+        self._latest_by_ticker = {}
+
+    def _current_generation(self):
+        cache = getattr(current_app, 'cache', None)
+        if cache is None or not cache.redis_client:
+            return None
+        try:
+            return cache.generation(self.CACHE_NAMESPACE)
+        except Exception as e:
+            logger.error(f"Model registry generation check failed: {str(e)}")
+            return None
+
+    def _index(self, entries):
+        entries = sorted(entries, key=lambda entry: entry['created_at'])
+        by_id, by_version, latest_by_ticker = {}, {}, {}
+        for entry in entries:
+            if entry['model_id']:
+                by_id[entry['model_id']] = entry
+            by_version[entry['version']] = entry
+            if entry['ticker']:
+                latest_by_ticker[entry['ticker']] = entry
+        with self._lock:
+            self._entries = entries
+            self._by_id = by_id
+            self._by_version = by_version
+            self._latest_by_ticker = latest_by_ticker
+
+    def _load_from_db(self):
+        sql = text("""
+            SELECT model_id, version, ticker, artifact_path, created_at, parameters, metrics, is_active
+            FROM model_versions
+            WHERE artifact_path IS NOT NULL
+        """)
+        entries = []
+        for row in db.session.execute(sql):
+            created_at = row.created_at
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at)
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            entries.append({
+                'model_id': str(row.model_id),
+                'version': row.version,
+                'ticker': row.ticker,
+                'path': row.artifact_path,
+                'created_at': created_at,
+                'metadata': _to_dict(row.parameters),
+                'metrics': _to_dict(row.metrics),
+                'is_active': bool(row.is_active)
+            })
+        return entries
+
+    def _scan_directory(self):
+        """Entries for every saved model directory, read from metadata.json"""
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+        for version_dir in os.listdir(self.path):
+            metadata_path = os.path.join(self.path, version_dir, 'metadata.json')
+            if not os.path.exists(metadata_path):
+                continue
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+            try:
+                created_at = datetime.strptime(metadata['timestamp'], '%Y%m%d_%H%M%S').replace(tzinfo=timezone.utc)
+            except (KeyError, ValueError):
+                created_at = datetime.fromtimestamp(os.path.getmtime(metadata_path), tz=timezone.utc)
+            entries.append({
+                'model_id': metadata.get('model_id'),
+                'version': metadata.get('version'),
+                'ticker': metadata.get('ticker'),
+                'path': os.path.join(self.path, version_dir),
+                'created_at': created_at,
+                'metadata': metadata,
+                'metrics': metadata.get('metrics', {}),
+                'is_active': True
+            })
+        return entries
+
+    def refresh(self, force=False):
+        """Reload the catalog if another process registered a model or it is older than max_age"""
+        stale = self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age
+        if not has_app_context():
+            if force or stale:
+                self._index(self._scan_directory())
+                self._loaded_at = time.monotonic()
+            return
+
+        generation = self._current_generation()
+        if not force and not stale and generation == self._generation:
+            return
+        try:
+            self._index(self._load_from_db())
+            self._generation = generation
+            self._loaded_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error loading model registry, scanning {self.path}: {str(e)}")
+            db.session.rollback()
+            self._index(self._scan_directory())
+            self._loaded_at = time.monotonic()
+
+    def register(self, version, path, metadata, ticker=None, metrics=None, model_id=None, created_at=None):
+        """Insert a saved model into model_versions and publish it to every process"""
+        model_id = model_id or str(uuid.uuid4())
+        metadata = {**metadata, 'model_id': model_id}
+        created_at = created_at or datetime.now(timezone.utc)
+        same_ticker = {'ticker': ticker, 'created_at': created_at}
+        #the newest model of a ticker is the active one; artifact GC always keeps active models.
+        #older directories can be registered after newer ones (sync_from_directory, backfills)
+        newer = db.session.execute(text("""
+            SELECT COUNT(*) FROM model_versions
+            WHERE created_at > :created_at AND artifact_path IS NOT NULL
+              AND (ticker = :ticker OR (ticker IS NULL AND :ticker IS NULL))
+        """), same_ticker).scalar()
+        is_active = not newer
+        sql = text("""
+            INSERT INTO model_versions (model_id, version, ticker, artifact_path, created_at, parameters, metrics, is_active)
+            VALUES (:model_id, :version, :ticker, :artifact_path, :created_at, :parameters, :metrics, :is_active)
+        """)
+        db.session.execute(sql, {
+            'model_id': model_id,
+            'version': version,
+            'ticker': ticker,
+            'artifact_path': path,
+            'created_at': created_at,
+            'parameters': json.dumps(metadata),
+            'metrics': json.dumps(metrics or {}),
+            'is_active': is_active
+        })
+        if is_active:
+            db.session.execute(text("""
+                UPDATE model_versions
+                SET is_active = false
+                WHERE model_id != :model_id AND created_at < :created_at
+                  AND (ticker = :ticker OR (ticker IS NULL AND :ticker IS NULL))
+            """), {**same_ticker, 'model_id': model_id})
+        db.session.commit()
+
+        cache = getattr(current_app, 'cache', None)
+        if cache is not None and cache.redis_client:
+            #the row is committed; other processes pick it up on their next refresh interval
+            try:
+                generation = cache.invalidate(self.CACHE_NAMESPACE)
+                if self._loaded_at is not None and self._generation is not None:
+                    #this process already has the new entry, no need to reload for its own bump
+                    self._generation = generation
+            except Exception as e:
+                logger.error(f"Model registry cache invalidation failed: {str(e)}")
+
+        entries = [
+            {**entry, 'is_active': False} if is_active and entry['ticker'] == ticker and entry['created_at'] < created_at else entry
+            for entry in self._entries
+        ]
+        self._index(entries + [{
+            'model_id': model_id,
+            'version': version,
+            'ticker': ticker,
+            'path': path,
+            'created_at': created_at,
+            'metadata': metadata,
+            'metrics': metrics or {},
+            'is_active': is_active
+        }])
+        return model_id
+
+    def retire(self, model_ids):
+        """Mark models whose artifacts were deleted; rows stay for the predictions that reference them"""
+        if not model_ids:
+            return 0
+        sql = text("""
+            UPDATE model_versions
+            SET artifact_path = NULL, is_active = false
+            WHERE model_id = :model_id
+        """)
+        db.session.execute(sql, [{'model_id': model_id} for model_id in model_ids])
+        db.session.commit()
+
+        cache = getattr(current_app, 'cache', None)
+        if cache is not None and cache.redis_client:
+            try:
+                cache.invalidate(self.CACHE_NAMESPACE)
+            except Exception as e:
+                logger.error(f"Model registry cache invalidation failed: {str(e)}")
+        retired = set(model_ids)
+        self._index([entry for entry in self._entries if entry['model_id'] not in retired])
+        return len(retired)
+
+    def entries(self):
+        """Every catalog entry, oldest first"""
+        self.refresh()
+        with self._lock:
+            return list(self._entries)
+
+    def sync_from_directory(self):
+        """Register saved model directories that are not in model_versions yet"""
+        self.refresh(force=True)
+        known_paths = {os.path.normpath(entry['path']) for entry in self._entries}
+        added = 0
+        try:
+            #oldest first, so each ticker ends up with only its newest directory active
+            for entry in sorted(self._scan_directory(), key=lambda entry: entry['created_at']):
+                if os.path.normpath(entry['path']) in known_paths:
+                    continue
+                self.register(entry['version'], entry['path'], entry['metadata'],
+                              ticker=entry['ticker'], model_id=entry['model_id'], created_at=entry['created_at'])
+                added += 1
+        except Exception as e:
+            logger.error(f"Error registering saved models from {self.path}: {str(e)}")
+            db.session.rollback()
+        if added:
+            logger.info(f"Registered {added} model versions found in {self.path}")
+        return added
+
+    def latest(self, ticker=None):
+        """Newest model overall or for a ticker"""
+        self.refresh()
+        with self._lock:
+            if ticker:
+                return self._latest_by_ticker.get(ticker)
+            return self._entries[-1] if self._entries else None
+
+    def get(self, version=None, model_id=None):
+        """Newest model with a version string, or the model with an id"""
+        self.refresh()
+        with self._lock:
+            if model_id:
+                return self._by_id.get(str(model_id))
+            return self._by_version.get(version)
+
+    def list(self, page=1, per_page=50, ticker=None):
+        """One page of models, newest first, and the total count"""
+        self.refresh()
+        with self._lock:
+            entries = self._entries
+        if ticker:
+            entries = [entry for entry in entries if entry['ticker'] == ticker]
+        start = (max(page, 1) - 1) * per_page
+        end = len(entries) - start
+        page_entries = entries[max(end - per_page, 0):max(end, 0)][::-1]
+        return page_entries, len(entries)
+
+    def count(self):
+        self.refresh()
+        with self._lock:
+            return len(self._entries)
+
+    @staticmethod
+    def describe(entry):
+        """JSON-friendly view of a catalog entry"""
+        return {
+            **entry['metadata'],
+            'model_id': entry['model_id'],
+            'ticker': entry['ticker'],
+            'created_at': entry['created_at'].isoformat(),
+            'metrics': entry['metrics'],
+            'is_active': entry['is_active']
+        }
+
+model_registry = ModelRegistry()
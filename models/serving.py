@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+from utils.bounded_executor import BoundedExecutor
+from utils.profiler import profiler
+import contextvars
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+class ServingConfig:
+    """Prediction serving settings"""
+    #inference is CPU bound, so more threads than cores only adds contention; 0 predicts on the request thread
+    PREDICT_THREADS = int(os.getenv('PREDICT_THREADS', str(min(4, os.cpu_count() or 1))))
+    PREDICT_MAX_PENDING = int(os.getenv('PREDICT_MAX_PENDING', '32'))
+    PREDICT_TIMEOUT = float(os.getenv('PREDICT_TIMEOUT', '60')) #seconds
+
+class InferenceQueueFull(Exception):
+    """Raised when too many predictions are already queued"""
+    pass
+
+class InferenceTimeout(Exception):
+    """Raised when a prediction does not finish within the timeout"""
+    pass
+
+class InferencePool(BoundedExecutor):
+    """
+    Runs InferenceSession.predict in a bounded thread pool.
+
+    Sessions are safe to share between threads, so a process can serve
+    predictions from threaded workers; the pool caps how many run at once
+    so a burst does not oversubscribe the cores TensorFlow already
+    parallelises over. Once max_pending predictions are queued or running
+    new ones are rejected immediately with InferenceQueueFull, and one
+    still unfinished after timeout seconds raises InferenceTimeout. Each
+    job runs in its own app context and a copy of the caller's context,
+    so tracing spans still reach the request and a profiled request's
+    profile includes the pool thread. max_workers=0 predicts inline.
+    """
+
+    label = 'Prediction'
+    queue_full = InferenceQueueFull
+    timed_out = InferenceTimeout
+    logger = logger
+
+    def __init__(self, max_workers=ServingConfig.PREDICT_THREADS,
+                 max_pending=ServingConfig.PREDICT_MAX_PENDING,
+                 timeout=ServingConfig.PREDICT_TIMEOUT):
+        super().__init__(max_workers, max_pending, timeout)
+
+    def _create_executor(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='predict')
+
+    @staticmethod
+    def _call(app, func, args):
+        #the job belongs to the request that submitted it when that request is being profiled
+        with profiler.follow():
+            if app is None:
+                return func(*args)
+            #a separate app context gives the job its own database session
+            with app.app_context():
+                return func(*args)
+
+    def predict(self, session, ticker, start_date, end_date):
+        """Predict with session on a pool thread and wait for the result"""
+        args = (ticker, start_date, end_date)
+        if not self.max_workers:
+            return self._run(session.predict, *args)
+        app = current_app._get_current_object() if has_app_context() else None
+        return self._run(contextvars.copy_context().run, self._call, app, session.predict, args)
+
+    def get_stats(self):
+        """Queue depth and prediction latency (seconds, including time waiting for a thread)"""
+        stats = super().get_stats()
+        stats['threads'] = self.max_workers
+        return stats
+
+inference_pool = InferencePool()
@@ -1,27 +1,158 @@
 import requests
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import threading
+import queue
+import math
 import time
 import smtplib
 from email.message import EmailMessage
+from collections import deque
 import logging
 import os
 from datetime import datetime, timezone
 import signal
 import sys
 
+class MonitorConfig:
+    """Health monitor settings"""
+    #comma separated base urls, each checked through its /health/check endpoint
+    TARGETS = [url.strip() for url in os.getenv('MONITOR_TARGETS', 'http://localhost:5000').split(',') if url.strip()]
+    CHECK_INTERVAL = float(os.getenv('MONITOR_CHECK_INTERVAL', '300')) #5 minutes
+    #total time allowed for one target's /health/check, connection included
+    PROBE_TIMEOUT = float(os.getenv('MONITOR_PROBE_TIMEOUT', '10'))
+    #a new component status must be seen this many checks in a row before it counts
+    CONFIRM_CHECKS = int(os.getenv('MONITOR_CONFIRM_CHECKS', '1'))
+    #a component going back to a status it was alerted for within this window is not alerted again
+    DEDUP_SECONDS = float(os.getenv('MONITOR_DEDUP_SECONDS', '3600'))
+    #alerts raised within this window are sent together in one email
+    DIGEST_SECONDS = float(os.getenv('MONITOR_DIGEST_SECONDS', '60'))
+    #probe latencies kept per target (one day at the default interval)
+    LATENCY_HISTORY = int(os.getenv('MONITOR_LATENCY_HISTORY', '288'))
+
+class ComponentState:
+    """Confirmed status of one component of one target and its alert history"""
+
+    def __init__(self, status='healthy'):
+        self.status = status
+        self.since = None
+        self.message = ''
+        self.candidate = None
+        self.candidate_count = 0
+        self.alerted = False
+        self.last_alert = {} #status -> monotonic time of its last alert
+        self.suppressed = 0
+
+class AlertDigest:
+    """
+    Sends alerts from a background thread, batched into one email per window.
+
+    submit() only queues the alert, so a slow or unreachable SMTP server
+    never holds up a health check. The first alert of a batch opens a
+    DIGEST_SECONDS window; everything submitted before it closes goes out
+    in the same email.
+    """
+
+    _STOP = object()
+
+    def __init__(self, sender, window=MonitorConfig.DIGEST_SECONDS):
+        self.sender = sender
+        self.window = window
+        self.queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='alert-digest', daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, alert):
+        self.queue.put(alert)
+
+    def _run(self):
+        while True:
+            alert = self.queue.get()
+            if alert is self._STOP:
+                return
+            batch = [alert]
+            deadline = time.monotonic() + self.window
+            stopping = False
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    alert = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if alert is self._STOP:
+                    stopping = True
+                    break
+                batch.append(alert)
+            self.flush(batch)
+            if stopping:
+                return
+
+    def flush(self, batch):
+        try:
+            self.sender(*format_digest(batch))
+        except Exception as e:
+            logging.error(f"Failed to send alert digest: {str(e)}")
+
+    def stop(self):
+        """Send whatever is queued and stop the thread"""
+        if self._thread:
+            self.queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+
+def format_digest(alerts):
+    """Subject and body of the email for a batch of alerts"""
+    problems = [a for a in alerts if a['status'] != 'healthy']
+    if len(alerts) == 1:
+        alert = alerts[0]
+        subject = f"{alert['component']} is {alert['status']} on {alert['target']}"
+    else:
+        subject = f"{len(problems)} problems, {len(alerts) - len(problems)} recoveries"
+
+    lines = []
+    for alert in alerts:
+        line = f"[{alert['timestamp']}] {alert['target']} {alert['component']}: {alert['previous']} -> {alert['status']}"
+        if alert['message']:
+            line += f" ({alert['message']})"
+        if alert['suppressed']:
+            line += f", {alert['suppressed']} repeat alerts suppressed"
+        lines.append(line)
+    return subject, '\n'.join(lines)
+
 class HealthMonitor:
-    def __init__(self, base_url, check_interval=300): #5 minutes
-        self.base_url = base_url
+    def __init__(self, targets=None, check_interval=MonitorConfig.CHECK_INTERVAL, timeout=MonitorConfig.PROBE_TIMEOUT,
+                 confirm_checks=MonitorConfig.CONFIRM_CHECKS, dedup_seconds=MonitorConfig.DEDUP_SECONDS,
+                 digest_seconds=MonitorConfig.DIGEST_SECONDS, history=MonitorConfig.LATENCY_HISTORY):
+        if isinstance(targets, str):
+            targets = [targets]
+        self.targets = [url.rstrip('/') for url in (targets or MonitorConfig.TARGETS)]
         self.check_interval = check_interval
-        self.running = True
-        self.setup_logging()
+        self.timeout = timeout
+        self.confirm_checks = confirm_checks
+        self.dedup_seconds = dedup_seconds
+        self.states = {} #(target, component) -> ComponentState
+        self.latency = {target: deque(maxlen=history) for target in self.targets}
+        self.digest = AlertDigest(self.send_alert, window=digest_seconds)
+        self._stopping = threading.Event()
+        #probes run on their own threads and loop, so a probe that outlives its timeout is left behind instead of awaited
+        self._loop = None
+        self._executor = None
+
+    @property
+    def running(self):
+        return not self._stopping.is_set()
 
-        # set up signal handlers for clean shutdown
-        signal.signal(signal.SIGINT, self.shutdown)
-        signal.signal(signal.SIGTERM, self.shutdown)
-    
     def setup_logging(self):
         #create logs directory
-        os.makedurs('logs', exist_ok = True)
+        os.makedirs('logs', exist_ok = True)
 
         #setup file logging
         logging.basicConfig(
@@ -39,7 +170,7 @@ class HealthMonitor:
 
     def shutdown(self, signum, frame):
         print("\nShutting down monitor...")
-        self.running = False
+        self._stopping.set()
 
     def send_alert(self, subject, body):
         #configure email settings
@@ -60,7 +191,7 @@ class HealthMonitor:
             msg['From'] = sender_email
             msg['To'] = recipient_email
 
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
+            with smtplib.SMTP(smtp_server, smtp_port, timeout=30) as server:
                 server.starttls()
                 server.login(sender_email, sender_password)
                 server.send_message(msg)
@@ -68,53 +199,165 @@ class HealthMonitor:
         except Exception as e:
             logging.error(f"Failed to send alert email: {str(e)}")
 
-    def check_health(self):
+    async def probe(self, target):
+        """GET target's /health/check; returns its components plus an 'endpoint' entry for the probe itself"""
+        started = time.monotonic()
+        record = {'timestamp': datetime.now(timezone.utc).isoformat(), 'status_code': None, 'error': None}
         try:
-            print(f"\nPerforming health check at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            response = requests.get(f"{self.base_url}/health/check")
+            #requests' timeout is per socket operation, wait_for bounds the whole probe
+            response = await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(
+                    self._get_executor(), partial(requests.get, f"{target}/health/check", timeout=self.timeout)
+                ),
+                self.timeout
+            )
+            record['status_code'] = response.status_code
             health_data = response.json()
+            components = dict(health_data['components'])
+            components['endpoint'] = {'status': 'healthy'}
+        except asyncio.TimeoutError:
+            record['error'] = f"timed out after {self.timeout:g}s"
+            health_data = None
+        except Exception as e:
+            record['error'] = str(e)
+            health_data = None
+        record['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+        self.latency[target].append(record)
 
-            #print overall status
-            print(f"Overall status: {health_data['status']}")
+        if health_data is None:
+            components = {'endpoint': {'status': 'error', 'message': f"Health check error: {record['error']}"}}
+            health_data = {'status': 'unreachable', 'components': {}}
+        return health_data, components
+
+    def evaluate(self, target, component, status, message='', now=None):
+        """Record a component's status; returns the alert to send, or None"""
+        now = time.monotonic() if now is None else now
+        state = self.states.setdefault((target, component), ComponentState())
+        if status == state.status:
+            state.candidate = None
+            state.message = message
+            return None
+
+        if status != state.candidate:
+            state.candidate = status
+            state.candidate_count = 0
+        state.candidate_count += 1
+        if state.candidate_count < self.confirm_checks:
+            return None
+
+        previous = state.status
+        state.status = status
+        state.since = now
+        state.message = message
+        state.candidate = None
+
+        if status == 'healthy':
+            #recoveries are only sent for outages that were alerted
+            if not state.alerted:
+                return None
+            state.alerted = False
+        else:
+            last = state.last_alert.get(status)
+            if last is not None and now - last < self.dedup_seconds:
+                state.suppressed += 1
+                state.alerted = False
+                return None
+            state.last_alert[status] = now
+            state.alerted = True
+
+        alert = {
+            'target': target,
+            'component': component,
+            'status': status,
+            'previous': previous,
+            'message': message,
+            'suppressed': state.suppressed,
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        }
+        state.suppressed = 0
+        return alert
+
+    async def check_all(self):
+        """Probe every target at once and queue alerts for components that changed status"""
+        results = await asyncio.gather(*(self.probe(target) for target in self.targets))
+        report = {}
+        for target, (health_data, components) in zip(self.targets, results):
+            for component, data in components.items():
+                alert = self.evaluate(target, component, data.get('status'), data.get('message', ''))
+                if alert:
+                    logging.warning(f"Component {component} on {target}: {alert['previous']} -> {alert['status']} {alert['message']}")
+                    self.digest.submit(alert)
+            report[target] = {**health_data, 'components': components}
+        return report
+
+    def _get_executor(self):
+        if self._executor is None:
+            #room for a second round of probes while the first one's hung requests finish
+            self._executor = ThreadPoolExecutor(max_workers=2 * len(self.targets), thread_name_prefix='probe')
+        return self._executor
+
+    def close(self):
+        """Stop the probe loop without waiting for requests that already timed out"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
+
+    def check_health(self):
+        print(f"\nPerforming health check at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        #asyncio.run would wait for abandoned probe threads when it shuts the loop down
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        report = self._loop.run_until_complete(self.check_all())
+        for target, health_data in report.items():
+            latency = self.latency[target][-1]['latency_ms']
+            print(f"{target}: {health_data['status']} ({latency} ms)")
 
-            #log component statuses
             for component, data in health_data['components'].items():
                 status = data.get('status')
-                message = data.get('message', '')
-
                 #print component status with color
                 status_color = '\033[92m' if status == 'healthy' else '\033[91m'
-                print(f"{component}: {status_color}{status}\033[0m")
-
-                if status != 'healthy':
-                    alert_msg = f"Component {component} is {status}: {message}"
-                    logging.warning(alert_msg)
-                    self.send_alert(
-                        f"{component} Health Alert",
-                        f"Component: {component}\nStatus: {status}\nMessage: {message}\nTimestamp: {datetime.now(timezone.utc)}"
-                    )
-                    logging.warning(f"Component {component} status: {status} - {message}")
-            
-            if health_data['status'] != 'healthy':
-                self.send_alert(
-                    "System Health Alert",
-                    f"Overall system health is {health_data['status']}\nDetails: {health_data}"
-                )
-
-            print("-" * 50)
-            return health_data
-        except Exception as e:
-            error_msg = f"Health check error: {str(e)}"
-            logging.error(error_msg)
-            print(f"\033[91mError: {error_msg}\033[0m")
-            self.send_alert("Health Check Error", error_msg)
-            return None
-        
+                print(f"  {component}: {status_color}{status}\033[0m")
+        print("-" * 50)
+        return report
+
+    def latency_summary(self, target):
+        """Probe latency percentiles and error count over the kept history of target"""
+        history = list(self.latency[target])
+        latencies = sorted(record['latency_ms'] for record in history)
+        if not latencies:
+            return {'probes': 0}
+        return {
+            'probes': len(history),
+            'errors': len([record for record in history if record['error']]),
+            'last_ms': history[-1]['latency_ms'],
+            'p50_ms': latencies[math.ceil(len(latencies) * 0.5) - 1],
+            'p95_ms': latencies[math.ceil(len(latencies) * 0.95) - 1],
+            'max_ms': latencies[-1]
+        }
+
     def run(self):
-        while True:
-            self.check_health()
-            time.sleep(self.check_interval)
+        self.setup_logging()
+
+        # set up signal handlers for clean shutdown
+        signal.signal(signal.SIGINT, self.shutdown)
+        signal.signal(signal.SIGTERM, self.shutdown)
+
+        self.digest.start()
+        try:
+            while self.running:
+                started = time.monotonic()
+                try:
+                    self.check_health()
+                except Exception as e:
+                    logging.error(f"Health check error: {str(e)}")
+                self._stopping.wait(max(0.0, self.check_interval - (time.monotonic() - started)))
+        finally:
+            self.close()
+            self.digest.stop()
 
 if __name__ == "__main__":
-    monitor = HealthMonitor("http://localhost:5000")
-    monitor.run()
\ No newline at end of file
+    monitor = HealthMonitor(sys.argv[1:] or None)
+    monitor.run()
@@ -0,0 +1,144 @@
+import pytest
+import fakeredis
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+from background.popularity import TickerPopularity
+from background.model_gc import collect_model_artifacts
+from models.artifact_store import ArtifactStore, read_manifest
+from models.registry import ModelRegistry
+from flask import Flask
+from sqlalchemy import text
+from database.db import db
+import json
+import os
+
+class TestTickerPopularity:
+    @pytest.fixture
+    def popularity(self):
+        """Popularity counters on an in-memory redis"""
+        return TickerPopularity(redis_client=fakeredis.FakeRedis(), window_days=7)
+
+    def test_top_unions_daily_buckets(self, popularity):
+        """Test that top() ranks tickers across the whole window"""
+        for _ in range(3):
+            popularity.record('SPY')
+        popularity.record('AAPL')
+
+        #counts from an earlier day in the window
+        yesterday = popularity.bucket_key(datetime.now(timezone.utc) - timedelta(days=1))
+        popularity.redis_client.zincrby(yesterday, 5, 'AAPL')
+
+        assert popularity.top(limit=2) == [('AAPL', 6), ('SPY', 3)]
+        assert popularity.top(limit=1, days=1) == [('SPY', 3)]
+
+    def test_buckets_expire(self, popularity):
+        """Test that daily buckets carry a TTL"""
+        popularity.record('SPY')
+        key = popularity.bucket_key(datetime.now(timezone.utc))
+        assert 0 < popularity.redis_client.ttl(key) <= popularity.bucket_ttl
+
+    def test_top_without_redis(self):
+        """Test that callers can detect a missing redis and fall back"""
+        popularity = TickerPopularity(redis_client=False)
+        assert popularity.top() is None
+        assert not popularity.record('SPY')
+
+class TestModelArtifactGC:
+    @pytest.fixture
+    def app(self):
+        """Create test Flask app with a model_versions table"""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+
+        with app.app_context():
+            db.session.execute(text("""
+                CREATE TABLE model_versions (
+                    model_id VARCHAR(36) PRIMARY KEY,
+                    version VARCHAR(50) NOT NULL,
+                    ticker VARCHAR(10),
+                    artifact_path VARCHAR(255),
+                    created_at TIMESTAMP,
+                    parameters TEXT NOT NULL,
+                    metrics TEXT,
+                    is_active BOOLEAN DEFAULT 1
+                )
+            """))
+            db.session.commit()
+            yield app
+
+    @staticmethod
+    def save_version(models_path, store, name, weights, scaler):
+        """Write a version directory the way save_model does"""
+        version_path = os.path.join(models_path, name)
+        os.makedirs(version_path)
+        with open(os.path.join(version_path, 'lstm_model.keras'), 'wb') as f:
+            f.write(weights)
+        with open(os.path.join(version_path, 'scaler.pkl'), 'wb') as f:
+            f.write(scaler)
+        if store:
+            store.put_directory(version_path, ['lstm_model.keras', 'scaler.pkl'])
+        return version_path
+
+    def test_identical_artifacts_stored_once(self, tmp_path):
+        """Test content addressing, dedup and compression"""
+        store = ArtifactStore(str(tmp_path / 'store'), compression_level=6)
+        first = read_manifest(self.save_version(str(tmp_path), store, 'v1', b'weights', b'scaler' * 1000))
+        second = read_manifest(self.save_version(str(tmp_path), store, 'v2', b'weights', b'scaler' * 1000))
+
+        assert first['scaler.pkl']['digest'] == second['scaler.pkl']['digest']
+        assert second['scaler.pkl']['deduplicated']
+        assert len(list(store.iter_objects())) == 2
+        assert store.object_path(first['scaler.pkl']).endswith('.pkl.gz')
+        assert not first['lstm_model.keras']['compressed']
+        with store.open(first['scaler.pkl']) as f:
+            assert f.read() == b'scaler' * 1000
+        assert not os.path.exists(str(tmp_path / 'v1' / 'scaler.pkl'))
+
+    def test_retention_and_sweep(self, app, tmp_path):
+        """Test that old versions are retired, active ones kept and orphans deleted"""
+        models_path = str(tmp_path / 'models') + os.sep
+        store = ArtifactStore(str(tmp_path / 'store'))
+        registry = ModelRegistry(models_path)
+
+        with app.app_context():
+            ids = []
+            for i in range(3):
+                path = self.save_version(models_path, store, f"v1.0.{i}", f"weights{i}".encode(), b'scaler')
+                ids.append(registry.register(f"1.0.{i}", path, {'version': f"1.0.{i}"}, ticker='SPY'))
+            #pin the oldest model
+            db.session.execute(text("UPDATE model_versions SET is_active = 1 WHERE model_id = :id"), {'id': ids[0]})
+            db.session.commit()
+            #a directory saved before the artifact store, and one whose save never finished
+            self.save_version(models_path, None, 'v0.9.0', b'legacy', b'scaler')
+            self.save_version(models_path, None, 'v0.8.0', b'partial', b'scaler')
+            os.remove(os.path.join(models_path, 'v0.8.0', 'scaler.pkl'))
+
+            stats = collect_model_artifacts(registry, store, keep_per_ticker=1, grace_seconds=0)
+
+            assert stats['retired'] == 1 and stats['migrated'] == 1
+            assert not os.path.exists(os.path.join(models_path, 'v1.0.1'))
+            assert os.path.exists(os.path.join(models_path, 'v1.0.0'))
+            assert read_manifest(os.path.join(models_path, 'v0.9.0')) is not None
+            assert read_manifest(os.path.join(models_path, 'v0.8.0')) is None
+            assert stats['deleted'] == 1 #weights1; the shared scaler is still referenced
+            assert {entry['model_id'] for entry in registry.entries()} == {ids[0], ids[2]}
+            assert db.session.execute(text("SELECT artifact_path FROM model_versions WHERE model_id = :id"),
+                                      {'id': ids[1]}).scalar() is None
+
+    def test_directories_kept_when_retire_fails(self, app, tmp_path, monkeypatch):
+        """Test that directories are only deleted once their rows are retired"""
+        models_path = str(tmp_path / 'models') + os.sep
+        store = ArtifactStore(str(tmp_path / 'store'))
+        registry = ModelRegistry(models_path)
+
+        with app.app_context():
+            for i in range(2):
+                path = self.save_version(models_path, store, f"v1.0.{i}", f"weights{i}".encode(), b'scaler')
+                registry.register(f"1.0.{i}", path, {'version': f"1.0.{i}"}, ticker='SPY')
+            monkeypatch.setattr(registry, 'retire', Mock(side_effect=RuntimeError('database down')))
+
+            with pytest.raises(RuntimeError):
+                collect_model_artifacts(registry, store, keep_per_ticker=1, grace_seconds=0)
+            assert os.path.exists(os.path.join(models_path, 'v1.0.0'))
@@ -0,0 +1,83 @@
+import pytest
+from datetime import date
+from flask import Flask
+from sqlalchemy import text
+from database.db import db
+from background.prediction_log import PredictionLogBuffer
+from utils.instrumentation import metrics_registry
+
+class TestPredictionLogBuffer:
+    @pytest.fixture
+    def app(self):
+        """Create test Flask app with a predictions table"""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+
+        with app.app_context():
+            db.session.execute(text("""
+                CREATE TABLE predictions (
+                    prediction_id VARCHAR(36) PRIMARY KEY,
+                    user_id VARCHAR(36),
+                    model_id VARCHAR(36),
+                    ticker VARCHAR(10) NOT NULL,
+                    prediction_date TIMESTAMP,
+                    target_date DATE NOT NULL,
+                    predicted_value DECIMAL(10,2) NOT NULL
+                )
+            """))
+            db.session.commit()
+            yield app
+
+    def test_flushes_in_batches_on_stop(self, app):
+        """Test that queued predictions are written when the buffer stops"""
+        buffer = PredictionLogBuffer(app, batch_size=2, flush_interval=60)
+        for i in range(5):
+            assert buffer.record('SPY', date(2024, 1, 2), 100.0 + i)
+
+        buffer.stop()
+
+        count = db.session.execute(text("SELECT COUNT(*) FROM predictions")).scalar()
+        assert count == 5
+        assert buffer.get_stats() == {'pending': 0, 'written': 5, 'dropped': 0, 'rejected': 0}
+
+    def test_rejected_rows_do_not_drop_their_batch(self, app):
+        """Test that rows violating a foreign key are left out and the rest of their batch is written"""
+        db.session.execute(text("PRAGMA foreign_keys = ON"))
+        db.session.execute(text("CREATE TABLE model_versions (model_id VARCHAR(36) PRIMARY KEY)"))
+        db.session.execute(text("DROP TABLE predictions"))
+        db.session.execute(text("""
+            CREATE TABLE predictions (
+                prediction_id VARCHAR(36) PRIMARY KEY,
+                user_id VARCHAR(36),
+                model_id VARCHAR(36) REFERENCES model_versions (model_id),
+                ticker VARCHAR(10) NOT NULL,
+                prediction_date TIMESTAMP,
+                target_date DATE NOT NULL,
+                predicted_value DECIMAL(10,2) NOT NULL
+            )
+        """))
+        db.session.execute(text("INSERT INTO model_versions (model_id) VALUES ('live')"))
+        db.session.commit()
+        rejected = ('prediction_log_rejected_total', '', ())
+        before = metrics_registry.collect().get(rejected, 0)
+
+        buffer = PredictionLogBuffer(app, batch_size=8, flush_interval=60)
+        for i in range(8):
+            buffer.record('SPY', date(2024, 1, 2), 100.0 + i, model_id='retired' if i in (2, 5) else 'live')
+        buffer.stop()
+
+        values = db.session.execute(text("SELECT predicted_value FROM predictions ORDER BY predicted_value")).scalars().all()
+        assert [float(value) for value in values] == [100.0, 101.0, 103.0, 104.0, 106.0, 107.0]
+        assert buffer.get_stats() == {'pending': 0, 'written': 6, 'dropped': 0, 'rejected': 2}
+        assert metrics_registry.collect()[rejected] - before == 2
+
+    def test_full_buffer_drops_instead_of_blocking(self):
+        """Test backpressure when the writer cannot keep up"""
+        buffer = PredictionLogBuffer(max_pending=2, enqueue_timeout=0.01)
+
+        assert buffer.record('SPY', date(2024, 1, 2), 100.0)
+        assert buffer.record('SPY', date(2024, 1, 2), 101.0)
+        assert not buffer.record('SPY', date(2024, 1, 2), 102.0)
+        assert buffer.get_stats()['dropped'] == 1
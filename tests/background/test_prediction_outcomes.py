@@ -0,0 +1,126 @@
+import pytest
+import fakeredis
+from datetime import date, timedelta
+from flask import Flask
+from sqlalchemy import text
+from database.db import db
+from background.prediction_outcomes import score_predictions, load_scored_predictions, QualityFeed
+from utils.metrics import ModelQualityTracker
+
+class TestPredictionOutcomes:
+    @pytest.fixture
+    def app(self):
+        """Create test Flask app with predictions, historical_data and model_versions tables"""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+
+        with app.app_context():
+            db.session.execute(text("""
+                CREATE TABLE predictions (
+                    prediction_id VARCHAR(36) PRIMARY KEY,
+                    model_id VARCHAR(36),
+                    ticker VARCHAR(10) NOT NULL,
+                    target_date DATE NOT NULL,
+                    predicted_value DECIMAL(10,2) NOT NULL,
+                    actual_value DECIMAL(10,2)
+                )
+            """))
+            db.session.execute(text("CREATE TABLE historical_data (ticker VARCHAR(10), date DATE, close DECIMAL(10,2), adjusted_close DECIMAL(10,2))"))
+            db.session.execute(text("CREATE TABLE model_versions (model_id VARCHAR(36), version VARCHAR(50), created_at VARCHAR(32))"))
+            db.session.execute(text("INSERT INTO model_versions VALUES ('m1', 'v1', '2026-01-01T00:00:00')"))
+            db.session.commit()
+            yield app
+
+    def test_scores_predictions_once_actuals_arrive(self, app):
+        """Test that predictions get their adjusted actual value once and feed the quality tracker"""
+        today = date.today()
+        days = [today - timedelta(days=n) for n in (3, 2, 1)]
+        db.session.execute(text("INSERT INTO historical_data VALUES ('SPY', :date, 2 * :close, :close)"), [
+            {'date': days[0], 'close': 100.0}, {'date': days[1], 'close': 102.0}
+        ])
+        db.session.execute(text("""
+            INSERT INTO predictions (prediction_id, model_id, ticker, target_date, predicted_value)
+            VALUES (:id, :model_id, 'SPY', :date, :value)
+        """), [
+            {'id': 'a', 'model_id': 'm1', 'date': days[1], 'value': 101.0},
+            {'id': 'b', 'model_id': None, 'date': days[1], 'value': 99.0},
+            {'id': 'c', 'model_id': 'm1', 'date': days[2], 'value': 103.0}
+        ])
+        db.session.commit()
+        tracker = ModelQualityTracker(window_days=[7])
+
+        assert score_predictions(tracker, batch_size=1) == 2
+        assert score_predictions(tracker) == 0
+        actuals = dict(db.session.execute(text("SELECT prediction_id, actual_value FROM predictions")).fetchall())
+        assert actuals == {'a': 102.0, 'b': 102.0, 'c': None}
+
+        scored = tracker.metrics('SPY', 'm1', '7d')
+        assert scored['count'] == 1 and scored['mae'] == pytest.approx(1.0)
+        assert scored['directional_accuracy'] == 1.0
+        assert tracker.metrics('SPY', 'unknown', '7d')['directional_accuracy'] == 0.0
+
+        #the day's close arrives later
+        db.session.execute(text("INSERT INTO historical_data VALUES ('SPY', :date, 208.0, 104.0)"), {'date': days[2]})
+        db.session.commit()
+        assert score_predictions(tracker) == 1
+        assert tracker.metrics('SPY', 'm1', '7d')['count'] == 2
+
+        #a restarted process rebuilds the same windows from the table
+        restarted = ModelQualityTracker(window_days=[7])
+        assert load_scored_predictions(restarted) == 3
+        assert restarted.metrics('SPY', 'm1', '7d') == tracker.metrics('SPY', 'm1', '7d')
+
+    def test_workers_share_outcomes_through_the_feed(self, app):
+        """Test that an outcome scored by one worker reaches every worker's tracker exactly once"""
+        today = date.today()
+        days = [today - timedelta(days=n) for n in (3, 2, 1)]
+        db.session.execute(text("INSERT INTO historical_data VALUES ('SPY', :date, 2 * :close, :close)"), [
+            {'date': day, 'close': close} for day, close in zip(days, (100.0, 102.0, 104.0))
+        ])
+        db.session.execute(text("""
+            INSERT INTO predictions (prediction_id, model_id, ticker, target_date, predicted_value, actual_value)
+            VALUES (:id, 'm1', 'SPY', :date, :value, :actual)
+        """), [
+            {'id': 'old', 'date': days[1], 'value': 101.0, 'actual': 102.0},
+            {'id': 'a', 'date': days[1], 'value': 103.0, 'actual': None},
+            {'id': 'b', 'date': days[2], 'value': 103.0, 'actual': None}
+        ])
+        db.session.commit()
+        redis_client = fakeredis.FakeRedis()
+        workers = [QualityFeed(ModelQualityTracker(window_days=[7]), redis_client=redis_client) for _ in range(2)]
+
+        #both start with what was scored before them
+        assert [worker.load() for worker in workers] == [1, 1]
+        scorer, other = workers
+        assert score_predictions(scorer.tracker, feed=scorer) == 2
+        assert scorer.tracker.metrics('SPY', 'm1', '7d')['count'] == 1 #recorded when read back from the feed
+        assert [worker.consume() for worker in workers] == [2, 2]
+        assert scorer.tracker.metrics('SPY', 'm1', '7d') == other.tracker.metrics('SPY', 'm1', '7d')
+        assert other.tracker.metrics('SPY', 'm1', '7d')['count'] == 3
+        [entry] = scorer.tracker.report()
+        assert (entry['model_id'], entry['model_version'], entry['model_created_at']) == ('m1', 'v1', '2026-01-01T00:00:00')
+
+        #a worker starting now loads all three; an outcome published late is not counted twice
+        late = QualityFeed(ModelQualityTracker(window_days=[7]), redis_client=redis_client)
+        assert late.load() == 3
+        scorer.publish([{'prediction_id': 'b', 'ticker': 'SPY', 'model_version': 'v1', 'target_date': days[2],
+                         'actual_value': 104.0, 'predicted_value': 103.0, 'reference_value': 102.0}])
+        assert late.consume() == 0
+        assert late.tracker.metrics('SPY', 'm1', '7d')['count'] == 3
+
+    def test_feed_without_redis_records_locally(self, app):
+        """Test that a worker without redis still tracks the outcomes it scores"""
+        today = date.today()
+        db.session.execute(text("INSERT INTO historical_data VALUES ('SPY', :date, 200.0, 100.0)"), {'date': today})
+        db.session.execute(text("""
+            INSERT INTO predictions (prediction_id, model_id, ticker, target_date, predicted_value)
+            VALUES ('a', 'm1', 'SPY', :date, 99.0)
+        """), {'date': today})
+        db.session.commit()
+        feed = QualityFeed(ModelQualityTracker(window_days=[7]), redis_client=False)
+
+        assert feed.load() == 0 and not feed.shared
+        assert score_predictions(feed.tracker, feed=feed) == 1
+        assert feed.tracker.metrics('SPY', 'm1', '7d')['count'] == 1
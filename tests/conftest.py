@@ -0,0 +1,76 @@
+import pytest
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class StubHTTPServer:
+    """
+    Local HTTP server standing in for third-party APIs (OAuth providers etc).
+
+    Register canned responses with add(); a list of responses is served in
+    order and the last one repeats. Every request is recorded along with the
+    client address, so tests can check how many connections were opened.
+    """
+
+    def __init__(self):
+        self.responses = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' #keep-alive
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                stub.requests.append({
+                    'method': self.command,
+                    'path': self.path,
+                    'body': body,
+                    'client': self.client_address
+                })
+                queue = stub.responses.get((self.command, self.path.split('?')[0]))
+                if not queue:
+                    status, headers, payload = 404, {}, {'error': 'not found'}
+                else:
+                    status, headers, payload = queue.pop(0) if len(queue) > 1 else queue[0]
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _handle
+            do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def add(self, method, path, payload, status=200, headers=None):
+        """Queue a response for method and path"""
+        self.responses.setdefault((method, path), []).append((status, headers or {}, payload))
+
+    def count(self, method, path):
+        return len([r for r in self.requests if r['method'] == method and r['path'].split('?')[0] == path])
+
+    def connections(self):
+        return len({r['client'] for r in self.requests})
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub_server():
+    """Local stub HTTP server for outbound client tests"""
+    server = StubHTTPServer()
+    yield server
+    server.stop()
@@ -0,0 +1,334 @@
+import pytest
+import uuid
+import json
+import os
+import subprocess
+import sys
+import fakeredis
+from werkzeug.security import generate_password_hash
+from datetime import datetime, timezone
+from flask import Flask, jsonify, g
+from sqlalchemy import text, event
+from database.db import db
+from auth.middleware import APIKey, require_api_key
+from auth.key_cache import APIKeyCache, LastUsedTracker
+from auth.user_cache import user_cache
+from auth.password_hasher import PasswordHasher, HashingQueueFull
+import auth.routes as routes
+from auth.routes import auth, login_manager
+from config.session import RedisSessionInterface
+from config.http_client import HTTPClient
+from models.user import User
+import auth.middleware as middleware
+
+class TestCachedAPIKeyAuth:
+    @pytest.fixture
+    def app(self, monkeypatch):
+        """Create test Flask app with users and api_keys tables and a protected route"""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        app.redis_client = fakeredis.FakeRedis()
+
+        monkeypatch.setattr(middleware, 'key_cache', APIKeyCache(local_ttl=60))
+        monkeypatch.setattr(middleware, 'last_used_tracker', LastUsedTracker(flush_interval=60))
+
+        @app.route('/protected')
+        @require_api_key
+        def protected():
+            return jsonify({'ok': True, 'user_id': g.api_key_record['user_id']})
+
+        with app.app_context():
+            db.session.execute(text("""
+                CREATE TABLE users (
+                    user_id VARCHAR(36) PRIMARY KEY,
+                    is_active BOOLEAN DEFAULT 1,
+                    subscription_tier VARCHAR(50) DEFAULT 'free'
+                )
+            """))
+            db.session.execute(text("""
+                CREATE TABLE api_keys (
+                    key_id VARCHAR(36) PRIMARY KEY,
+                    user_id VARCHAR(36),
+                    api_key VARCHAR(255) UNIQUE NOT NULL,
+                    created_at TIMESTAMP,
+                    last_used TIMESTAMP,
+                    is_active BOOLEAN DEFAULT 1
+                )
+            """))
+            user_id = app.test_user_id = str(uuid.uuid4())
+            app.test_key = APIKey.generate_key()
+            app.test_key_id = str(uuid.uuid4())
+            db.session.execute(text("INSERT INTO users (user_id) VALUES (:user_id)"), {'user_id': user_id})
+            db.session.execute(text("""
+                INSERT INTO api_keys (key_id, user_id, api_key, created_at)
+                VALUES (:key_id, :user_id, :api_key, :created_at)
+            """), {
+                'key_id': app.test_key_id,
+                'user_id': user_id,
+                'api_key': app.test_key,
+                'created_at': datetime.now(timezone.utc).isoformat()
+            })
+            db.session.commit()
+
+            statements = []
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda conn, cursor, statement, *args: statements.append(statement))
+            app.statements = statements
+            yield app
+
+    def key_queries(self, app):
+        return [s for s in app.statements if 'FROM api_keys' in s]
+
+    def test_repeat_requests_skip_database(self, app):
+        """Test that only the first request verifies the key in the database"""
+        client = app.test_client()
+        for _ in range(3):
+            response = client.get('/protected', headers={'X-API-Key': app.test_key})
+            assert response.status_code == 200
+
+        assert len(self.key_queries(app)) == 1
+        assert not any(s.strip().startswith('UPDATE') for s in app.statements)
+
+    def test_key_record_exposed_to_view(self, app):
+        """Test that the view can attribute the request to the key's owner"""
+        response = app.test_client().get('/protected', headers={'X-API-Key': app.test_key})
+        assert response.get_json()['user_id'] == app.test_user_id
+
+    def test_revocation_invalidates_cache(self, app):
+        """Test that an invalidated key is re-read from the database"""
+        client = app.test_client()
+        client.get('/protected', headers={'X-API-Key': app.test_key})
+
+        db.session.execute(text("UPDATE api_keys SET is_active = 0 WHERE api_key = :api_key"), {'api_key': app.test_key})
+        db.session.commit()
+        middleware.key_cache.invalidate(app.test_key)
+
+        response = client.get('/protected', headers={'X-API-Key': app.test_key})
+        assert response.status_code == 401
+
+    def test_last_used_flushed_in_bulk(self, app):
+        """Test that last_used updates are coalesced until a flush"""
+        client = app.test_client()
+        for _ in range(3):
+            client.get('/protected', headers={'X-API-Key': app.test_key})
+
+        tracker = middleware.last_used_tracker
+        tracker.app = app
+        assert tracker.flush() == 1
+
+        last_used = db.session.execute(text("SELECT last_used FROM api_keys")).scalar()
+        assert last_used is not None
+
+class TestRedisSessionsAndUserCache:
+    @pytest.fixture
+    def app(self, monkeypatch):
+        """Create test Flask app with redis sessions and the auth blueprint"""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SECRET_KEY'] = 'test'
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        app.redis_client = fakeredis.FakeRedis()
+        app.session_interface = RedisSessionInterface(app.redis_client)
+        login_manager.init_app(app)
+        app.register_blueprint(auth, url_prefix='/auth')
+        user_cache.clear()
+        monkeypatch.setattr(routes, 'password_hasher', PasswordHasher(max_workers=0))
+
+        with app.app_context():
+            User.__table__.create(db.engine)
+            db.session.add(User(email='user@example.com', password_hash=generate_password_hash('secret')))
+            db.session.commit()
+
+            statements = []
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda conn, cursor, statement, *args: statements.append(statement))
+            app.statements = statements
+        #no app context stays pushed, so every request gets its own g and db session
+        yield app
+
+    def user_queries(self, app):
+        return [s for s in app.statements if 'FROM users' in s]
+
+    def test_session_stored_in_redis_with_sliding_ttl(self, app):
+        """Test that the session lives in redis and its TTL is refreshed on use"""
+        client = app.test_client()
+        client.post('/auth/login', json={'email': 'user@example.com', 'password': 'secret'})
+
+        keys = app.redis_client.keys('session:*')
+        assert len(keys) == 1
+        app.redis_client.expire(keys[0], 10)
+
+        assert client.get('/auth/status').status_code == 200
+        assert app.redis_client.ttl(keys[0]) > 10
+
+        client.get('/auth/logout')
+        assert app.redis_client.keys('session:*') == []
+        assert client.get('/auth/status').status_code == 401
+
+    def test_login_rotates_session_id(self, app):
+        """Test that a session id planted before login is dropped and not reused"""
+        client = app.test_client()
+        app.redis_client.set('session:planted', '{}')
+        client.set_cookie('session', 'planted')
+
+        client.post('/auth/login', json={'email': 'user@example.com', 'password': 'secret'})
+
+        sid = client.get_cookie('session').value
+        assert sid != 'planted'
+        assert app.redis_client.keys('session:*') == [f'session:{sid}'.encode()]
+        assert client.get('/auth/status').status_code == 200
+
+        client.set_cookie('session', 'planted')
+        assert client.get('/auth/status').status_code == 401
+
+    def test_user_loader_cached(self, app):
+        """Test that logged-in requests stop querying users after the first load"""
+        client = app.test_client()
+        client.post('/auth/login', json={'email': 'user@example.com', 'password': 'secret'})
+        app.statements.clear()
+
+        for _ in range(3):
+            response = client.get('/auth/status')
+            assert response.get_json()['user']['email'] == 'user@example.com'
+        assert len(self.user_queries(app)) == 1
+
+    def test_account_change_invalidates_user(self, app):
+        """Test that an ORM update to the user drops the cached identity"""
+        client = app.test_client()
+        client.post('/auth/login', json={'email': 'user@example.com', 'password': 'secret'})
+        client.get('/auth/status')
+
+        with app.app_context():
+            user = db.session.execute(db.select(User)).scalar_one()
+            user.email = 'changed@example.com'
+            db.session.commit()
+
+        assert client.get('/auth/status').get_json()['user']['email'] == 'changed@example.com'
+
+    def test_login_rejected_when_hashing_queue_full(self, app, monkeypatch):
+        """Test that a saturated hashing pool turns logins away immediately"""
+        monkeypatch.setattr(routes, 'password_hasher', PasswordHasher(max_workers=0, max_pending=0))
+        response = app.test_client().post('/auth/login', json={'email': 'user@example.com', 'password': 'secret'})
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert routes.password_hasher.get_stats()['rejected'] == 1
+
+    def test_login_unavailable_when_hashing_times_out(self, app, monkeypatch):
+        """Test that a hash outliving its timeout is a 503, not a server error"""
+        hasher = PasswordHasher(max_workers=1, timeout=0.001)
+        monkeypatch.setattr(routes, 'password_hasher', hasher)
+        try:
+            response = app.test_client().post('/auth/login', json={'email': 'user@example.com', 'password': 'secret'})
+        finally:
+            hasher.shutdown()
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        assert hasher.get_stats()['failed'] == 1
+
+class TestPasswordHasher:
+    def test_hash_and_verify_in_pool(self):
+        """Test hashing round trip through worker processes"""
+        hasher = PasswordHasher(max_workers=1, max_pending=2)
+        try:
+            password_hash = hasher.hash('secret')
+            assert hasher.verify(password_hash, 'secret')
+            assert not hasher.verify(password_hash, 'wrong')
+        finally:
+            hasher.shutdown()
+
+        stats = hasher.get_stats()
+        assert stats['completed'] == 3 and stats['pending'] == 0
+        assert stats['max_seconds'] >= stats['avg_seconds'] > 0
+
+    def test_pool_workers_do_not_run_app_services(self, tmp_path):
+        """Test that a hashing worker started under app.py does not run the scheduler or flush threads"""
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        script = tmp_path / 'serve.py'
+        #the workers re-run this script as their main module, so probe() is importable there
+        script.write_text(f"""
+import json, sys, threading
+sys.path.insert(0, {root!r})
+import app
+from auth.password_hasher import PasswordHasher
+
+def probe():
+    return {{'scheduler': app.background_tasks.scheduler.running,
+            'threads': [thread.name for thread in threading.enumerate()]}}
+
+if __name__ == '__main__':
+    hasher = PasswordHasher(max_workers=1)
+    try:
+        print(json.dumps({{
+            'parent': probe(),
+            'child': hasher._run(probe),
+            'verified': hasher.verify(hasher.hash('secret'), 'secret')
+        }}))
+    finally:
+        hasher.shutdown()
+        app.background_tasks.scheduler.shutdown(wait=False)
+""")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}", REDIS_URL='redis://127.0.0.1:1/0')
+        result = subprocess.run([sys.executable, str(script)], cwd=tmp_path, env=env,
+                                capture_output=True, text=True, timeout=300)
+        assert result.returncode == 0, result.stderr[-2000:]
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+
+        assert report['verified']
+        assert report['parent']['scheduler'] and 'prediction-log-writer' in report['parent']['threads']
+        assert not report['child']['scheduler']
+        assert not {'prediction-log-writer', 'api-key-last-used'} & set(report['child']['threads'])
+
+    def test_admission_limit(self):
+        """Test that work beyond max_pending is rejected instead of queued"""
+        hasher = PasswordHasher(max_workers=0, max_pending=1)
+        hasher._pending = 1
+        with pytest.raises(HashingQueueFull):
+            hasher.hash('secret')
+
+class TestOutboundHTTP:
+    DISCOVERY_PATH = '/.well-known/openid-configuration'
+
+    @pytest.fixture
+    def client(self, stub_server, monkeypatch):
+        """Auth blueprint test client talking to a stub OpenID provider"""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.register_blueprint(auth, url_prefix='/auth')
+        monkeypatch.setattr(routes, 'google_discovery_url', stub_server.url + self.DISCOVERY_PATH)
+        monkeypatch.setattr(routes, 'http_client', HTTPClient(retries=2))
+        monkeypatch.setenv('OAUTHLIB_INSECURE_TRANSPORT', '1') #the stub speaks plain http
+        return app.test_client()
+
+    def discovery(self, stub_server):
+        return {'authorization_endpoint': stub_server.url + '/authorize', 'token_endpoint': stub_server.url + '/token'}
+
+    def test_discovery_cached_per_max_age(self, client, stub_server):
+        """Test that the discovery document is fetched once while fresh"""
+        stub_server.add('GET', self.DISCOVERY_PATH, self.discovery(stub_server), headers={'Cache-Control': 'public, max-age=3600'})
+
+        for _ in range(3):
+            response = client.get('/auth/google/auth-url')
+            assert response.get_json()['auth_uri'].startswith(stub_server.url + '/authorize')
+        assert stub_server.count('GET', self.DISCOVERY_PATH) == 1
+
+    def test_no_store_refetched_over_one_connection(self, client, stub_server):
+        """Test that uncacheable responses are refetched on a kept-alive connection"""
+        stub_server.add('GET', self.DISCOVERY_PATH, self.discovery(stub_server), headers={'Cache-Control': 'no-store'})
+
+        for _ in range(3):
+            client.get('/auth/google/auth-url')
+        assert stub_server.count('GET', self.DISCOVERY_PATH) == 3
+        assert stub_server.connections() == 1
+
+    def test_retries_server_errors(self, client, stub_server):
+        """Test that a transient 503 from the provider is retried"""
+        stub_server.add('GET', self.DISCOVERY_PATH, {'error': 'unavailable'}, status=503)
+        stub_server.add('GET', self.DISCOVERY_PATH, self.discovery(stub_server))
+
+        assert client.get('/auth/google/auth-url').status_code == 200
+        assert stub_server.count('GET', self.DISCOVERY_PATH) == 2
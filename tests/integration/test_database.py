@@ -0,0 +1,335 @@
+import pytest
+import uuid
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+from flask import Flask
+from sqlalchemy import text, event
+from database.db import db
+from database.market_data import HistoricalDataCache, PRICE_COLUMNS
+from database.partitions import purge_expired_predictions, partition_name, month_start, add_months
+from utils.market_calendar import trading_days
+from config.cache import CacheStore
+from models.registry import ModelRegistry
+import models.registry as registry_module
+import fakeredis
+import json
+import os
+
+class TestHistoricalDataCache:
+    @pytest.fixture
+    def app(self):
+        """Create test Flask app with a historical_data table"""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+
+        with app.app_context():
+            db.session.execute(text("""
+                CREATE TABLE historical_data (
+                    data_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticker VARCHAR(10) NOT NULL,
+                    date DATE NOT NULL,
+                    open DECIMAL(10,2) NOT NULL,
+                    high DECIMAL(10,2) NOT NULL,
+                    low DECIMAL(10,2) NOT NULL,
+                    close DECIMAL(10,2) NOT NULL,
+                    adjusted_close DECIMAL(10,2) NOT NULL,
+                    volume BIGINT NOT NULL,
+                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(ticker, date)
+                )
+            """))
+            db.session.execute(text("""
+                CREATE TABLE historical_data_empty (
+                    ticker VARCHAR(10) NOT NULL,
+                    start_date DATE NOT NULL,
+                    end_date DATE NOT NULL,
+                    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY(ticker, start_date, end_date)
+                )
+            """))
+            db.session.commit()
+            yield app
+
+    @staticmethod
+    def fake_provider(ticker, start_date, end_date):
+        """Return deterministic bars for every session in the range"""
+        index = trading_days(start_date, end_date)
+        data = pd.DataFrame({column: 100.0 for column in PRICE_COLUMNS}, index=index)
+        data['Volume'] = 1000
+        data.index.name = 'Date'
+        return data
+
+    def test_second_read_needs_no_provider(self, app):
+        """Test that a fully cached range is served from the database"""
+        provider = Mock(side_effect=self.fake_provider)
+        cache = HistoricalDataCache(provider=provider, batch_size=50)
+
+        with app.app_context():
+            first = cache.get_ticker_data('SPY', '2020-01-01', '2021-01-01')
+            assert provider.call_count == 1
+
+            provider.reset_mock()
+            second = cache.get_ticker_data('SPY', '2020-01-01', '2021-01-01')
+
+            assert not provider.called
+            assert len(second) == len(first) == len(trading_days('2020-01-01', '2021-01-01'))
+            assert list(second.columns) == PRICE_COLUMNS
+            assert second.index.name == 'Date'
+
+    def test_only_gaps_are_fetched(self, app):
+        """Test that only missing sessions go back to the provider"""
+        provider = Mock(side_effect=self.fake_provider)
+        cache = HistoricalDataCache(provider=provider)
+
+        with app.app_context():
+            cache.get_ticker_data('SPY', '2020-01-01', '2020-07-01')
+            provider.reset_mock()
+
+            data = cache.get_ticker_data('SPY', '2020-01-01', '2021-01-01')
+
+            #from the last cached session, to check its adjusted close
+            provider.assert_called_once_with('SPY', '2020-06-30', '2021-01-01')
+            assert data.index.is_monotonic_increasing
+            assert len(data) == len(trading_days('2020-01-01', '2021-01-01'))
+
+    def test_sessions_without_provider_data_are_not_refetched(self, app):
+        """Test that pre-listing dates and unscheduled closures are only asked for once"""
+        def listed_provider(ticker, start_date, end_date):
+            data = self.fake_provider(ticker, max(pd.Timestamp(start_date), pd.Timestamp('2020-03-02')), end_date)
+            return data.drop(pd.Timestamp('2020-06-15'), errors='ignore')
+
+        provider = Mock(side_effect=listed_provider)
+        cache = HistoricalDataCache(provider=provider)
+
+        with app.app_context():
+            first = cache.get_ticker_data('NEW', '2020-01-01', '2020-07-01')
+            ranges = db.session.execute(text(
+                "SELECT start_date, end_date FROM historical_data_empty ORDER BY start_date"
+            )).fetchall()
+            assert [tuple(str(day) for day in row) for row in ranges] == [
+                ('2020-01-02', '2020-02-28'), ('2020-06-15', '2020-06-15')
+            ]
+
+            provider.reset_mock()
+            second = cache.get_ticker_data('NEW', '2020-01-01', '2020-07-01')
+
+            assert not provider.called
+            assert len(second) == len(first)
+            assert second.index[0] == pd.Timestamp('2020-03-02')
+
+    def test_restated_adjusted_prices_are_refetched(self, app):
+        """Test that a split restating adjusted closes replaces the cached range instead of mixing into it"""
+        split = {'done': False}
+        def provider_with_split(ticker, start_date, end_date):
+            data = self.fake_provider(ticker, start_date, end_date)
+            if split['done']:
+                data['Adj Close'] = 50.0
+            return data
+
+        provider = Mock(side_effect=provider_with_split)
+        cache = HistoricalDataCache(provider=provider)
+
+        with app.app_context():
+            cache.get_ticker_data('SPY', '2019-01-01', '2019-07-01')
+            cache.get_ticker_data('SPY', '2020-01-01', '2020-07-01')
+            split['done'] = True
+            provider.reset_mock()
+
+            data = cache.get_ticker_data('SPY', '2020-01-01', '2021-01-01')
+
+            assert provider.call_args_list[-1].args == ('SPY', '2020-01-01', '2021-01-01')
+            assert (data['Adj Close'] == 50.0).all()
+            assert len(data) == len(trading_days('2020-01-01', '2021-01-01'))
+            stored = db.session.execute(text(
+                "SELECT MIN(date), MAX(adjusted_close) FROM historical_data WHERE ticker = 'SPY'"
+            )).fetchone()
+            #the 2019 bars carried the old adjustment and were dropped
+            assert str(stored[0]) == '2020-01-02' and float(stored[1]) == 50.0
+
+    def test_old_bars_are_checked_again(self, app):
+        """Test that a fully cached range is downloaded again once its bars pass the maximum age"""
+        provider = Mock(side_effect=self.fake_provider)
+        cache = HistoricalDataCache(provider=provider)
+
+        with app.app_context():
+            cache.get_ticker_data('SPY', '2020-01-01', '2020-07-01')
+            db.session.execute(text("UPDATE historical_data SET last_updated = '2000-01-01 00:00:00'"))
+            db.session.commit()
+            provider.reset_mock()
+
+            data = cache.get_ticker_data('SPY', '2020-01-01', '2020-07-01')
+            provider.assert_called_once_with('SPY', '2020-01-01', '2020-07-01')
+            assert len(data) == len(trading_days('2020-01-01', '2020-07-01'))
+
+            provider.reset_mock()
+            cache.get_ticker_data('SPY', '2020-01-01', '2020-07-01')
+            assert not provider.called
+
+class TestPredictionRetention:
+    @pytest.fixture
+    def app(self):
+        """Create test Flask app with an unpartitioned predictions table"""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+
+        with app.app_context():
+            db.session.execute(text("""
+                CREATE TABLE predictions (
+                    prediction_id VARCHAR(36) PRIMARY KEY,
+                    ticker VARCHAR(10) NOT NULL,
+                    prediction_date TIMESTAMP,
+                    target_date DATE NOT NULL,
+                    predicted_value DECIMAL(10,2) NOT NULL
+                )
+            """))
+            now = datetime.now(timezone.utc)
+            db.session.execute(text("""
+                INSERT INTO predictions (prediction_id, ticker, prediction_date, target_date, predicted_value)
+                VALUES (:prediction_id, 'SPY', :prediction_date, :target_date, 100.0)
+            """), [{
+                'prediction_id': str(uuid.uuid4()),
+                'prediction_date': now - timedelta(days=days),
+                'target_date': (now - timedelta(days=days)).date()
+            } for days in [1, 2, 40, 41, 42, 43, 44]])
+            db.session.commit()
+            yield app
+
+    def test_chunked_delete_fallback(self, app):
+        """Test that SQLite retention deletes expired rows in batches"""
+        result = purge_expired_predictions(retention_days=30, batch_size=2)
+
+        assert result == {'deleted_rows': 5}
+        assert db.session.execute(text("SELECT COUNT(*) FROM predictions")).scalar() == 2
+
+    def test_partition_naming(self):
+        """Test monthly partition boundaries across a year end"""
+        start = month_start(datetime(2024, 12, 15, tzinfo=timezone.utc))
+        assert partition_name(start) == 'predictions_y2024m12'
+        assert partition_name(add_months(start, 1)) == 'predictions_y2025m01'
+
+class TestModelRegistry:
+    @pytest.fixture
+    def app(self, tmp_path):
+        """Create test Flask app with a model_versions table, redis cache and two saved models"""
+        app = Flask(__name__)
+        app.config['TESTING'] = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        app.cache = CacheStore(fakeredis.FakeRedis())
+
+        for timestamp, ticker in [('20241204_143426', 'SPY'), ('20241205_090000', 'AAPL')]:
+            version_dir = tmp_path / f"v1.0.0_{timestamp}"
+            version_dir.mkdir()
+            (version_dir / 'metadata.json').write_text(json.dumps({'version': '1.0.0', 'timestamp': timestamp, 'ticker': ticker}))
+        app.models_path = str(tmp_path) + os.sep
+
+        with app.app_context():
+            db.session.execute(text("""
+                CREATE TABLE model_versions (
+                    model_id VARCHAR(36) PRIMARY KEY,
+                    version VARCHAR(50) NOT NULL,
+                    ticker VARCHAR(10),
+                    artifact_path VARCHAR(255),
+                    created_at TIMESTAMP,
+                    parameters TEXT NOT NULL,
+                    metrics TEXT,
+                    is_active BOOLEAN DEFAULT 1
+                )
+            """))
+            db.session.commit()
+
+            statements = []
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda conn, cursor, statement, *args: statements.append(statement))
+            app.statements = statements
+            yield app
+
+    def test_sync_and_lookups(self, app):
+        """Test that existing directories are registered and served from the catalog"""
+        registry = ModelRegistry(app.models_path)
+        assert registry.sync_from_directory() == 2
+        assert registry.sync_from_directory() == 0
+
+        app.statements.clear()
+        assert registry.latest()['ticker'] == 'AAPL'
+        assert registry.latest('SPY')['metadata']['timestamp'] == '20241204_143426'
+        assert registry.get('1.0.0')['ticker'] == 'AAPL'
+        assert registry.get('2.0.0') is None
+        assert not any('model_versions' in s for s in app.statements)
+
+    def test_pagination_newest_first(self, app):
+        """Test paginated listing"""
+        registry = ModelRegistry(app.models_path)
+        registry.sync_from_directory()
+        registry.register('1.1.0', 'models_saved/v1.1.0_x/', {'version': '1.1.0'}, ticker='SPY')
+
+        first, total = registry.list(page=1, per_page=2)
+        second, _ = registry.list(page=2, per_page=2)
+        assert total == 3
+        assert [entry['version'] for entry in first] == ['1.1.0', '1.0.0']
+        assert [entry['ticker'] for entry in second] == ['SPY']
+        assert registry.list(ticker='SPY')[1] == 2
+
+    def test_registration_reaches_other_processes(self, app):
+        """Test that a model registered elsewhere invalidates this catalog"""
+        reader = ModelRegistry(app.models_path)
+        writer = ModelRegistry(app.models_path)
+        reader.sync_from_directory()
+        assert reader.latest('MSFT') is None
+
+        model_id = writer.register('1.0.0', 'models_saved/v1.0.0_y/', {'version': '1.0.0'}, ticker='MSFT')
+
+        assert reader.latest('MSFT')['model_id'] == model_id
+        assert reader.get(model_id=model_id)['metadata']['model_id'] == model_id
+
+    def test_registration_survives_cache_outage(self, app, monkeypatch):
+        """Test that a failing cache invalidation does not fail a committed registration or retirement"""
+        registry = ModelRegistry(app.models_path)
+        registry.refresh(force=True)
+
+        def fail(namespace):
+            raise ConnectionError('redis down')
+        monkeypatch.setattr(app.cache, 'invalidate', fail)
+
+        model_id = registry.register('1.1.0', 'models_saved/v1.1.0/', {'version': '1.1.0'}, ticker='MSFT')
+        assert registry.latest('MSFT')['model_id'] == model_id
+        assert db.session.execute(text("SELECT COUNT(*) FROM model_versions WHERE model_id = :m"),
+                                  {'m': model_id}).scalar() == 1
+
+        assert registry.retire([model_id]) == 1
+        assert registry.latest('MSFT') is None
+
+    def test_only_newest_of_ticker_active_whatever_the_order(self, app):
+        """Test that registering an older model after a newer one leaves the newer one active"""
+        registry = ModelRegistry(app.models_path)
+        registry.refresh(force=True)
+        now = datetime.now(timezone.utc)
+        newer = registry.register('1.2.0', 'models_saved/v1.2.0/', {'version': '1.2.0'}, ticker='SPY', created_at=now)
+        older = registry.register('1.1.0', 'models_saved/v1.1.0/', {'version': '1.1.0'}, ticker='SPY',
+                                  created_at=now - timedelta(days=1))
+
+        active = dict(db.session.execute(text("SELECT model_id, is_active FROM model_versions")).fetchall())
+        assert active == {newer: 1, older: 0}
+        assert registry.latest('SPY')['model_id'] == newer
+        assert not registry.get(model_id=older)['is_active']
+
+    def test_directory_scan_cached_without_app_context(self, app, monkeypatch):
+        """Test that lookups outside an app context rescan the directory only once max_age passes"""
+        registry = ModelRegistry(app.models_path, max_age=60)
+        scans = []
+        scan = registry._scan_directory
+        monkeypatch.setattr(registry, '_scan_directory', lambda: scans.append(1) or scan())
+        monkeypatch.setattr(registry_module, 'has_app_context', lambda: False)
+
+        for _ in range(3):
+            assert registry.latest('SPY')['ticker'] == 'SPY'
+        assert len(scans) == 1
+
+        registry.max_age = 0
+        registry.latest('SPY')
+        assert len(scans) == 2
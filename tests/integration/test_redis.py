@@ -0,0 +1,100 @@
+import pytest
+import fakeredis
+from datetime import datetime, timedelta, timezone
+from flask import Flask
+from config.cache import CacheStore
+from auth.config import AuthConfig
+from auth.middleware import RateLimit
+from auth.rate_limiter import LocalRateLimiter
+import auth.middleware as middleware
+
+class TestCacheStore:
+    @pytest.fixture
+    def cache(self):
+        """Cache store on an in-memory redis"""
+        return CacheStore(fakeredis.FakeRedis(), default_ttl=timedelta(hours=24))
+
+    def test_entries_carry_native_ttl(self, cache):
+        """Test that every entry is written with an expiry"""
+        cache.set('tickers', 'SPY', True)
+
+        assert cache.get('tickers', 'SPY') is True
+        assert 0 < cache.redis_client.ttl(cache.make_key('tickers', 'SPY')) <= 24 * 3600
+
+    def test_invalidate_bumps_generation(self, cache):
+        """Test that invalidation hides old entries without deleting them"""
+        cache.set('tickers', 'SPY', True)
+        cache.invalidate('tickers')
+
+        assert cache.get('tickers', 'SPY') is None
+        assert cache.redis_client.exists('cache:tickers:v0:SPY')
+
+    def test_sweep_legacy_keys(self, cache):
+        """Test that legacy keys are deleted when stale and given a TTL when fresh"""
+        redis_client = cache.redis_client
+        now = datetime.now(timezone.utc)
+        redis_client.set('cache:old', 'value')
+        redis_client.set('cache:old:timestamp', (now - timedelta(days=2)).timestamp())
+        redis_client.set('cache:fresh', 'value')
+        redis_client.set('cache:fresh:timestamp', (now - timedelta(hours=1)).timestamp())
+        cache.set('tickers', 'SPY', True)
+
+        stats = cache.sweep_legacy(batch_size=2)
+
+        assert stats['deleted'] == 1 and stats['expiring'] == 1
+        assert redis_client.get('cache:old') is None
+        assert redis_client.get('cache:old:timestamp') is None
+        assert 0 < redis_client.ttl('cache:fresh') <= 23 * 3600 + 1
+        assert cache.get('tickers', 'SPY') is True
+
+    def test_memory_usage_by_namespace(self, cache):
+        """Test namespace usage report"""
+        cache.set('tickers', 'SPY', True)
+        cache.set('tickers', 'AAPL', True)
+
+        usage = cache.memory_usage()
+        assert usage['tickers']['keys'] == 2
+        assert usage['tickers']['generation'] == 0
+
+class TestRateLimit:
+    @pytest.fixture
+    def app(self, monkeypatch):
+        """Flask app with an in-memory redis and a small limit"""
+        app = Flask(__name__)
+        app.redis_client = fakeredis.FakeRedis()
+        monkeypatch.setattr(AuthConfig, 'RATE_LIMIT_REQUESTS', 5)
+        monkeypatch.setattr(AuthConfig, 'RATE_LIMIT_WINDOW', 60)
+        monkeypatch.setattr(RateLimit, '_scripts', {})
+        with app.app_context():
+            yield app
+
+    def test_limit_enforced_in_one_call(self, app):
+        """Test that check() returns allowed/remaining/reset from the script"""
+        limiter = RateLimit()
+        results = [limiter.check('user-1') for _ in range(6)]
+
+        assert [r.allowed for r in results] == [True] * 5 + [False]
+        assert [r.remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+        assert results[-1].retry_after > 0
+        assert limiter.get_remaining_requests('user-1') == 0
+        assert limiter.get_remaining_requests('user-2') == 5
+
+    def test_local_fallback_when_redis_down(self, app, monkeypatch):
+        """Test that a redis outage limits locally instead of failing open"""
+        monkeypatch.setattr(middleware, 'local_rate_limiter', LocalRateLimiter())
+        app.redis_client.connected = False
+        limiter = RateLimit()
+
+        results = [limiter.check('user-1').allowed for _ in range(6)]
+        assert results == [True] * 5 + [False]
+
+    def test_cost_weighted_usage_by_endpoint(self, app, monkeypatch):
+        """Test that expensive endpoints spend more of the tier quota and are tracked per endpoint"""
+        monkeypatch.setitem(AuthConfig.TIER_QUOTAS, 'pro', 20)
+        limiter = RateLimit('pro')
+
+        assert limiter.check('user-1', 15, 'train').allowed
+        assert limiter.check('user-1', 1, 'predict').remaining == 4
+        assert not limiter.check('user-1', 15, 'train').allowed
+        assert limiter.get_usage('user-1') == {'train': 15, 'predict': 1}
+        assert RateLimit('unknown-tier').max_requests == 5
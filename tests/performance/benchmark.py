@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import platform
+import statistics
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+
+class BenchmarkConfig:
+    """Benchmark suite settings"""
+    ROUNDS = int(os.getenv('BENCHMARK_ROUNDS', '7'))
+    WARMUP = int(os.getenv('BENCHMARK_WARMUP', '1'))
+    #a benchmark fails when its median is slower than baseline * TOLERANCE (plus MIN_SLACK_MS)
+    TOLERANCE = float(os.getenv('BENCHMARK_TOLERANCE', '1.5'))
+    MIN_SLACK_MS = float(os.getenv('BENCHMARK_MIN_SLACK_MS', '2'))
+    #years of synthetic history per ticker, and the tickers the end-to-end benchmarks cycle through
+    YEARS = int(os.getenv('BENCHMARK_YEARS', '10'))
+    TICKERS = os.getenv('BENCHMARK_TICKERS', 'SPY,QQQ,AAPL').split(',')
+    TRAIN_EPOCHS = int(os.getenv('BENCHMARK_TRAIN_EPOCHS', '1'))
+    RESULTS_PATH = os.getenv('BENCHMARK_RESULTS', 'logs/benchmarks/results.json')
+    BASELINE_PATH = os.getenv('BENCHMARK_BASELINE', os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json'))
+    #rewrite the baseline from this run instead of checking against it
+    UPDATE_BASELINE = os.getenv('BENCHMARK_UPDATE_BASELINE', 'false').lower() == 'true'
+
+def measure(fn, setup=None, rounds=BenchmarkConfig.ROUNDS, warmup=BenchmarkConfig.WARMUP):
+    """
+    Time fn over several rounds and summarise in milliseconds.
+
+    setup() runs before every round outside the timed region and its result
+    is passed to fn, so stages that modify their input get a fresh copy.
+    """
+    timings = []
+    for i in range(warmup + rounds):
+        args = setup() if setup else None
+        start = time.perf_counter()
+        fn(args) if setup else fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            timings.append(elapsed)
+    timings.sort()
+    return {
+        'rounds': rounds,
+        'median_ms': statistics.median(timings),
+        'min_ms': timings[0],
+        'max_ms': timings[-1],
+        'p95_ms': timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))],
+        'stdev_ms': statistics.stdev(timings) if len(timings) > 1 else 0.0
+    }
+
+def calibrate(rounds=5):
+    """
+    Median time of a fixed pandas/numpy workload on this machine.
+
+    Baselines record it alongside their timings, and thresholds are scaled
+    by the ratio between machines, so a slower CI runner does not read as a
+    regression.
+    """
+    series = pd.Series(np.random.default_rng(0).normal(size=200_000))
+
+    def workload():
+        series.rolling(20).std().ewm(span=12).mean().sum()
+        np.sort(series.to_numpy())
+        sum(i * i for i in range(50_000))
+
+    return measure(workload, rounds=rounds, warmup=1)['median_ms']
+
+class BenchmarkRecorder:
+    """Collects results for the session, checks them against the baseline and writes them as JSON"""
+
+    def __init__(self, baseline_path=BenchmarkConfig.BASELINE_PATH, tolerance=BenchmarkConfig.TOLERANCE,
+                 min_slack_ms=BenchmarkConfig.MIN_SLACK_MS):
+        self.baseline_path = baseline_path
+        self.tolerance = tolerance
+        self.min_slack_ms = min_slack_ms
+        self.calibration_ms = calibrate()
+        self.results = {}
+        self.baseline = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                self.baseline = json.load(f)
+
+    @property
+    def scale(self):
+        """How much slower this machine is than the one that recorded the baseline"""
+        baseline_calibration = self.baseline.get('calibration_ms')
+        return self.calibration_ms / baseline_calibration if baseline_calibration else 1.0
+
+    def limit_ms(self, name):
+        reference = self.baseline.get('benchmarks', {}).get(name)
+        if reference is None:
+            return None
+        return reference['median_ms'] * self.scale * self.tolerance + self.min_slack_ms
+
+    def record(self, name, result, **extra):
+        """Store a result and return a regression message, or None when it is within tolerance"""
+        result = {**result, **extra}
+        limit = self.limit_ms(name)
+        result['limit_ms'] = limit
+        result['regressed'] = limit is not None and result['median_ms'] > limit
+        self.results[name] = result
+        if result['regressed']:
+            return (f"{name} regressed: median {result['median_ms']:.2f} ms, limit {limit:.2f} ms "
+                    f"(baseline {self.baseline['benchmarks'][name]['median_ms']:.2f} ms x machine scale "
+                    f"{self.scale:.2f} x tolerance {self.tolerance})")
+        return None
+
+    def report(self):
+        return {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+            'calibration_ms': self.calibration_ms,
+            'tolerance': self.tolerance,
+            'benchmarks': self.results
+        }
+
+    def write(self, path=BenchmarkConfig.RESULTS_PATH):
+        if not self.results:
+            return None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+        return path
+
+    def write_baseline(self):
+        """Replace the baseline with this run, keeping entries for benchmarks that did not run"""
+        benchmarks = dict(self.baseline.get('benchmarks', {}))
+        #entries from another machine are rescaled to this one's calibration
+        for name in benchmarks:
+            benchmarks[name] = {'median_ms': round(benchmarks[name]['median_ms'] * self.scale, 3)}
+        for name, result in self.results.items():
+            benchmarks[name] = {'median_ms': round(result['median_ms'], 3)}
+        with open(self.baseline_path, 'w') as f:
+            json.dump({'calibration_ms': round(self.calibration_ms, 3), 'benchmarks': benchmarks},
+                      f, indent=2, sort_keys=True)
+            f.write('\n')
+        return self.baseline_path
@@ -0,0 +1,29 @@
+import pytest
+from tests.performance.benchmark import BenchmarkConfig, BenchmarkRecorder, measure
+
+@pytest.fixture(scope='session')
+def benchmark_recorder():
+    """Results of every benchmark in the run, written to BENCHMARK_RESULTS at the end"""
+    recorder = BenchmarkRecorder()
+    yield recorder
+    path = recorder.write()
+    if path:
+        print(f"\nbenchmark results written to {path}")
+    if BenchmarkConfig.UPDATE_BASELINE and recorder.results:
+        print(f"baseline updated: {recorder.write_baseline()}")
+
+@pytest.fixture
+def benchmark(benchmark_recorder):
+    """
+    Time a callable, record it under name and fail the test if it regressed.
+
+    Usage: benchmark('predict.add_indicators', fn, setup=make_input)
+    """
+    def run(name, fn, setup=None, rounds=BenchmarkConfig.ROUNDS, warmup=BenchmarkConfig.WARMUP, **extra):
+        result = measure(fn, setup=setup, rounds=rounds, warmup=warmup)
+        failure = benchmark_recorder.record(name, result, **extra)
+        print(f"\n{name}: median {result['median_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms over {rounds} rounds")
+        if failure and not BenchmarkConfig.UPDATE_BASELINE:
+            pytest.fail(failure)
+        return benchmark_recorder.results[name]
+    return run
@@ -0,0 +1,522 @@
+"""
+Offline HTTP load tests for app.py.
+
+Boots app.py in N worker processes sharing one listening socket, with
+every external dependency replaced by a local stand-in:
+- market data: SyntheticMarket instead of yfinance
+- database: a SQLite file (or --database-url)
+- redis: a fakeredis TCP server (or --redis-url)
+
+It then drives a weighted mix of /predict, /train, /auth/* and
+/api/keys/* at fixed arrival rates, stepping the rate up for each
+worker configuration until latency or errors break the limits. The
+highest rate that held is the configuration's saturation point.
+
+    python -m tests.performance.loadtest --workers 1,2,4 --rates 2,5,10,20 --duration 30
+    python -m tests.performance.loadtest --mix predict=80,auth_status=20 --no-threads
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+import subprocess
+import threading
+import argparse
+import hashlib
+import sqlite3
+import socket
+import random
+import shutil
+import json
+import time
+import uuid
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadtest_schema.sql')
+
+class LoadTestConfig:
+    """Load test defaults, each overridable on the command line"""
+    WORKERS = os.getenv('LOADTEST_WORKERS', '1,2')
+    RATES = os.getenv('LOADTEST_RATES', '1,2,5,10')
+    DURATION = float(os.getenv('LOADTEST_DURATION', '20'))
+    MIX = os.getenv('LOADTEST_MIX', 'predict=70,auth_status=10,keys_list=10,login=8,train=2')
+    USERS = int(os.getenv('LOADTEST_USERS', '10'))
+    TICKERS = os.getenv('LOADTEST_TICKERS', 'SPY,QQQ,AAPL')
+    YEARS = int(os.getenv('LOADTEST_YEARS', '10'))
+    TRAIN_EPOCHS = int(os.getenv('LOADTEST_TRAIN_EPOCHS', '1'))
+    #a rate is saturated once p99 latency, the error rate or the achieved throughput misses these
+    P99_LIMIT_MS = float(os.getenv('LOADTEST_P99_LIMIT_MS', '2000'))
+    ERROR_BUDGET = float(os.getenv('LOADTEST_ERROR_BUDGET', '0.01'))
+    MIN_THROUGHPUT_RATIO = float(os.getenv('LOADTEST_MIN_THROUGHPUT_RATIO', '0.9'))
+    #client threads; requests beyond this wait client side and the wait counts as latency
+    MAX_IN_FLIGHT = int(os.getenv('LOADTEST_MAX_IN_FLIGHT', '256'))
+    REQUEST_TIMEOUT = float(os.getenv('LOADTEST_REQUEST_TIMEOUT', '60'))
+    STARTUP_TIMEOUT = float(os.getenv('LOADTEST_STARTUP_TIMEOUT', '300'))
+    WORKDIR = os.getenv('LOADTEST_WORKDIR', os.path.join(ROOT, 'logs', 'loadtest'))
+    #every user gets this tier, whose quota is far above what a test sends so the limiter does not cap it
+    #(still finite: GCRA needs an emission interval of at least a millisecond)
+    TIER = 'loadtest'
+    TIER_QUOTA = 10 ** 6
+
+class VirtualUser:
+    """A seeded account: credentials, session cookies and an API key"""
+
+    def __init__(self, email, password, api_key=None):
+        self.email = email
+        self.password = password
+        self.api_key = api_key
+        self.cookies = {}
+
+def _date_range(market_end, years):
+    end = min(market_end, datetime.now())
+    return (end - timedelta(days=365 * years)).strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+#scenario name -> (user, context, rng) -> (method, path, request kwargs)
+SCENARIOS = {
+    'predict': lambda user, ctx, rng: ('POST', '/predict', {
+        'json': {'ticker': rng.choice(ctx['tickers']),
+                 **dict(zip(('start_date', 'end_date'), _date_range(ctx['market_end'], 1)))},
+        'headers': {'X-API-Key': user.api_key}}),
+    'train': lambda user, ctx, rng: ('POST', '/train', {
+        'json': {'ticker': rng.choice(ctx['tickers']),
+                 **dict(zip(('start_date', 'end_date'), _date_range(ctx['market_end'], 5)))},
+        'headers': {'X-API-Key': user.api_key}}),
+    'login': lambda user, ctx, rng: ('POST', '/auth/login', {
+        'json': {'email': user.email, 'password': user.password}, 'cookies': None}),
+    'register': lambda user, ctx, rng: ('POST', '/auth/register', {
+        'json': {'email': f"load-{uuid.uuid4().hex[:12]}@example.com", 'password': 'load-test-password'},
+        'cookies': None}),
+    'auth_status': lambda user, ctx, rng: ('GET', '/auth/status', {}),
+    'keys_list': lambda user, ctx, rng: ('GET', '/api/keys/list', {}),
+    'keys_create': lambda user, ctx, rng: ('POST', '/api/keys/create', {}),
+    'health': lambda user, ctx, rng: ('GET', '/health', {'cookies': None})
+}
+
+def parse_mix(spec):
+    """'predict=70,login=30' -> {'predict': 70.0, 'login': 30.0}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("The mix needs at least one scenario with a positive weight")
+    return mix
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(-(-q * len(sorted_values) // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(samples, wall_seconds, offered_rate=None):
+    """
+    Throughput, latency percentiles and error counts for a list of samples.
+
+    A sample is (scenario, status, latency_ms). Status None is a
+    connection error or timeout. 5xx and connection errors count as
+    errors; 429 and 503 count as rejected (the app shedding load); other
+    4xx are client errors. error_rate covers errors and rejections.
+    """
+    def stats(group):
+        latencies = sorted(latency for _, _, latency in group)
+        errors = sum(1 for _, status, _ in group if status is None or (status >= 500 and status != 503))
+        rejected = sum(1 for _, status, _ in group if status in (429, 503))
+        client_errors = sum(1 for _, status, _ in group if status is not None and 400 <= status < 500 and status != 429)
+        return {
+            'requests': len(group),
+            'throughput': len(group) / wall_seconds if wall_seconds else 0.0,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1] if latencies else None,
+            'errors': errors,
+            'rejected': rejected,
+            'client_errors': client_errors,
+            'error_rate': (errors + rejected) / len(group) if group else 0.0
+        }
+
+    summary = stats(samples)
+    summary['offered_rate'] = offered_rate
+    summary['wall_seconds'] = wall_seconds
+    summary['scenarios'] = {
+        name: stats([sample for sample in samples if sample[0] == name])
+        for name in sorted({sample[0] for sample in samples})
+    }
+    return summary
+
+def drive(base_url, rate, duration, mix, users, context=None, max_in_flight=LoadTestConfig.MAX_IN_FLIGHT,
+          timeout=LoadTestConfig.REQUEST_TIMEOUT, seed=0):
+    """
+    Send requests at a fixed arrival rate for duration seconds and summarise them.
+
+    Arrivals are scheduled up front (open loop), so a slow server does not
+    slow the client down. Latency is measured from each request's scheduled
+    time, which includes any wait for a free client thread; otherwise
+    queueing would hide behind the client.
+    """
+    import requests
+
+    rng = random.Random(seed)
+    context = context or {}
+    names, weights = zip(*mix.items())
+    local = threading.local()
+    samples = []
+    samples_lock = threading.Lock()
+
+    def send(name, user, scheduled):
+        method, path, kwargs = SCENARIOS[name](user, context, random.Random(scheduled))
+        if 'cookies' not in kwargs:
+            kwargs['cookies'] = user.cookies
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        try:
+            status = session.request(method, base_url + path, timeout=timeout, **kwargs).status_code
+        except requests.RequestException:
+            status = None
+        finally:
+            session.cookies.clear() #cookies belong to the virtual user, not the thread
+        latency = (time.perf_counter() - scheduled) * 1000
+        with samples_lock:
+            samples.append((name, status, latency))
+
+    total = max(1, int(rate * duration))
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    futures = []
+    start = time.perf_counter()
+    for i in range(total):
+        scheduled = start + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        futures.append(executor.submit(send, rng.choices(names, weights)[0], rng.choice(users), scheduled))
+    wait(futures)
+    executor.shutdown()
+    return summarize(samples, time.perf_counter() - start, offered_rate=rate)
+
+def is_saturated(summary, p99_limit_ms=LoadTestConfig.P99_LIMIT_MS, error_budget=LoadTestConfig.ERROR_BUDGET,
+                 min_throughput_ratio=LoadTestConfig.MIN_THROUGHPUT_RATIO):
+    """Reasons a stage missed its limits (empty when it held)"""
+    reasons = []
+    if summary['p99_ms'] is not None and summary['p99_ms'] > p99_limit_ms:
+        reasons.append(f"p99 {summary['p99_ms']:.0f} ms > {p99_limit_ms:.0f} ms")
+    if summary['error_rate'] > error_budget:
+        reasons.append(f"error rate {summary['error_rate']:.1%} > {error_budget:.1%}")
+    if summary['offered_rate'] and summary['throughput'] < summary['offered_rate'] * min_throughput_ratio:
+        reasons.append(f"throughput {summary['throughput']:.1f}/s < {min_throughput_ratio:.0%} of {summary['offered_rate']}/s")
+    return reasons
+
+def find_saturation(run_rate, rates, **limits):
+    """Step through rates until one is saturated; capacity is the highest rate that held"""
+    stages = []
+    capacity = None
+    for rate in sorted(rates):
+        summary = run_rate(rate)
+        summary['saturated_by'] = is_saturated(summary, **limits)
+        stages.append(summary)
+        if summary['saturated_by']:
+            break
+        capacity = rate
+    return {'capacity': capacity, 'stages': stages}
+
+class OfflineEnvironment:
+    """
+    Shared stand-ins for every worker configuration of a run.
+
+    Holds the fake redis server, the SQLite database, a seed model
+    trained on synthetic data and the environment workers start with.
+    Users and their sessions live in redis and the database, so they
+    survive restarting the workers with another configuration.
+    """
+
+    def __init__(self, workdir=LoadTestConfig.WORKDIR, tickers=LoadTestConfig.TICKERS, years=LoadTestConfig.YEARS,
+                 train_epochs=LoadTestConfig.TRAIN_EPOCHS, database_url=None, redis_url=None):
+        self.workdir = os.path.abspath(workdir)
+        self.tickers = [t.strip() for t in tickers.split(',') if t.strip()]
+        self.years = years
+        self.train_epochs = train_epochs
+        self.database_url = database_url
+        self.redis_url = redis_url
+        #bars end today, so requests for recent dates pass the app's date validation
+        self.market_start = (datetime.now() - timedelta(days=365 * years)).strftime('%Y-%m-%d')
+        self.redis_server = None
+        self.users = []
+
+    def start(self):
+        os.makedirs(self.workdir, exist_ok=True)
+        if not self.redis_url:
+            import fakeredis
+            self.redis_server = fakeredis.TcpFakeServer(('127.0.0.1', 0), server_type='redis')
+            threading.Thread(target=self.redis_server.serve_forever, daemon=True).start()
+            self.redis_url = f"redis://127.0.0.1:{self.redis_server.server_address[1]}/0"
+        if not self.database_url:
+            db_path = os.path.join(self.workdir, 'loadtest.db')
+            with sqlite3.connect(db_path) as conn, open(SCHEMA_PATH) as f:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(f.read())
+            self.database_url = f"sqlite:///{db_path}?detect_types=1&timeout=30"
+        self._seed_model()
+        self._seed_ticker_cache()
+        return self
+
+    def worker_env(self):
+        env = dict(os.environ)
+        env.update({
+            'PYTHONPATH': os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')])),
+            'DATABASE_URL': self.database_url,
+            'REDIS_URL': self.redis_url,
+            'TIER_QUOTAS': json.dumps({LoadTestConfig.TIER: LoadTestConfig.TIER_QUOTA}),
+            'LOADTEST_TICKERS': ','.join(self.tickers),
+            'LOADTEST_YEARS': str(self.years),
+            'LOADTEST_MARKET_START': self.market_start,
+            'LOADTEST_TRAIN_EPOCHS': str(self.train_epochs),
+            'TF_CPP_MIN_LOG_LEVEL': '2'
+        })
+        return env
+
+    def market(self):
+        from tests.performance.synthetic_market import SyntheticMarket
+        return SyntheticMarket(self.tickers, years=self.years, start=self.market_start)
+
+    def _seed_model(self):
+        """Train and save a small model in the workdir unless one is there, so /predict has a model at startup"""
+        saved = os.path.join(self.workdir, 'models_saved')
+        if os.path.isdir(saved) and any(not name.startswith('.') for name in os.listdir(saved)):
+            return
+        subprocess.run([sys.executable, '-m', 'tests.performance.loadtest', 'seed-model'],
+                       cwd=self.workdir, env=self.worker_env(), check=True)
+
+    def _seed_ticker_cache(self):
+        """Mark the tickers as valid so validate_ticker never asks yfinance"""
+        from redis import Redis
+        from config.cache import CacheStore
+        cache = CacheStore(Redis.from_url(self.redis_url))
+        for ticker in self.tickers:
+            cache.set('tickers', ticker, True)
+
+    def seed_users(self, base_url, count):
+        """Register users through the app, give them the load test tier and an API key, and log them in"""
+        import requests
+
+        prefix = uuid.uuid4().hex[:8]
+        users = [VirtualUser(f"user{i}-{prefix}@loadtest.local", f"password-{prefix}-{i}") for i in range(count)]
+        for user in users:
+            response = requests.post(f"{base_url}/auth/register", json={'email': user.email, 'password': user.password})
+            response.raise_for_status()
+
+        #the tier is not settable through the API, and key creation needs a browser session, so both are written directly
+        from sqlalchemy import create_engine, text
+        engine = create_engine(self.database_url)
+        now = datetime.now(timezone.utc)
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE users SET subscription_tier = :tier WHERE email LIKE :pattern"),
+                         {'tier': LoadTestConfig.TIER, 'pattern': f"%-{prefix}@loadtest.local"})
+            for user in users:
+                user_id = conn.execute(text("SELECT user_id FROM users WHERE email = :email"), {'email': user.email}).scalar()
+                user.api_key = hashlib.sha256(os.urandom(32)).hexdigest()
+                conn.execute(text("""
+                    INSERT INTO api_keys (key_id, user_id, api_key, created_at, expires_at)
+                    VALUES (:key_id, :user_id, :api_key, :created_at, :expires_at)
+                """), {'key_id': uuid.uuid4().hex, 'user_id': user_id, 'api_key': user.api_key,
+                       'created_at': now, 'expires_at': now + timedelta(days=365)})
+        engine.dispose()
+
+        for user in users:
+            response = requests.post(f"{base_url}/auth/login", json={'email': user.email, 'password': user.password})
+            response.raise_for_status()
+            user.cookies = response.cookies.get_dict()
+        self.users = users
+        return users
+
+    def stop(self):
+        if self.redis_server is not None:
+            self.redis_server.shutdown()
+            self.redis_server.server_close()
+            self.redis_server = None
+
+class WorkerPool:
+    """app.py served by N processes accepting on one shared socket"""
+
+    def __init__(self, environment, workers=1, threaded=True):
+        self.environment = environment
+        self.workers = workers
+        self.threaded = threaded
+        self.processes = []
+        self.sock = None
+        self.base_url = None
+
+    @property
+    def label(self):
+        return f"{self.workers} worker{'s' if self.workers != 1 else ''}, {'threaded' if self.threaded else 'single-threaded'}"
+
+    def start(self, timeout=LoadTestConfig.STARTUP_TIMEOUT):
+        import requests
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(1024)
+        self.sock.set_inheritable(True)
+        self.base_url = f"http://127.0.0.1:{self.sock.getsockname()[1]}"
+
+        command = [sys.executable, '-m', 'tests.performance.loadtest', 'worker', '--fd', str(self.sock.fileno())]
+        if not self.threaded:
+            command.append('--no-threads')
+        log = open(os.path.join(self.environment.workdir, 'workers.log'), 'ab')
+        for _ in range(self.workers):
+            self.processes.append(subprocess.Popen(
+                command, cwd=self.environment.workdir, env=self.environment.worker_env(),
+                pass_fds=(self.sock.fileno(),), stdout=log, stderr=subprocess.STDOUT))
+        log.close()
+
+        #every worker has to be up, not just the first to answer
+        deadline = time.monotonic() + timeout
+        ready = set()
+        while len(ready) < self.workers:
+            if time.monotonic() > deadline or any(p.poll() is not None for p in self.processes):
+                self.stop()
+                raise RuntimeError(f"Workers failed to start, see {self.environment.workdir}/workers.log")
+            try:
+                ready.add(requests.get(f"{self.base_url}/loadtest/worker", timeout=5).json()['pid'])
+            except (requests.RequestException, ValueError, KeyError):
+                time.sleep(0.5)
+        return self
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+def run_worker(fd, threaded=True):
+    """Worker process: import app.py with offline stand-ins and serve on the inherited socket"""
+    def parse_timestamp(value):
+        parsed = datetime.fromisoformat(value.decode('utf-8'))
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+    #SQLAlchemy stores uuids as 32 hex chars on SQLite; raw SQL gets the same, and timestamps come back as datetimes
+    sqlite3.register_adapter(uuid.UUID, lambda value: value.hex)
+    sqlite3.register_converter('TIMESTAMPTZ', parse_timestamp)
+
+    from werkzeug.serving import make_server
+    from flask import jsonify
+    from tests.performance.synthetic_market import SyntheticMarket
+    import app as app_module
+
+    market = SyntheticMarket(os.environ['LOADTEST_TICKERS'].split(','), years=int(os.environ['LOADTEST_YEARS']),
+                             start=os.environ['LOADTEST_MARKET_START'])
+    app_module.predictor.data_cache.provider = market.download
+    app_module.predictor.epochs = int(os.environ['LOADTEST_TRAIN_EPOCHS'])
+    #scheduled jobs would reach yfinance; the load test only measures request handling
+    app_module.background_tasks.scheduler.shutdown(wait=False)
+
+    @app_module.app.route('/loadtest/worker')
+    def loadtest_worker():
+        return jsonify({'pid': os.getpid()})
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=threaded, fd=fd)
+    server.serve_forever()
+
+def seed_model():
+    """Train one epoch on synthetic bars and save the model into ./models_saved"""
+    from models.lstm_model import StockPredictor
+    from tests.performance.synthetic_market import SyntheticMarket
+
+    tickers = os.environ['LOADTEST_TICKERS'].split(',')
+    market = SyntheticMarket(tickers[:1], years=int(os.environ['LOADTEST_YEARS']), start=os.environ['LOADTEST_MARKET_START'])
+    predictor = StockPredictor(data_cache=market)
+    predictor.epochs = int(os.environ['LOADTEST_TRAIN_EPOCHS'])
+    predictor.train(tickers[0], os.environ['LOADTEST_MARKET_START'], market.end.strftime('%Y-%m-%d'))
+    predictor.save_model()
+
+def format_report(results):
+    lines = []
+    for result in results:
+        lines.append(f"\n{result['label']}: capacity {result['capacity'] if result['capacity'] is not None else '< lowest rate'} req/s")
+        lines.append(f"  {'rate':>6} {'thru':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'err%':>6}  scenario p99s")
+        for stage in result['stages']:
+            scenarios = ', '.join(f"{name} {s['p99_ms']:.0f}" for name, s in stage['scenarios'].items())
+            lines.append(
+                f"  {stage['offered_rate']:>6g} {stage['throughput']:>7.1f} {stage['p50_ms'] or 0:>8.0f} "
+                f"{stage['p95_ms'] or 0:>8.0f} {stage['p99_ms'] or 0:>8.0f} {stage['error_rate'] * 100:>6.1f}  {scenarios}")
+            if stage['saturated_by']:
+                lines.append(f"         saturated: {'; '.join(stage['saturated_by'])}")
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test of app.py")
+    sub = parser.add_subparsers(dest='command')
+    worker = sub.add_parser('worker')
+    worker.add_argument('--fd', type=int, required=True)
+    worker.add_argument('--no-threads', action='store_true')
+    sub.add_parser('seed-model')
+
+    parser.add_argument('--workers', default=LoadTestConfig.WORKERS, help="worker counts to compare, e.g. 1,2,4")
+    parser.add_argument('--no-threads', action='store_true', help="one request at a time per worker")
+    parser.add_argument('--rates', default=LoadTestConfig.RATES, help="arrival rates in requests/s, e.g. 2,5,10")
+    parser.add_argument('--duration', type=float, default=LoadTestConfig.DURATION, help="seconds per rate")
+    parser.add_argument('--mix', default=LoadTestConfig.MIX, help=f"weights of {', '.join(SCENARIOS)}")
+    parser.add_argument('--users', type=int, default=LoadTestConfig.USERS)
+    parser.add_argument('--tickers', default=LoadTestConfig.TICKERS)
+    parser.add_argument('--p99-limit-ms', type=float, default=LoadTestConfig.P99_LIMIT_MS)
+    parser.add_argument('--error-budget', type=float, default=LoadTestConfig.ERROR_BUDGET)
+    parser.add_argument('--workdir', default=LoadTestConfig.WORKDIR)
+    parser.add_argument('--fresh', action='store_true', help="delete the workdir (database, model, logs) first")
+    parser.add_argument('--database-url', help="use this database, already holding the app's schema, instead of SQLite")
+    parser.add_argument('--redis-url', help="use this redis instead of an in-process fake")
+    parser.add_argument('--report', help="JSON report path (default WORKDIR/report.json)")
+    args = parser.parse_args(argv)
+
+    if args.command == 'worker':
+        return run_worker(args.fd, threaded=not args.no_threads)
+    if args.command == 'seed-model':
+        return seed_model()
+
+    mix = parse_mix(args.mix)
+    if args.fresh and os.path.isdir(args.workdir):
+        shutil.rmtree(args.workdir)
+
+    environment = OfflineEnvironment(args.workdir, args.tickers, database_url=args.database_url,
+                                     redis_url=args.redis_url).start()
+    context = {'tickers': environment.tickers, 'market_end': datetime.now()}
+    limits = {'p99_limit_ms': args.p99_limit_ms, 'error_budget': args.error_budget}
+    rates = [float(rate) for rate in args.rates.split(',')]
+    results = []
+    try:
+        for workers in [int(count) for count in args.workers.split(',')]:
+            pool = WorkerPool(environment, workers, threaded=not args.no_threads)
+            print(f"starting {pool.label}...", flush=True)
+            pool.start()
+            try:
+                users = environment.users or environment.seed_users(pool.base_url, max(args.users, 1))
+                #first requests per ticker fill the market data cache; keep them out of the numbers
+                drive(pool.base_url, 2, 2, {'predict': 1}, users, context)
+                result = find_saturation(
+                    lambda rate: drive(pool.base_url, rate, args.duration, mix, users, context), rates, **limits)
+                result.update({'label': pool.label, 'workers': workers, 'threaded': not args.no_threads})
+                results.append(result)
+                print(format_report([result]), flush=True)
+            finally:
+                pool.stop()
+    finally:
+        environment.stop()
+
+    report_path = args.report or os.path.join(environment.workdir, 'report.json')
+    with open(report_path, 'w') as f:
+        json.dump({'created_at': datetime.now(timezone.utc).isoformat(), 'mix': mix, 'duration': args.duration,
+                   'limits': limits, 'results': results}, f, indent=2)
+    print(f"\nreport written to {report_path}")
+    return results
+
+if __name__ == '__main__':
+    main()
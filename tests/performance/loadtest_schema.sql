@@ -0,0 +1,75 @@
+-- SQLite version of database/schema.sql for the offline load-testing harness.
+-- users matches the SQLAlchemy model (uuids as 32 hex chars); columns the app reads
+-- through raw SQL are TIMESTAMPTZ so the harness can convert them back to datetimes.
+
+CREATE TABLE IF NOT EXISTS users(
+    user_id CHAR(32) PRIMARY KEY,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    last_login DATETIME,
+    is_active BOOLEAN DEFAULT 1,
+    subscription_tier VARCHAR(50) DEFAULT 'free'
+);
+
+CREATE TABLE IF NOT EXISTS api_keys(
+    key_id CHAR(32) PRIMARY KEY,
+    user_id CHAR(32) REFERENCES users(user_id) ON DELETE CASCADE,
+    api_key VARCHAR(255) UNIQUE NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    last_used TIMESTAMPTZ,
+    is_active BOOLEAN DEFAULT 1,
+    expires_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS historical_data (
+    data_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker VARCHAR(10) NOT NULL,
+    date DATE NOT NULL,
+    open DECIMAL(10,2) NOT NULL,
+    high DECIMAL(10,2) NOT NULL,
+    low DECIMAL(10,2) NOT NULL,
+    close DECIMAL(10,2) NOT NULL,
+    adjusted_close DECIMAL(10,2) NOT NULL,
+    volume BIGINT NOT NULL,
+    last_updated TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(ticker, date)
+);
+
+CREATE TABLE IF NOT EXISTS historical_data_empty (
+    ticker VARCHAR(10) NOT NULL,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    checked_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY(ticker, start_date, end_date)
+);
+
+CREATE TABLE IF NOT EXISTS model_versions (
+    model_id CHAR(36) PRIMARY KEY,
+    version VARCHAR(50) NOT NULL,
+    ticker VARCHAR(10),
+    artifact_path VARCHAR(255),
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    parameters TEXT NOT NULL,
+    metrics TEXT,
+    is_active BOOLEAN DEFAULT 1
+);
+
+-- not partitioned; database/partitions.py skips partition upkeep outside postgres
+CREATE TABLE IF NOT EXISTS predictions (
+    prediction_id CHAR(36) NOT NULL,
+    user_id CHAR(32) REFERENCES users(user_id),
+    model_id CHAR(36) REFERENCES model_versions(model_id),
+    ticker VARCHAR(10) NOT NULL,
+    prediction_date TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    target_date DATE NOT NULL,
+    predicted_value DECIMAL(10,2) NOT NULL,
+    actual_value DECIMAL(10,2),
+    confidence_score DECIMAL(5,2),
+    PRIMARY KEY (prediction_id, prediction_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_historical_data_ticker_date ON historical_data(ticker, date);
+CREATE INDEX IF NOT EXISTS idx_predictions_ticker_prediction_date ON predictions(ticker, prediction_date);
+CREATE INDEX IF NOT EXISTS idx_api_keys_key ON api_keys(api_key);
+CREATE INDEX IF NOT EXISTS idx_model_versions_ticker_created ON model_versions(ticker, created_at);
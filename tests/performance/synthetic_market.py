@@ -0,0 +1,71 @@
+import zlib
+import numpy as np
+import pandas as pd
+from utils.market_calendar import trading_days
+
+def synthetic_ohlcv(ticker, start='2014-08-01', years=10, seed=None):
+    """
+    Deterministic daily OHLCV bars for ticker, shaped like the yfinance download.
+
+    Sessions follow the exchange calendar. Prices are a geometric random walk
+    whose volatility switches between calm and stressed regimes. The seed
+    defaults to a hash of the ticker, so the same ticker always gives the same
+    bars and different tickers differ.
+    """
+    rng = np.random.default_rng(zlib.crc32(ticker.encode('utf-8')) if seed is None else seed)
+    start = pd.Timestamp(start)
+    index = trading_days(start, start + pd.DateOffset(years=years))
+    index.name = 'Date'
+    days = len(index)
+
+    regime = np.cumsum(rng.random(days) < 0.02) % 2 #flips about every 50 sessions
+    volatility = np.where(regime == 1, 0.025, 0.008)
+    close = 50 + 150 * rng.random()
+    close = close * np.exp(np.cumsum(rng.normal(0.0003, volatility)))
+
+    open_ = close * (1 + rng.normal(0, volatility / 2))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, volatility / 2)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, volatility / 2)))
+    return pd.DataFrame({
+        'Open': open_,
+        'High': high,
+        'Low': low,
+        'Close': close,
+        'Adj Close': close,
+        'Volume': rng.integers(1_000_000, 50_000_000, days).astype(float)
+    }, index=index)
+
+class SyntheticMarket:
+    """
+    Offline market data for benchmarks.
+
+    Stands in for both HistoricalDataCache (get_ticker_data) and its
+    yfinance provider (download). Bars for the configured tickers are
+    generated up front; any other ticker is generated on first use.
+    """
+
+    def __init__(self, tickers=('SPY',), years=10, start='2014-08-01'):
+        self.years = years
+        self.start = start
+        self.frames = {}
+        for ticker in tickers:
+            self.bars(ticker)
+
+    def bars(self, ticker):
+        frame = self.frames.get(ticker)
+        if frame is None:
+            frame = self.frames[ticker] = synthetic_ohlcv(ticker, self.start, self.years)
+        return frame
+
+    def get_ticker_data(self, ticker, start_date, end_date):
+        frame = self.bars(ticker)
+        return frame[(frame.index >= pd.Timestamp(start_date)) & (frame.index < pd.Timestamp(end_date))].copy()
+
+    def download(self, ticker, start_date, end_date):
+        """Same signature as database.market_data.download_ticker_data"""
+        return self.get_ticker_data(ticker, start_date, end_date)
+
+    @property
+    def end(self):
+        """Day after the last generated session of any ticker"""
+        return max(frame.index[-1] for frame in self.frames.values()) + pd.Timedelta(days=1)
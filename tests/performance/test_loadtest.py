@@ -0,0 +1,54 @@
+import pytest
+from tests.performance.loadtest import (
+    SCENARIOS, VirtualUser, parse_mix, percentile, summarize, drive, find_saturation
+)
+
+class TestLoadTestHarness:
+    def test_summary_percentiles_and_error_classes(self):
+        """Test that latency percentiles use nearest rank and statuses are classified"""
+        samples = [('predict', 200, float(ms)) for ms in range(1, 97)]
+        samples += [('predict', 500, 100.0), ('predict', None, 200.0), ('login', 503, 5.0), ('login', 400, 5.0)]
+        summary = summarize(samples, wall_seconds=10, offered_rate=10)
+
+        assert percentile([1, 2, 3, 4], 50) == 2
+        assert summary['requests'] == 100
+        assert summary['throughput'] == 10
+        assert summary['p50_ms'] == 48
+        assert summary['p99_ms'] == 100
+        assert summary['errors'] == 2
+        assert summary['rejected'] == 1
+        assert summary['client_errors'] == 1
+        assert summary['error_rate'] == 0.03
+        assert summary['scenarios']['login']['requests'] == 2
+
+    def test_drive_sends_mix_at_fixed_rate(self, stub_server, monkeypatch):
+        """Test that the open-loop driver keeps the arrival rate and tags samples by scenario"""
+        monkeypatch.setitem(SCENARIOS, 'ok', lambda user, ctx, rng: ('GET', '/ok', {'headers': {'X-API-Key': user.api_key}}))
+        monkeypatch.setitem(SCENARIOS, 'broken', lambda user, ctx, rng: ('POST', '/broken', {}))
+        stub_server.add('GET', '/ok', {'status': 'ok'})
+        stub_server.add('POST', '/broken', {'error': 'boom'}, status=500)
+
+        summary = drive(stub_server.url, rate=40, duration=1, mix=parse_mix('ok=3,broken=1'),
+                        users=[VirtualUser('a@example.com', 'pw', api_key='k1')])
+
+        assert summary['requests'] == 40
+        assert 0.8 < summary['wall_seconds'] < 3
+        ok, broken = summary['scenarios']['ok'], summary['scenarios']['broken']
+        assert ok['requests'] + broken['requests'] == 40
+        assert ok['errors'] == 0 and broken['errors'] == broken['requests'] > 0
+        assert stub_server.count('GET', '/ok') == ok['requests']
+
+    def test_saturation_stops_at_first_failing_rate(self):
+        """Test that capacity is the highest rate within limits and later rates are skipped"""
+        def run_rate(rate):
+            latency = 100.0 if rate < 8 else 5000.0
+            return summarize([('predict', 200, latency)] * int(rate * 10), wall_seconds=10, offered_rate=rate)
+
+        result = find_saturation(run_rate, [2, 16, 4, 8], p99_limit_ms=1000, error_budget=0.01)
+        assert result['capacity'] == 4
+        assert [stage['offered_rate'] for stage in result['stages']] == [2, 4, 8]
+        assert result['stages'][-1]['saturated_by'] == ['p99 5000 ms > 1000 ms']
+
+    def test_unknown_scenario_is_rejected(self):
+        with pytest.raises(ValueError):
+            parse_mix('predict=1,bogus=2')
@@ -0,0 +1,168 @@
+import pytest
+import json
+import itertools
+import numpy as np
+import pandas as pd
+import requests
+from datetime import datetime
+from models.lstm_model import StockPredictor
+from tests.performance.benchmark import BenchmarkConfig, BenchmarkRecorder
+from tests.performance.loadtest import LoadTestConfig, OfflineEnvironment, WorkerPool, _date_range
+from tests.performance.synthetic_market import SyntheticMarket, synthetic_ohlcv
+
+START = '2014-08-01'
+
+@pytest.fixture(scope='module')
+def market():
+    return SyntheticMarket(BenchmarkConfig.TICKERS, years=BenchmarkConfig.YEARS, start=START)
+
+@pytest.fixture(scope='module')
+def trained(market):
+    """Predictor with a briefly trained model, and the SPY frame after every stage of the pipeline"""
+    predictor = StockPredictor(data_cache=market)
+    predictor.epochs = BenchmarkConfig.TRAIN_EPOCHS
+    predictor.train('SPY', START, market.end.strftime('%Y-%m-%d'))
+
+    stages = {'raw': market.bars('SPY').copy()}
+    stages['indicators'] = predictor.add_indicators(stages['raw'].copy())
+    stages['cleaned'] = predictor.clean_data(predictor.prepare_target(stages['indicators'].copy()))
+    stages['scaled'], _ = predictor.scale_data(stages['cleaned'], save_scaler=False)
+    stages['X'], _ = predictor.prepare_lstm_data(
+        stages['scaled'], predictor.backcandles, predictor.target_column, predictor.feature_columns)
+    stages['predictions_scaled'] = predictor.model.predict(stages['X'], verbose=0)
+    return predictor, stages
+
+@pytest.fixture(scope='module')
+def served(tmp_path_factory):
+    """app.py in one loadtest worker on offline stand-ins, and a seeded user with an API key"""
+    environment = OfflineEnvironment(
+        workdir=str(tmp_path_factory.mktemp('endpoints')), tickers=','.join(BenchmarkConfig.TICKERS),
+        years=BenchmarkConfig.YEARS, train_epochs=BenchmarkConfig.TRAIN_EPOCHS
+    ).start()
+    pool = WorkerPool(environment, workers=1)
+    try:
+        pool.start()
+        [user] = environment.seed_users(pool.base_url, 1)
+        yield pool, user
+    finally:
+        pool.stop()
+        environment.stop()
+
+class TestSyntheticMarket:
+    def test_generator_is_deterministic(self):
+        """Test that bars depend only on ticker, start and length, and look like daily OHLCV"""
+        spy = synthetic_ohlcv('SPY', years=2)
+        pd.testing.assert_frame_equal(spy, synthetic_ohlcv('SPY', years=2))
+        assert not spy['Close'].equals(synthetic_ohlcv('QQQ', years=2)['Close'])
+
+        assert 490 < len(spy) < 520 #about 252 sessions a year
+        assert (spy['High'] >= spy[['Open', 'Close']].max(axis=1)).all()
+        assert (spy['Low'] <= spy[['Open', 'Close']].min(axis=1)).all()
+        assert spy.index.dayofweek.max() < 5
+
+class TestBenchmarkRecorder:
+    def test_regression_threshold_scales_with_machine(self, tmp_path):
+        """Test that limits follow baseline x machine scale x tolerance and new baselines are rescaled"""
+        baseline_path = tmp_path / 'baseline.json'
+        recorder = BenchmarkRecorder(baseline_path=str(baseline_path), tolerance=1.5, min_slack_ms=0)
+        recorder.calibration_ms = 20.0
+        recorder.baseline = {'calibration_ms': 10.0, 'benchmarks': {'stage.x': {'median_ms': 4.0}, 'stage.y': {'median_ms': 1.0}}}
+
+        assert recorder.limit_ms('stage.x') == 12.0 #4 ms on a machine twice as slow, 50% tolerance
+        assert recorder.record('stage.x', {'median_ms': 11.0}) is None
+        assert 'stage.x regressed' in recorder.record('stage.x', {'median_ms': 13.0})
+        assert recorder.record('stage.new', {'median_ms': 100.0}) is None
+
+        recorder.write_baseline()
+        written = json.loads(baseline_path.read_text())
+        assert written['calibration_ms'] == 20.0
+        assert written['benchmarks']['stage.x']['median_ms'] == 13.0
+        assert written['benchmarks']['stage.y']['median_ms'] == 2.0
+
+class TestStageBenchmarks:
+    """One benchmark per StockPredictor stage on BENCHMARK_YEARS of SPY bars"""
+
+    def test_add_indicators(self, trained, benchmark):
+        predictor, stages = trained
+        benchmark('stage.add_indicators', predictor.add_indicators,
+                  setup=lambda: stages['raw'].copy(), rows=len(stages['raw']))
+
+    def test_clean_data(self, trained, benchmark):
+        predictor, stages = trained
+        benchmark('stage.prepare_target_clean_data',
+                  lambda data: predictor.clean_data(predictor.prepare_target(data)),
+                  setup=lambda: stages['indicators'].copy(), rows=len(stages['indicators']))
+
+    def test_scale_data(self, trained, benchmark):
+        predictor, stages = trained
+        benchmark('stage.scale_data', lambda: predictor.scale_data(stages['cleaned'], save_scaler=False),
+                  rows=len(stages['cleaned']))
+
+    def test_prepare_lstm_data(self, trained, benchmark):
+        predictor, stages = trained
+        benchmark('stage.prepare_lstm_data', lambda: predictor.prepare_lstm_data(
+            stages['scaled'], predictor.backcandles, predictor.target_column, predictor.feature_columns),
+            rows=len(stages['scaled']))
+
+    def test_model_predict(self, trained, benchmark):
+        predictor, stages = trained
+        benchmark('stage.model_predict', lambda: predictor.model.predict(stages['X'], verbose=0),
+                  rows=len(stages['X']))
+
+    def test_inverse_transform(self, trained, benchmark):
+        predictor, stages = trained
+        result = benchmark('stage.inverse_transform', lambda: predictor.inverse_transform(stages['predictions_scaled']),
+                           rows=len(stages['predictions_scaled']))
+        assert result['median_ms'] > 0
+
+class TestEndToEndBenchmarks:
+    """
+    /predict and /train request handling on synthetic data.
+
+    Requests go over HTTP to app.py itself, served by one loadtest.py
+    worker with its offline stand-ins (synthetic market data, SQLite,
+    a fakeredis server), so the numbers cover API key checks, the
+    inference pool, version sessions and the prediction log as well as
+    the pipeline. Each result keeps the median time of every pipeline
+    stage taken from the request spans.
+    """
+
+    @pytest.fixture
+    def post(self, served):
+        """POST a payload to an app route as the seeded user, asking for the request's spans"""
+        pool, user = served
+        with requests.Session() as session:
+            session.headers['X-API-Key'] = user.api_key
+            yield lambda path, payload: session.post(f"{pool.base_url}{path}?timing=true", json=payload,
+                                                     timeout=LoadTestConfig.REQUEST_TIMEOUT)
+
+    def run_requests(self, post, path, payloads, benchmark, name, rounds, warmup):
+        stage_times = {}
+
+        def send():
+            response = post(path, next(payloads))
+            assert response.status_code == 200, response.text
+            for record in response.json()['timing']:
+                stage_times.setdefault(record['stage'], []).append(record['wall_ms'])
+
+        result = benchmark(name, send, rounds=rounds, warmup=warmup)
+        result['stages'] = {stage: float(np.median(times)) for stage, times in stage_times.items()}
+        return result
+
+    def test_predict(self, post, benchmark):
+        payloads = itertools.cycle([
+            {'ticker': ticker, **dict(zip(('start_date', 'end_date'), _date_range(datetime.now(), 1)))}
+            for ticker in BenchmarkConfig.TICKERS
+        ])
+        result = self.run_requests(post, '/predict', payloads, benchmark, 'endpoint.predict',
+                                   rounds=BenchmarkConfig.ROUNDS, warmup=BenchmarkConfig.WARMUP)
+        assert set(result['stages']) >= {'get_ticker_data', 'add_indicators', 'model.predict', 'inverse_transform'}
+
+    def test_train(self, post, benchmark):
+        payloads = itertools.cycle([
+            {'ticker': ticker, **dict(zip(('start_date', 'end_date'), _date_range(datetime.now(), BenchmarkConfig.YEARS)))}
+            for ticker in BenchmarkConfig.TICKERS
+        ])
+        #every request fits a new model, so keep the rounds low
+        result = self.run_requests(post, '/train', payloads, benchmark, 'endpoint.train', rounds=2, warmup=0)
+        assert 'model.fit' in result['stages']
@@ -0,0 +1,84 @@
+import pytest
+import time
+import fakeredis
+from flask import Flask
+from redis.client import Pipeline
+from auth.config import AuthConfig
+from auth.middleware import RateLimit
+
+#simulated network latency per redis round trip
+ROUND_TRIP_SECONDS = 0.001
+ITERATIONS = 100
+
+class RoundTripCounter:
+    """Counts (and delays) every round trip a redis client makes"""
+
+    def __init__(self, monkeypatch, client):
+        self.count = 0
+        counter = self
+        original_execute_command = client.execute_command
+        original_pipeline_execute = Pipeline.execute
+
+        def execute_command(*args, **kwargs):
+            counter.count += 1
+            time.sleep(ROUND_TRIP_SECONDS)
+            return original_execute_command(*args, **kwargs)
+
+        def pipeline_execute(pipe, *args, **kwargs):
+            counter.count += 1
+            time.sleep(ROUND_TRIP_SECONDS)
+            return original_pipeline_execute(pipe, *args, **kwargs)
+
+        monkeypatch.setattr(client, 'execute_command', execute_command)
+        monkeypatch.setattr(Pipeline, 'execute', pipeline_execute)
+
+def legacy_fixed_window(redis_client, user_id, max_requests, window_size):
+    """The INCR/EXPIRE limiter and header GET that require_api_key used before the GCRA script"""
+    key = f"rate_lmit:{user_id}"
+    pipe = redis_client.pipeline()
+    pipe.incr(key)
+    pipe.expire(key, window_size)
+    current_count = pipe.execute()[0]
+    if current_count == 1:
+        redis_client.expire(key, window_size)
+    is_limited = current_count > max_requests
+    remaining = max(0, max_requests - int(redis_client.get(key)))
+    return is_limited, remaining
+
+def measure(run):
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        run(i)
+    return (time.perf_counter() - start) / ITERATIONS
+
+class TestRateLimitOverhead:
+    @pytest.fixture
+    def app(self, monkeypatch):
+        app = Flask(__name__)
+        app.redis_client = fakeredis.FakeRedis()
+        monkeypatch.setattr(RateLimit, '_scripts', {})
+        with app.app_context():
+            yield app
+
+    def test_gcra_is_one_round_trip(self, app, monkeypatch):
+        """Benchmark per-request limiter overhead before and after the GCRA script"""
+        limiter = RateLimit()
+        limiter.check('warmup') #registers the script
+
+        counter = RoundTripCounter(monkeypatch, app.redis_client)
+
+        legacy_seconds = measure(lambda i: legacy_fixed_window(
+            app.redis_client, f"user-{i % 10}", AuthConfig.RATE_LIMIT_REQUESTS, AuthConfig.RATE_LIMIT_WINDOW))
+        legacy_trips = counter.count / ITERATIONS
+
+        counter.count = 0
+        gcra_seconds = measure(lambda i: limiter.check(f"user-{i % 10}"))
+        gcra_trips = counter.count / ITERATIONS
+
+        print(f"\nrate limiter overhead per request (simulated RTT {ROUND_TRIP_SECONDS * 1000:.1f} ms):")
+        print(f"  legacy fixed window: {legacy_trips:.1f} round trips, {legacy_seconds * 1000:.3f} ms")
+        print(f"  gcra script:         {gcra_trips:.1f} round trips, {gcra_seconds * 1000:.3f} ms")
+
+        assert gcra_trips == 1
+        assert legacy_trips >= 2
+        assert gcra_seconds < legacy_seconds
@@ -0,0 +1,114 @@
+import asyncio
+import socket
+import threading
+import time
+from monitoring.health_monitor import HealthMonitor, AlertDigest
+
+class TestHealthMonitor:
+    def test_targets_probed_concurrently_with_timeout(self, stub_server):
+        """Test that a hung target times out without delaying the others and latency is recorded"""
+        stub_server.add('GET', '/health/check', {
+            'status': 'healthy',
+            'components': {'database': {'status': 'healthy'}, 'redis': {'status': 'healthy'}}
+        })
+        #accepts connections but never answers
+        hung = socket.socket()
+        hung.bind(('127.0.0.1', 0))
+        hung.listen(8)
+        hung_url = f"http://127.0.0.1:{hung.getsockname()[1]}"
+        monitor = HealthMonitor([stub_server.url + '/', hung_url], timeout=0.5)
+
+        try:
+            started = time.monotonic()
+            report = asyncio.run(monitor.check_all())
+            elapsed = time.monotonic() - started
+        finally:
+            hung.close()
+
+        assert elapsed < 1.5
+        assert set(report[stub_server.url]['components']) == {'database', 'redis', 'endpoint'}
+        assert report[hung_url]['status'] == 'unreachable'
+        assert report[hung_url]['components']['endpoint']['status'] == 'error'
+        assert monitor.latency_summary(hung_url)['errors'] == 1
+        assert monitor.latency_summary(hung_url)['last_ms'] >= 500
+        assert monitor.latency_summary(stub_server.url)['probes'] == 1
+        assert monitor.digest.queue.qsize() == 1
+        alert = monitor.digest.queue.get_nowait()
+        assert (alert['target'], alert['component'], alert['status']) == (hung_url, 'endpoint', 'error')
+
+    def test_check_health_does_not_wait_for_hung_probes(self):
+        """Test that check_health returns at the probe timeout while a slow response is still being read"""
+        stop = threading.Event()
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(8)
+        slow_url = f"http://127.0.0.1:{server.getsockname()[1]}"
+
+        def trickle():
+            #answers every request one byte at a time, each within requests' per-read timeout
+            while not stop.is_set():
+                try:
+                    conn, _ = server.accept()
+                except OSError:
+                    return
+                with conn:
+                    conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 100\r\n\r\n")
+                    while not stop.wait(0.2):
+                        try:
+                            conn.sendall(b" ")
+                        except OSError:
+                            break
+
+        threading.Thread(target=trickle, daemon=True).start()
+        monitor = HealthMonitor(slow_url, timeout=0.5)
+        try:
+            for _ in range(2):
+                started = time.monotonic()
+                report = monitor.check_health()
+                assert time.monotonic() - started < 1.5
+                assert report[slow_url]['status'] == 'unreachable'
+        finally:
+            monitor.close()
+            stop.set()
+            server.close()
+
+    def test_alerts_only_on_transitions_with_dedup(self):
+        """Test that a flapping component alerts once per dedup window and recoveries follow alerts"""
+        monitor = HealthMonitor('http://app', dedup_seconds=600)
+
+        def check(status, now):
+            alert = monitor.evaluate('http://app', 'redis', status, now=now)
+            return alert and (alert['previous'], alert['status'], alert['suppressed'])
+
+        assert check('error', 0) == ('healthy', 'error', 0)
+        assert check('error', 10) is None
+        assert check('healthy', 20) == ('error', 'healthy', 0)
+        assert check('error', 30) is None #flapping within the window
+        assert check('healthy', 40) is None #that outage was never alerted
+        assert check('error', 700) == ('healthy', 'error', 1)
+        assert check('warning', 710) == ('error', 'warning', 0)
+
+    def test_confirm_checks_ignores_single_blips(self):
+        monitor = HealthMonitor('http://app', confirm_checks=2)
+        assert monitor.evaluate('http://app', 'database', 'error', now=0) is None
+        assert monitor.evaluate('http://app', 'database', 'healthy', now=1) is None
+        assert monitor.evaluate('http://app', 'database', 'error', now=2) is None
+        assert monitor.evaluate('http://app', 'database', 'error', now=3)['status'] == 'error'
+
+    def test_digest_batches_alerts_off_the_probing_path(self):
+        """Test that alerts within the window go out as one email and stop flushes the rest"""
+        sent = []
+        digest = AlertDigest(lambda subject, body: sent.append((subject, body)), window=0.3).start()
+
+        def alert(component, status):
+            return {'target': 'http://app', 'component': component, 'status': status, 'previous': 'healthy',
+                    'message': '', 'suppressed': 0, 'timestamp': 'now'}
+
+        for component in ('database', 'redis', 'models'):
+            digest.submit(alert(component, 'error'))
+        time.sleep(0.5)
+        digest.submit(alert('database', 'healthy'))
+        digest.stop()
+
+        assert [subject for subject, body in sent] == ['3 problems, 0 recoveries', 'database is healthy on http://app']
+        assert len(sent[0][1].splitlines()) == 3
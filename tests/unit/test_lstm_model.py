@@ -0,0 +1,255 @@
+import pytest
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify
+from models.lstm_model import StockPredictor
+from models.serving import InferencePool, InferenceQueueFull, InferenceTimeout
+import threading
+import tempfile
+import time
+import os
+from utils.tracing import init_tracing, start_trace, end_trace, get_spans, span
+
+def synthetic_bars(days=300, seed=0):
+    """Daily OHLCV frame shaped like the yfinance download"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+    index = pd.bdate_range('2023-01-02', periods=days, name='Date')
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.002, days)),
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Adj Close': close,
+        'Volume': rng.integers(1_000_000, 5_000_000, days).astype(float)
+    }, index=index)
+
+class StaticData:
+    """data_cache stand-in serving one frame"""
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def get_ticker_data(self, ticker, start_date, end_date):
+        return self.frame.copy()
+
+class ConstantModel:
+    """Keras model stand-in predicting the middle of the scaled range"""
+
+    def __call__(self, X, training=False):
+        return np.full((len(X), 1), 0.5)
+
+class TestPipelineSpans:
+    @pytest.fixture
+    def predictor(self):
+        predictor = StockPredictor(data_cache=StaticData(synthetic_bars()))
+        predictor.model = ConstantModel()
+        return predictor
+
+    def test_predict_records_every_stage(self, predictor):
+        """Test that each predict stage gets a span with time and output size"""
+        token = start_trace()
+        try:
+            predictions = predictor.predict('SPY', '2023-01-02', '2024-02-01')
+        finally:
+            spans = end_trace(token)
+
+        assert [s['stage'] for s in spans] == [
+            'get_ticker_data', 'add_indicators', 'prepare_target', 'clean_data',
+            'scale_data', 'prepare_lstm_data', 'model.predict', 'inverse_transform'
+        ]
+        assert all(s['pipeline'] == 'predict' and s['wall_ms'] >= 0 and s['cpu_ms'] >= 0 for s in spans)
+        by_stage = {s['stage']: s for s in spans}
+        assert by_stage['get_ticker_data']['rows'] == 300
+        assert by_stage['model.predict']['rows'] == len(predictions)
+        assert by_stage['scale_data']['bytes'] > 0
+
+    def test_spans_outside_request_only_feed_metrics(self):
+        """Test that spans without a trace are not collected anywhere"""
+        with span('predict', 'noop'):
+            pass
+        assert get_spans() == []
+
+    def test_server_timing_header(self, predictor):
+        """Test that a request asking for timing gets the header and stays isolated"""
+        app = Flask(__name__)
+        init_tracing(app)
+
+        @app.route('/predict')
+        def predict():
+            predictor.predict('SPY', '2023-01-02', '2024-02-01')
+            return jsonify({'stages': len(get_spans())})
+
+        client = app.test_client()
+        response = client.get('/predict?timing=true')
+        assert response.get_json()['stages'] == 8
+        header = response.headers['Server-Timing']
+        assert header.startswith('predict-get_ticker_data;dur=')
+        assert 'predict-model.predict;dur=' in header
+
+        #off unless asked for, and a new request starts with no spans
+        response = client.get('/predict')
+        assert 'Server-Timing' not in response.headers
+        assert response.get_json()['stages'] == 8
+
+class TickerData:
+    """data_cache stand-in serving a different frame per ticker"""
+
+    def __init__(self, tickers):
+        self.frames = {ticker: synthetic_bars(seed=seed) for seed, ticker in enumerate(tickers)}
+
+    def get_ticker_data(self, ticker, start_date, end_date):
+        return self.frames[ticker].copy()
+
+class TestInferenceSession:
+    TICKERS = ['SPY', 'QQQ', 'IWM', 'DIA']
+
+    @pytest.fixture
+    def predictor(self):
+        predictor = StockPredictor(data_cache=TickerData(self.TICKERS))
+        predictor.model = ConstantModel()
+        predictor.training_metadata = {'model_id': 'm1', 'version': '1.0.0'}
+        return predictor
+
+    def test_concurrent_predictions_are_request_scoped(self, predictor):
+        """Test that threads sharing one session each get the result of their own ticker"""
+        session = predictor.session()
+        expected = {ticker: session.predict(ticker, '2023-01-02', '2024-02-01') for ticker in self.TICKERS}
+        results = []
+
+        def work(ticker):
+            for _ in range(5):
+                results.append(session.predict(ticker, '2023-01-02', '2024-02-01'))
+
+        threads = [threading.Thread(target=work, args=(ticker,)) for ticker in self.TICKERS * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 40
+        for result in results:
+            assert np.array_equal(result.predictions, expected[result.ticker].predictions)
+            assert result.target_dates == expected[result.ticker].target_dates
+            assert result.model_id == 'm1'
+        assert len({float(expected[ticker].predictions[-1]) for ticker in self.TICKERS}) == 4
+
+    def test_session_is_frozen(self, predictor):
+        """Test that predicting and loading another model leave an existing session unchanged"""
+        session = predictor.session()
+        with pytest.raises(AttributeError):
+            session.model = None
+
+        predictor.predict('SPY', '2023-01-02', '2024-02-01')
+        assert predictor.scaler is None
+        assert predictor.last_result.ticker == 'SPY'
+        assert predictor.session() is session
+
+        trained = StockPredictor()
+        trained.model, trained.training_metadata = ConstantModel(), {'model_id': 'm2', 'version': '1.0.1'}
+        predictor.use(trained)
+        assert predictor.session().model_id == 'm2'
+        assert session.model_id == 'm1' and session.model is not predictor.model
+
+    def test_pool_rejects_when_full_and_keeps_spans(self, predictor):
+        """Test that the pool predicts off the request thread, records spans and sheds load"""
+        pool = InferencePool(max_workers=2, max_pending=1)
+        token = start_trace()
+        try:
+            result = pool.predict(predictor.session(), 'SPY', '2023-01-02', '2024-02-01')
+            assert 'model.predict' in [s['stage'] for s in get_spans()]
+        finally:
+            end_trace(token)
+        assert len(result.predictions) == len(result.target_dates)
+
+        release = threading.Event()
+        class Blocking:
+            def predict(self, *args):
+                release.wait(5)
+
+        waiting = threading.Thread(target=pool.predict, args=(Blocking(), 'SPY', None, None))
+        waiting.start()
+        try:
+            while pool.get_stats()['pending'] == 0:
+                time.sleep(0.01)
+            with pytest.raises(InferenceQueueFull):
+                pool.predict(predictor.session(), 'SPY', '2023-01-02', '2024-02-01')
+        finally:
+            release.set()
+            waiting.join()
+            pool.shutdown()
+        assert pool.get_stats()['rejected'] == 1
+
+    def test_pool_times_out(self, predictor):
+        """Test that a prediction outliving the timeout raises InferenceTimeout and frees its slot when done"""
+        pool = InferencePool(max_workers=1, max_pending=2, timeout=0.05)
+        release = threading.Event()
+        class Blocking:
+            def predict(self, *args):
+                release.wait(5)
+
+        try:
+            with pytest.raises(InferenceTimeout):
+                pool.predict(Blocking(), 'SPY', None, None)
+            assert pool.get_stats()['failed'] == 1 and pool.get_stats()['pending'] == 1
+        finally:
+            release.set()
+        while pool.get_stats()['pending']:
+            time.sleep(0.01)
+        pool.predict(predictor.session(), 'SPY', '2023-01-02', '2024-02-01')
+        pool.shutdown()
+        assert pool.get_stats()['completed'] == 1
+
+    def test_version_loads_outside_session_lock(self, predictor, monkeypatch):
+        """Test that a cached version is served while another version is still loading"""
+        entries = {version: {'model_id': f"id-{version}", 'version': version, 'metadata': {'model_id': f"id-{version}"}}
+                   for version in ('fast', 'slow')}
+        monkeypatch.setattr(predictor, 'registry', type('Registry', (), {'get': lambda self, version: entries[version]})())
+        loading, release = threading.Event(), threading.Event()
+
+        def load_artifacts(entry):
+            if entry['version'] == 'slow':
+                loading.set()
+                release.wait(5)
+            return ConstantModel(), None
+        monkeypatch.setattr(predictor, '_load_artifacts', load_artifacts)
+
+        fast = predictor.session('fast')
+        sessions = []
+        slow = threading.Thread(target=lambda: sessions.append(predictor.session('slow')))
+        slow.start()
+        try:
+            assert loading.wait(5)
+            started = time.monotonic()
+            assert predictor.session('fast') is fast
+            assert time.monotonic() - started < 1
+        finally:
+            release.set()
+            slow.join()
+        assert sessions[0].model_id == 'id-slow' and predictor.session('slow') is sessions[0]
+
+class TestTraining:
+    def test_checkpoint_and_scaler_stay_in_the_run_directory(self, tmp_path, monkeypatch):
+        """Test that each training writes its checkpoint and scaler into its own directory and removes it"""
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / 'tmp').mkdir()
+        monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path / 'tmp'))
+        runs = []
+        fit = StockPredictor.create_and_train_lstm
+
+        def create_and_train_lstm(self, X_train, y_train, checkpoint_path=None):
+            result = fit(self, X_train, y_train, checkpoint_path=checkpoint_path)
+            run_path = os.path.dirname(checkpoint_path)
+            runs.append((run_path, sorted(os.listdir(run_path))))
+            return result
+        monkeypatch.setattr(StockPredictor, 'create_and_train_lstm', create_and_train_lstm)
+
+        for _ in range(2):
+            predictor = StockPredictor(data_cache=StaticData(synthetic_bars()))
+            predictor.epochs = 1
+            predictor.train('SPY', '2023-01-02', '2024-02-01')
+
+        assert [files for _, files in runs] == [['best_model.keras', 'scaler.pkl']] * 2
+        assert runs[0][0] != runs[1][0]
+        assert os.listdir(tmp_path / 'tmp') == []
+        assert not (tmp_path / 'best_model.keras').exists() and not (tmp_path / 'scaler.pkl').exists()
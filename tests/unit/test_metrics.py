@@ -0,0 +1,172 @@
+import pytest
+import fakeredis
+import threading
+from flask import Flask
+from utils.instrumentation import MetricsRegistry, init_instrumentation
+from utils.metrics import ModelQualityTracker
+import numpy as np
+from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
+
+class TestMetricsRegistry:
+    @pytest.fixture
+    def registry(self):
+        return MetricsRegistry(prefix='test_metrics', process_id='worker-1', flush_interval=10)
+
+    def test_counters_summed_across_threads(self, registry):
+        """Test that per-thread shards add up"""
+        counter = registry.counter('jobs_total', 'Jobs', ('kind',))
+
+        def work():
+            for _ in range(1000):
+                counter.inc(kind='a')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc(5, kind='b')
+
+        assert registry.collect() == {
+            ('jobs_total', '', (('kind', 'a'),)): 4000,
+            ('jobs_total', '', (('kind', 'b'),)): 5
+        }
+
+    def test_finished_thread_shards_folded(self, registry):
+        """Test that a thread per request does not grow the shard list, and no counts are lost"""
+        counter = registry.counter('requests_total', 'Requests')
+        histogram = registry.histogram('latency_seconds', 'Latency', buckets=(1,))
+
+        for _ in range(200):
+            thread = threading.Thread(target=lambda: (counter.inc(), histogram.observe(0.5)))
+            thread.start()
+            thread.join()
+
+        assert len(registry._shards) < 64
+        samples = registry.collect()
+        assert len(registry._shards) == 0
+        assert samples[('requests_total', '', ())] == 200
+        assert samples[('latency_seconds', '_count', ())] == 200
+        assert samples[('latency_seconds', '_bucket', (('le', '1'),))] == 200
+
+    def test_histogram_exposition(self, registry):
+        """Test the Prometheus text format of a histogram"""
+        histogram = registry.histogram('latency_seconds', 'Latency', ('endpoint',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 3):
+            histogram.observe(value, endpoint='predict')
+
+        assert registry.render() == (
+            '# HELP latency_seconds Latency\n'
+            '# TYPE latency_seconds histogram\n'
+            'latency_seconds_bucket{endpoint="predict",le="0.1"} 1\n'
+            'latency_seconds_bucket{endpoint="predict",le="1"} 3\n'
+            'latency_seconds_bucket{endpoint="predict",le="+Inf"} 4\n'
+            'latency_seconds_sum{endpoint="predict"} 4.05\n'
+            'latency_seconds_count{endpoint="predict"} 4\n'
+        )
+
+    def test_totals_across_processes(self, registry):
+        """Test that counters add up over workers and gauges of stopped workers disappear"""
+        redis_client = fakeredis.FakeRedis()
+        other = MetricsRegistry(prefix='test_metrics', process_id='worker-2', flush_interval=10)
+        for r in (registry, other):
+            r.counter('jobs_total', 'Jobs').inc(2)
+            r.gauge('in_flight', 'In flight').set(1)
+
+        other.flush(redis_client)
+        other.flush(redis_client) #nothing new, must not double count
+        registry.counter('jobs_total', 'Jobs').inc()
+
+        samples = registry.collect_all(redis_client)
+        assert samples[('jobs_total', '', ())] == 5
+        assert samples[('in_flight', '', ())] == 2
+
+        redis_client.delete(other.gauges_key('worker-2')) #expired
+        samples = registry.collect_all(redis_client)
+        assert samples[('jobs_total', '', ())] == 5
+        assert samples[('in_flight', '', ())] == 1
+        assert redis_client.smembers(registry.processes_key) == {b'worker-1'}
+
+    def test_request_instrumentation(self):
+        """Test that requests are timed per endpoint and server errors counted"""
+        app = Flask(__name__)
+        app.redis_client = None
+
+        @app.route('/ok')
+        def ok():
+            return 'ok'
+
+        @app.route('/fail')
+        def fail():
+            raise RuntimeError('boom')
+
+        registry = init_instrumentation(app)
+        client = app.test_client()
+        before = registry.collect()
+
+        client.get('/ok')
+        client.get('/ok')
+        client.get('/fail')
+
+        samples = registry.collect()
+        def delta(sample):
+            return samples.get(sample, 0) - before.get(sample, 0)
+
+        assert delta(('http_request_duration_seconds', '_count', (('endpoint', 'ok'), ('method', 'GET'), ('status', '200')))) == 2
+        assert delta(('http_request_errors_total', '', (('endpoint', 'fail'), ('status', '500')))) == 1
+        assert samples[('http_requests_in_flight', '', (('endpoint', 'ok'),))] == 0
+
+        response = client.get('/metrics/prometheus')
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        assert 'http_request_duration_seconds_bucket{endpoint="ok",method="GET",status="200",le="+Inf"}' in response.get_data(as_text=True)
+
+class TestModelQualityTracker:
+    DAY = 86400
+
+    def test_matches_batch_metrics_over_windows(self):
+        """Test that streaming window metrics equal sklearn's over the same outcomes"""
+        tracker = ModelQualityTracker(window_days=[7, 30])
+        rng = np.random.default_rng(0)
+        now = 100 * self.DAY
+        actual = 100 + rng.normal(0, 5, 60)
+        predicted = actual + rng.normal(0, 1, 60)
+        target_times = now - 60 * self.DAY + np.arange(60) * self.DAY
+
+        #outcomes arrive in shuffled order, each a day after its target
+        for i in rng.permutation(60):
+            tracker.record('SPY', 'v1', actual[i], predicted[i], at=target_times[i], now=target_times[i] + self.DAY)
+
+        for window, days in (('7d', 7), ('30d', 30)):
+            in_window = target_times > now - days * self.DAY
+            metrics = tracker.metrics('SPY', 'v1', window, now=now)
+            assert metrics['count'] == in_window.sum()
+            assert metrics['mse'] == pytest.approx(mean_squared_error(actual[in_window], predicted[in_window]))
+            assert metrics['mae'] == pytest.approx(mean_absolute_error(actual[in_window], predicted[in_window]))
+            assert metrics['r2'] == pytest.approx(r2_score(actual[in_window], predicted[in_window]))
+
+        assert tracker.metrics('SPY', 'v1', now=now)['r2'] == pytest.approx(r2_score(actual, predicted))
+        assert tracker.metrics('SPY', 'v1', '30d', now=now + 365 * self.DAY) == {'count': 0}
+        assert tracker.metrics('SPY', 'v2', '7d') is None
+
+    def test_directional_accuracy_and_report(self):
+        tracker = ModelQualityTracker(window_days=[7])
+        tracker.record('SPY', 'm1', 101, 102, reference=100, now=0, version='1.0.0', created_at='2026-01-01')
+        tracker.record('SPY', 'm1', 99, 102, reference=100, now=0)
+        tracker.record('SPY', 'm1', 98, 99, now=0)
+        tracker.record('QQQ', 'm2', 300, 301, reference=299, now=0, version='1.0.0')
+
+        [entry] = tracker.report(ticker='SPY', now=0)
+        assert (entry['model_id'], entry['model_version'], entry['model_created_at']) == ('m1', '1.0.0', '2026-01-01')
+        assert entry['7d']['directional_accuracy'] == 0.5
+        assert entry['7d']['count'] == entry['since_start']['count'] == 3
+        assert [e['ticker'] for e in tracker.report(version='1.0.0', now=0)] == ['QQQ', 'SPY']
+
+    def test_retrained_models_kept_apart(self):
+        """Test that a retrain with the same version string gets its own series"""
+        tracker = ModelQualityTracker(window_days=[7])
+        tracker.record('SPY', 'old', 100, 101, now=0, version='1.0.0', created_at='2026-01-01T00:00:00')
+        tracker.record('SPY', 'new', 100, 110, now=0, version='1.0.0', created_at='2026-02-01T00:00:00')
+
+        report = tracker.report(ticker='SPY', now=0)
+        assert [(e['model_id'], e['7d']['mae']) for e in report] == [('old', 1.0), ('new', 10.0)]
+        assert [e['model_id'] for e in tracker.report(model_id='new', now=0)] == ['new']
@@ -0,0 +1,425 @@
+import pytest
+import sys
+import os
+import logging
+from datetime import datetime
+from utils.log_reader import LogReader, parse_line
+from utils.logger_config import JSONFormatter, LogThrottle, BoundedQueueHandler
+from utils.profiler import Profiler, StackSampler
+from utils.memory import MemoryMonitor, current_rss
+from utils.health import HealthChecks
+from models.serving import InferencePool
+from auth.config import AuthConfig
+from flask import Flask
+import pstats
+from collections import deque
+import threading
+import time
+
+def log_line(second, message, level='INFO', name='api'):
+    return f"2024-12-04 14:00:{second:02d},000 - {name} - {level} - {message}\n"
+
+class TestLogReader:
+    @pytest.fixture
+    def log_dir(self, tmp_path):
+        """app.log with two rotated backups, 30 records in time order"""
+        for suffix, seconds in (('.2', range(0, 10)), ('.1', range(10, 20)), ('', range(20, 30))):
+            with open(tmp_path / f"app.log{suffix}", 'w') as f:
+                for second in seconds:
+                    level = 'ERROR' if second % 5 == 0 else 'INFO'
+                    f.write(log_line(second, f"record {second}", level=level, name='model' if second % 2 else 'api'))
+        return tmp_path
+
+    @pytest.fixture
+    def reader(self, log_dir):
+        #small blocks and index so the tests cross both boundaries
+        return LogReader(log_dir=str(log_dir), block_size=64, max_indexed_lines=4)
+
+    def test_tail_spans_rotated_files(self, reader):
+        """Test that the newest lines come first and reading continues into backups"""
+        records = list(reader.tail('app.log', lines=15))
+        assert [r['message'] for r in records] == [f"record {s}" for s in range(29, 14, -1)]
+
+    def test_filters(self, reader):
+        """Test level, logger and time range filters"""
+        errors = list(reader.tail('app.log', lines=100, level='warning'))
+        assert [r['message'] for r in errors] == ['record 25', 'record 20', 'record 15', 'record 10', 'record 5', 'record 0']
+
+        model = list(reader.tail('app.log', lines=3, logger='model'))
+        assert [r['message'] for r in model] == ['record 29', 'record 27', 'record 25']
+
+        window = list(reader.tail('app.log', lines=100,
+                                  since=datetime(2024, 12, 4, 14, 0, 8), until=datetime(2024, 12, 4, 14, 0, 12)))
+        assert [r['message'] for r in window] == ['record 12', 'record 11', 'record 10', 'record 9', 'record 8']
+
+        with pytest.raises(ValueError):
+            list(reader.tail('app.log', level='LOUD'))
+
+    def test_continuation_lines_joined(self, reader, log_dir):
+        """Test that a traceback stays attached to its record"""
+        with open(log_dir / 'app.log', 'a') as f:
+            f.write(log_line(30, 'failed', level='ERROR'))
+            f.write('Traceback (most recent call last):\n  ValueError: bad\n')
+
+        record = next(reader.tail('app.log', lines=1))
+        assert record['line'].splitlines() == [log_line(30, 'failed', level='ERROR').strip(),
+                                               'Traceback (most recent call last):', '  ValueError: bad']
+
+    def test_appended_lines_extend_index(self, reader, log_dir):
+        """Test that a repeat tail only scans what was appended"""
+        list(reader.tail('app.log', lines=1))
+        with open(log_dir / 'app.log', 'a') as f:
+            f.write(log_line(30, 'record 30'))
+            f.write(log_line(31, 'record 31'))
+
+        scans = []
+        original = reader._line_starts_before
+        reader._line_starts_before = lambda *args: scans.append(args) or original(*args)
+
+        records = list(reader.tail('app.log', lines=6))
+        assert [r['message'] for r in records] == [f"record {s}" for s in range(31, 25, -1)]
+        assert scans == [] #index extended in place, not rebuilt
+
+    def test_index_follows_rotation(self, reader, log_dir):
+        """Test that a rotated file keeps its index and new lines are found"""
+        list(reader.tail('app.log', lines=1))
+        for i in (2, 1):
+            (log_dir / f"app.log.{i}").rename(log_dir / f"app.log.{i + 1}")
+        (log_dir / 'app.log').rename(log_dir / 'app.log.1')
+        with open(log_dir / 'app.log', 'w') as f:
+            f.write(log_line(30, 'record 30'))
+
+        records = list(reader.tail('app.log', lines=3))
+        assert [r['message'] for r in records] == ['record 30', 'record 29', 'record 28']
+        assert len(reader.log_files('app.log')) == 4
+
+class TestLoggingPipeline:
+    @pytest.fixture
+    def logger(self):
+        """Isolated logger writing to a small bounded queue"""
+        logger = logging.getLogger('test_pipeline.auth')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        handler = BoundedQueueHandler(maxsize=50)
+        logger.addHandler(handler)
+        yield logger, handler
+        logger.removeHandler(handler)
+        logger.propagate = True
+        logger.setLevel(logging.NOTSET)
+
+    def test_rate_limit_per_call_site(self, logger):
+        """Test that a noisy call site is throttled, errors pass and the next record reports suppressions"""
+        logger, handler = logger
+        throttle = LogThrottle(rate_limits={'test_pipeline': 2})
+        handler.addFilter(throttle)
+
+        def rate_limited(user_id):
+            logger.warning(f"Rate limit exceeded for user {user_id}")
+
+        for user_id in range(10):
+            rate_limited(user_id)
+        logger.error('still logged')
+
+        records = [handler.queue.get_nowait() for _ in range(handler.queue.qsize())]
+        assert [r.getMessage() for r in records] == ['Rate limit exceeded for user 0', 'Rate limit exceeded for user 1', 'still logged']
+        assert throttle.rate_limited == 8
+
+        throttle._buckets = {key: (1, updated, suppressed) for key, (_, updated, suppressed) in throttle._buckets.items()}
+        rate_limited(11)
+        assert handler.queue.get_nowait().suppressed == 8
+
+    def test_sampling_keeps_warnings(self, logger):
+        """Test that sampling drops INFO records only"""
+        logger, handler = logger
+        throttle = LogThrottle(sample_rates={'test_pipeline.auth': 0})
+        handler.addFilter(throttle)
+
+        logger.info('sampled out')
+        logger.warning('kept')
+        assert [handler.queue.get_nowait().getMessage()] == ['kept']
+        assert throttle.sampled_out == 1
+
+    def test_full_queue_drops_without_blocking(self, logger):
+        """Test that records beyond the queue capacity are counted, not waited for"""
+        logger, handler = logger
+        for i in range(60):
+            logger.info('record %s', i)
+        assert handler.enqueued == 50
+        assert handler.dropped == 10
+        #arguments are merged before the record is queued
+        assert handler.queue.get_nowait().msg == 'record 0'
+
+    def test_json_records_readable_by_log_reader(self):
+        """Test that JSON lines carry extras and exceptions and parse back"""
+        try:
+            raise ValueError('bad')
+        except ValueError:
+            record = logging.getLogger('api').makeRecord('api', logging.ERROR, __file__, 1, 'failed for %s', ('SPY',),
+                                                         exc_info=sys.exc_info(), extra={'ticker': 'SPY'})
+        line = JSONFormatter().format(record)
+        assert '\n' not in line
+
+        parsed = parse_line(line)
+        assert parsed['level'] == 'ERROR'
+        assert parsed['message'] == 'failed for SPY'
+        assert parsed['ticker'] == 'SPY'
+        assert 'ValueError: bad' in parsed['exception']
+        assert abs((parsed['timestamp'] - datetime.fromtimestamp(record.created)).total_seconds()) < 0.001
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+class TestProfiler:
+    @pytest.fixture
+    def app(self, tmp_path, monkeypatch):
+        """App with one slow route and a profiler writing to tmp_path"""
+        monkeypatch.setattr(AuthConfig, 'ADMIN_TOKEN', 'secret')
+        app = Flask(__name__)
+        app.redis_client = None
+
+        @app.route('/predict')
+        def predict():
+            busy_loop(0.05)
+            return 'ok'
+
+        profiler = Profiler(output_dir=str(tmp_path), poll_seconds=60)
+        profiler.init_app(app)
+        yield app
+        if profiler.background:
+            profiler.background.stop()
+
+    def test_sampler_finds_hot_function(self):
+        """Test that folded stacks attribute samples to the busy function"""
+        sampler = StackSampler(0.001, {threading.get_ident()}).start()
+        busy_loop(0.1)
+        sampler.stop()
+
+        assert sampler.samples > 10
+        assert any('busy_loop' in line for line in sampler.folded().splitlines())
+        top = {entry['function'].split(' ')[0]: entry for entry in sampler.top_functions(50)}
+        assert top['busy_loop']['total'] > 0.5
+
+    def test_session_profiles_next_requests(self, app):
+        """Test that an armed session profiles exactly the requested number of requests"""
+        client = app.test_client()
+        headers = {'X-Admin-Token': 'secret'}
+        assert client.post('/admin/profile', json={'mode': 'sample'}).status_code == 403
+
+        response = client.post('/admin/profile', json={'mode': 'sample', 'requests': 2}, headers=headers)
+        assert response.status_code == 201
+        for _ in range(3):
+            client.get('/predict')
+
+        profiles = client.get('/admin/profile', headers=headers).get_json()['profiles']
+        assert len(profiles) == 2
+        with open(profiles[0]) as f:
+            assert 'busy_loop' in f.read()
+
+    def test_header_profiles_single_request_with_cprofile(self, app):
+        """Test that X-Profile needs the admin token and writes a cProfile dump"""
+        client = app.test_client()
+        client.get('/predict', headers={'X-Profile': 'cprofile'})
+        assert app.profiler.list_profiles() == []
+
+        client.get('/predict', headers={'X-Profile': 'cprofile', 'X-Admin-Token': 'secret'})
+        [path] = app.profiler.list_profiles()
+        assert path.endswith('.prof')
+        stats = pstats.Stats(path)
+        assert any(function[2] == 'busy_loop' for function in stats.stats)
+
+    def test_background_sampler_reports_request_threads(self, app):
+        """Test that the always-on sampler only sees threads serving requests"""
+        app.profiler.background.interval = 0.005
+        client = app.test_client()
+        for _ in range(4):
+            client.get('/predict')
+
+        hot = client.get('/admin/profile/hot', headers={'X-Admin-Token': 'secret'}).get_json()
+        functions = [entry['function'].split(' ')[0] for entry in hot['functions']]
+        assert hot['samples'] > 0
+        assert 'busy_loop' in functions
+
+    def test_pool_thread_profiled_with_its_request(self, app):
+        """Test that a prediction run on an inference pool thread shows up in the request's profiles"""
+        class SlowSession:
+            def predict(self, ticker, start_date, end_date):
+                busy_loop(0.05)
+
+        pool = InferencePool(max_workers=1)
+
+        @app.route('/pooled')
+        def pooled():
+            pool.predict(SlowSession(), 'SPY', None, None)
+            return 'ok'
+
+        client = app.test_client()
+        headers = {'X-Admin-Token': 'secret'}
+        try:
+            client.get('/pooled', headers={**headers, 'X-Profile': 'sample'})
+            client.get('/pooled', headers={**headers, 'X-Profile': 'cprofile'})
+        finally:
+            pool.shutdown()
+
+        folded, prof = sorted(app.profiler.list_profiles(), key=lambda path: path.endswith('.prof'))
+        with open(folded) as f:
+            assert 'busy_loop' in f.read()
+        assert any(function[2] == 'busy_loop' for function in pstats.Stats(prof).stats)
+
+class TestMemoryMonitor:
+    def test_growth_alert_after_full_window(self):
+        """Test that sustained growth per request alerts once per cooldown"""
+        monitor = MemoryMonitor(growth_alert_bytes=1024, window=3, cooldown=60)
+        leaking = (current_rss() - 10 * 1024 ** 2, None)
+
+        monitor.finish_request('predict', leaking)
+        monitor.finish_request('predict', leaking)
+        assert monitor.alerts == deque()
+
+        for _ in range(3):
+            monitor.finish_request('predict', leaking)
+        [alert] = monitor.alerts
+        assert alert['endpoint'] == 'predict'
+        assert alert['mean_growth_per_request'] > 1024
+        assert monitor.recent_alert() == alert
+
+        #growth that evens out does not alert
+        monitor.finish_request('health', (current_rss() - 10 * 1024 ** 2, None))
+        for _ in range(2):
+            monitor.finish_request('health', (current_rss() + 10 * 1024 ** 2, None))
+        assert [a['endpoint'] for a in monitor.alerts] == ['predict']
+
+    @pytest.mark.skipif(not os.path.exists('/proc/self/statm') or not hasattr(os, 'fork'), reason='needs /proc and fork')
+    def test_forked_worker_reads_its_own_rss(self):
+        """Test that a forked child does not keep reading its parent's statm"""
+        current_rss()
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                #the child's RSS moves away from the parent's: pages not shared on fork plus the ballast
+                ballast = bytearray(64 * 1024 ** 2)
+                ballast[::4096] = b'x' * len(ballast[::4096])
+                with open('/proc/self/statm') as f:
+                    own_rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+                os.write(write_fd, f"{current_rss()} {own_rss}".encode())
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        child_rss, own_rss = map(int, os.read(read_fd, 64).split())
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+
+        assert abs(child_rss - own_rss) < 16 * 1024 ** 2
+
+    def test_track_reports_top_growth_while_tracing(self):
+        """Test that a tracked block records RSS and the allocations it kept"""
+        monitor = MemoryMonitor()
+        monitor.start_tracing(frames=1)
+        try:
+            with monitor.track('load_model test'):
+                kept = [bytearray(1024) for _ in range(1000)]
+            top = monitor.top_allocators(limit=5)
+        finally:
+            monitor.stop_tracing()
+
+        [event] = monitor.events
+        assert event['label'] == 'load_model test'
+        assert event['rss_after'] == event['rss_before'] + event['rss_growth']
+        assert any(__file__ in entry['location'] and entry['size_diff'] >= 1024 * 1000
+                   for entry in event['top_growth'])
+        assert top['traced_current'] >= 1024 * 1000
+        assert any(__file__ in entry['location'] for entry in top['growth'])
+        assert len(kept) == 1000
+
+    def test_admin_memory_report(self, monkeypatch):
+        """Test that /admin/memory needs the token and reports endpoints and registered sizes"""
+        monkeypatch.setattr(AuthConfig, 'ADMIN_TOKEN', 'secret')
+        app = Flask(__name__)
+
+        @app.route('/predict')
+        def predict():
+            return 'ok'
+
+        monitor = MemoryMonitor().init_app(app)
+        monitor.register_size('predictor', lambda: {'model_weights': 4096})
+        client = app.test_client()
+        client.get('/predict')
+
+        assert client.get('/admin/memory').status_code == 403
+        report = client.get('/admin/memory', headers={'X-Admin-Token': 'secret'}).get_json()
+        assert report['rss'] > 0
+        assert report['endpoints']['predict']['requests'] == 1
+        assert report['sizes'] == {'predictor': {'model_weights': 4096}}
+
+class TestHealthChecks:
+    def make_checks(self, timeout=1):
+        checks = HealthChecks(refresh_seconds=0, timeout=timeout)
+        checks.init_app(Flask(__name__), start=False)
+        return checks
+
+    def test_probes_run_concurrently_with_timeouts(self):
+        """Test that probes run in parallel and a probe past its timeout is an error of its impact"""
+        checks = self.make_checks(timeout=0.3)
+        release = threading.Event()
+        calls = []
+
+        for name in ('database', 'redis', 'models'):
+            @checks.probe(name)
+            def slow():
+                time.sleep(0.2)
+                return {'status': 'healthy'}
+
+        @checks.probe('cache', impact='unhealthy')
+        def hung():
+            calls.append(1)
+            release.wait(5)
+            return {'status': 'healthy'}
+
+        try:
+            snapshot = checks.run()
+            assert snapshot['probe_ms'] < 500
+            assert snapshot['status'] == 'unhealthy'
+            assert snapshot['components']['cache'] == {'status': 'error', 'message': 'Probe timed out after 0.3s'}
+            assert snapshot['components']['database'] == {'status': 'healthy'}
+
+            #the hung probe is still running, so the next refresh waits on it instead of starting another
+            checks.run()
+            assert len(calls) == 1
+        finally:
+            release.set()
+            checks.stop()
+
+    def test_report_serves_cached_snapshot_unless_fresh(self):
+        """Test that report answers from the snapshot with its age and fresh=True probes again"""
+        checks = self.make_checks()
+        calls = []
+
+        @checks.probe('database', impact='unhealthy')
+        def database():
+            calls.append(1)
+            if len(calls) > 1:
+                raise Exception('connection refused')
+            return {'status': 'healthy'}
+
+        @checks.probe('logging')
+        def logging_probe():
+            return None
+
+        try:
+            first = checks.report()
+            assert first['cached'] is False and first['status'] == 'healthy'
+            assert 'logging' not in first['components']
+
+            time.sleep(0.05)
+            cached = checks.report()
+            assert cached['cached'] is True and cached['age_seconds'] >= 0.05
+            assert len(calls) == 1
+
+            fresh = checks.report(fresh=True)
+            assert fresh['cached'] is False and fresh['age_seconds'] < 0.05
+            assert fresh['status'] == 'unhealthy'
+            assert fresh['components']['database']['message'] == 'connection refused'
+        finally:
+            checks.stop()
@@ -0,0 +1,105 @@
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import threading
+import logging
+import atexit
+import time
+
+class BoundedExecutor:
+    """
+    Base for pools that run jobs off the calling thread with a cap on queued work.
+
+    Once max_pending jobs are queued or running new ones are rejected
+    immediately with queue_full rather than piling up, and a job still
+    unfinished after timeout seconds raises timed_out. A job's slot is
+    freed when it finishes, even if its caller gave up waiting.
+    max_workers=0 runs jobs inline on the calling thread. Subclasses
+    create the executor and name the exceptions and log messages.
+    """
+
+    label = 'Job' #start of log messages, e.g. 'Password hashing'
+    queue_full = None
+    timed_out = None
+    log_failures = False #also log jobs that raised
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, max_workers, max_pending, timeout):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {'completed': 0, 'rejected': 0, 'failed': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+
+    def _create_executor(self):
+        raise NotImplementedError
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = self._create_executor()
+            atexit.register(self.shutdown)
+        return self._executor
+
+    def _run(self, func, *args):
+        """Run func(*args) in the pool and wait for its result"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                self.logger.warning(f"{self.label} queue full ({self._pending} pending), rejecting request")
+                raise self.queue_full()
+            self._pending += 1
+            if self.max_workers:
+                executor = self._get_executor()
+
+        start = time.perf_counter()
+        try:
+            if self.max_workers:
+                try:
+                    future = executor.submit(func, *args)
+                except Exception:
+                    self._release()
+                    raise
+                future.add_done_callback(self._release)
+                result = future.result(timeout=self.timeout)
+            else:
+                try:
+                    result = func(*args)
+                finally:
+                    self._release()
+        except FutureTimeoutError:
+            with self._lock:
+                self._stats['failed'] += 1
+            self.logger.error(f"{self.label} timed out after {self.timeout}s")
+            raise self.timed_out()
+        except Exception as e:
+            with self._lock:
+                self._stats['failed'] += 1
+            if self.log_failures:
+                self.logger.error(f"{self.label} failed: {str(e)}")
+            raise
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats['completed'] += 1
+            self._stats['total_seconds'] += elapsed
+            self._stats['max_seconds'] = max(self._stats['max_seconds'], elapsed)
+        return result
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def get_stats(self):
+        """Queue depth and job latency (seconds, including time waiting for a worker)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = self._pending
+        stats['max_pending'] = self.max_pending
+        stats['avg_seconds'] = stats['total_seconds'] / stats['completed'] if stats['completed'] else 0.0
+        return stats
+
+    def shutdown(self):
+        """Stop the pool's workers"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
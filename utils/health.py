@@ -0,0 +1,136 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timezone
+import threading
+import logging
+import atexit
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+class HealthConfig:
+    """Health probe settings"""
+    #how often the background refresher probes every component
+    REFRESH_SECONDS = float(os.getenv('HEALTH_REFRESH_SECONDS', '10'))
+    #default per-probe timeout; a probe that takes longer is reported as an error
+    PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '2'))
+    MAX_PROBE_THREADS = int(os.getenv('HEALTH_MAX_PROBE_THREADS', '8'))
+
+#overall status by severity; a failing probe raises the overall status to its impact
+SEVERITY = {'healthy': 0, 'degraded': 1, 'unhealthy': 2}
+
+class HealthChecks:
+    """
+    Component probes for /health/check, run concurrently in the background.
+
+    Probes are registered with @health_checks.probe(name, impact) and
+    return the component's dict ('status' plus details). A refresher
+    thread runs them all every REFRESH_SECONDS, each in its own app
+    context with its own timeout, and keeps the latest snapshot, so
+    /health/check answers from memory and a slow dependency delays only
+    its own entry. A probe that has not finished by the next refresh is
+    not started a second time; the refresh waits on the running one.
+    """
+
+    def __init__(self, refresh_seconds=HealthConfig.REFRESH_SECONDS, timeout=HealthConfig.PROBE_TIMEOUT,
+                 max_threads=HealthConfig.MAX_PROBE_THREADS):
+        self.refresh_seconds = refresh_seconds
+        self.timeout = timeout
+        self.probes = {}
+        self.app = None
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='health-probe')
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def probe(self, name, impact='degraded', timeout=None):
+        """Register fn as the probe of a component; impact is the overall status when it fails"""
+        def register(fn):
+            self.probes[name] = (fn, impact, timeout or self.timeout)
+            return fn
+        return register
+
+    def _call(self, fn):
+        if self.app is None:
+            return fn()
+        with self.app.app_context():
+            return fn()
+
+    def _submit(self, name, fn):
+        with self._lock:
+            future = self._in_flight.get(name)
+            if future is None or future.done():
+                future = self._in_flight[name] = self._executor.submit(self._call, fn)
+            return future
+
+    def run(self):
+        """Probe every component now and store the result as the latest snapshot"""
+        started = time.monotonic()
+        futures = {name: (self._submit(name, fn), impact, timeout)
+                   for name, (fn, impact, timeout) in self.probes.items()}
+
+        status = 'healthy'
+        components = {}
+        for name, (future, impact, timeout) in futures.items():
+            probe_start = time.monotonic()
+            try:
+                component = future.result(timeout=max(0.0, started + timeout - probe_start))
+            except FutureTimeout:
+                component = {'status': 'error', 'message': f"Probe timed out after {timeout:g}s"}
+            except Exception as e:
+                component = {'status': 'error', 'message': str(e)}
+            if component is None:
+                continue
+            if component.get('status') == 'error' and SEVERITY[impact] > SEVERITY[status]:
+                status = impact
+            components[name] = component
+
+        snapshot = {
+            'status': status,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'probe_ms': round((time.monotonic() - started) * 1000, 1),
+            'components': components,
+            '_checked_at': time.monotonic()
+        }
+        self._snapshot = snapshot
+        return snapshot
+
+    def report(self, fresh=False):
+        """Latest snapshot with its age, probing first if asked to or if there is none yet"""
+        snapshot = self._snapshot
+        cached = not fresh and snapshot is not None
+        if not cached:
+            snapshot = self.run()
+        report = {key: value for key, value in snapshot.items() if key != '_checked_at'}
+        report['age_seconds'] = round(time.monotonic() - snapshot['_checked_at'], 3)
+        report['cached'] = cached
+        return report
+
+    def _run_loop(self):
+        while True:
+            try:
+                self.run()
+            except Exception as e:
+                logger.error(f"Health refresh failed: {str(e)}")
+            if self._stopping.wait(self.refresh_seconds):
+                return
+
+    def init_app(self, app, start=True):
+        """Probe inside app's context and keep the snapshot fresh from a background thread"""
+        self.app = app
+        app.health_checks = self
+        if start and self.refresh_seconds > 0:
+            self._thread = threading.Thread(target=self._run_loop, name='health-refresh', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(self.timeout + 1)
+        self._executor.shutdown(wait=False)
+
+health_checks = HealthChecks()
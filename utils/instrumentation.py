@@ -0,0 +1,420 @@
+from flask import g, request, Response
+from bisect import bisect_left
+import threading
+import logging
+import socket
+import atexit
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+class MetricsConfig:
+    """Operational metrics settings"""
+    ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    #how often each process publishes its samples to redis
+    FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '10'))
+    REDIS_PREFIX = os.getenv('METRICS_REDIS_PREFIX', 'metrics')
+
+#seconds; covers cached predictions through full data downloads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+#order of a histogram's samples in the exposition
+_SUFFIX_ORDER = {'': 0, '_bucket': 1, '_sum': 2, '_count': 3}
+
+def _to_str(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+def _merge(totals, shard):
+    """Add a shard's counter values and histogram counts into totals"""
+    for key, value in shard.copy().items():
+        if isinstance(value, list):
+            merged = totals.setdefault(key, [0] * len(value))
+            for i, count in enumerate(list(value)):
+                merged[i] += count
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+def _sort_key(sample):
+    _, suffix, labels = sample
+    le = dict(labels).get('le')
+    return (tuple(label for label in labels if label[0] != 'le'), _SUFFIX_ORDER[suffix], float(le) if le else 0)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        return (self.name, tuple(str(labels.get(name, '')) for name in self.labelnames))
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self.registry._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        shard = self.registry._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self.registry._shard()
+        key = self._key(labels)
+        counts = shard.get(key)
+        if counts is None:
+            #per bucket counts (the last one is +Inf), then sum and count
+            counts = shard[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+class MetricsRegistry:
+    """
+    Process-wide operational metrics rendered in the Prometheus text format.
+
+    Recording only touches a dict owned by the calling thread, so hot paths
+    never wait on a lock; the per-thread shards are summed when samples are
+    collected. Shards of finished threads (the threaded dev server starts
+    one per request) are folded into a retired total so they don't pile
+    up. Each process periodically adds its counter and histogram
+    deltas to a shared redis hash and replaces its gauges in a hash of its
+    own that expires with the process, so any worker can render the totals
+    of all of them.
+    """
+
+    def __init__(self, prefix=MetricsConfig.REDIS_PREFIX, process_id=None, flush_interval=MetricsConfig.FLUSH_SECONDS):
+        self.prefix = prefix
+        self.process_id = process_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.flush_interval = flush_interval
+        self._metrics = {}
+        self._collectors = []
+        self._local = threading.local()
+        self._shards = [] #(thread, shard) of threads that have recorded something
+        self._retired = {} #merged shards of finished threads
+        self._fold_at = 64
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed = {}
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def on_collect(self, collector):
+        """Call collector before every collection, e.g. to set gauges sampled from a pool"""
+        self._collectors.append(collector)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append((threading.current_thread(), shard))
+                if len(self._shards) >= self._fold_at:
+                    self._fold_finished()
+        return shard
+
+    def _fold_finished(self):
+        """Merge shards of threads that have exited into the retired total; needs _shards_lock"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge(self._retired, shard)
+        self._shards = live
+        #amortised: folding again only once the live list has doubled
+        self._fold_at = max(64, 2 * len(live))
+
+    def collect(self):
+        """Samples of this process as {(name, suffix, labels): value}"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+
+        totals = {}
+        with self._shards_lock:
+            self._fold_finished()
+            _merge(totals, self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            _merge(totals, shard)
+        for metric in self._metrics.values():
+            if metric.kind == 'gauge':
+                for key, value in list(metric._values.items()):
+                    totals[key] = totals.get(key, 0) + value
+
+        samples = {}
+        for (name, label_values), value in totals.items():
+            metric = self._metrics[name]
+            labels = tuple(zip(metric.labelnames, label_values))
+            if metric.kind != 'histogram':
+                samples[(name, '', labels)] = value
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float('inf'),), value):
+                cumulative += count
+                samples[(name, '_bucket', labels + (('le', _format_value(bound)),))] = cumulative
+            samples[(name, '_sum', labels)] = value[-2]
+            samples[(name, '_count', labels)] = value[-1]
+        return samples
+
+    def render(self, samples=None):
+        """Prometheus text exposition of samples (this process's by default)"""
+        samples = self.collect() if samples is None else samples
+        by_family = {}
+        for sample, value in samples.items():
+            by_family.setdefault(sample[0], []).append((sample, value))
+
+        lines = []
+        for metric in self._metrics.values():
+            family = by_family.get(metric.name)
+            if not family:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for (name, suffix, labels), value in sorted(family, key=lambda item: _sort_key(item[0])):
+                lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    @property
+    def totals_key(self):
+        return f"{self.prefix}:totals"
+
+    @property
+    def processes_key(self):
+        return f"{self.prefix}:processes"
+
+    def gauges_key(self, process_id):
+        return f"{self.prefix}:gauges:{process_id}"
+
+    def flush(self, redis_client):
+        """Publish this process's counter deltas and current gauges"""
+        with self._flush_lock:
+            samples = self.collect()
+            pipe = redis_client.pipeline(transaction=False)
+            flushed, gauges = {}, {}
+            for sample, value in samples.items():
+                field = json.dumps([sample[0], sample[1], sample[2]])
+                if self._metrics[sample[0]].kind == 'gauge':
+                    gauges[field] = value
+                    continue
+                delta = value - self._flushed.get(sample, 0)
+                if delta:
+                    pipe.hincrbyfloat(self.totals_key, field, delta)
+                    flushed[sample] = value
+
+            gauges_key = self.gauges_key(self.process_id)
+            pipe.delete(gauges_key)
+            if gauges:
+                pipe.hset(gauges_key, mapping=gauges)
+                pipe.expire(gauges_key, max(int(self.flush_interval * 3), 1))
+            pipe.sadd(self.processes_key, self.process_id)
+            pipe.execute()
+            #only counted as published once redis has it
+            self._flushed.update(flushed)
+
+    def collect_all(self, redis_client):
+        """Samples summed over every process publishing to redis"""
+        self.flush(redis_client)
+        samples = {}
+
+        def add(field, value):
+            name, suffix, labels = json.loads(_to_str(field))
+            sample = (name, suffix, tuple(tuple(label) for label in labels))
+            samples[sample] = samples.get(sample, 0) + float(value)
+
+        for field, value in redis_client.hgetall(self.totals_key).items():
+            add(field, value)
+
+        processes = [_to_str(process) for process in redis_client.smembers(self.processes_key)]
+        pipe = redis_client.pipeline(transaction=False)
+        for process in processes:
+            pipe.hgetall(self.gauges_key(process))
+        for process, gauges in zip(processes, pipe.execute()):
+            if not gauges and process != self.process_id:
+                #the process stopped flushing and its gauges expired
+                redis_client.srem(self.processes_key, process)
+                continue
+            for field, value in gauges.items():
+                add(field, value)
+        return samples
+
+    def start(self, app):
+        """Flush to the app's redis every flush_interval seconds"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(app,), name='metrics-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self, app):
+        while not self._stopping.wait(self.flush_interval):
+            redis_client = getattr(app, 'redis_client', None)
+            if not redis_client:
+                continue
+            try:
+                with app.app_context():
+                    self.flush(redis_client)
+            except Exception as e:
+                logger.error(f"Error flushing metrics: {str(e)}")
+
+    def stop(self):
+        self._stopping.set()
+
+metrics_registry = MetricsRegistry()
+
+request_duration = metrics_registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling requests', ('endpoint', 'method', 'status'))
+requests_in_flight = metrics_registry.gauge(
+    'http_requests_in_flight', 'Requests currently being handled', ('endpoint',))
+request_errors = metrics_registry.counter(
+    'http_request_errors_total', 'Requests that raised or returned a 5xx status', ('endpoint', 'status'))
+model_inference_duration = metrics_registry.histogram(
+    'model_inference_seconds', 'Time spent in model.predict')
+data_fetch_duration = metrics_registry.histogram(
+    'data_fetch_seconds', 'Time spent loading market data (total) and downloading it from the provider', ('stage',))
+cache_requests = metrics_registry.counter(
+    'cache_requests_total', 'Cache lookups by cache and result (hit or miss)', ('cache', 'result'))
+db_pool_connections = metrics_registry.gauge(
+    'db_pool_connections', 'Database pool connections by state', ('state',))
+redis_pool_connections = metrics_registry.gauge(
+    'redis_pool_connections', 'Redis pool connections by state', ('state',))
+
+def record_cache_lookup(cache, hit):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+def _collect_pools(app):
+    def collect():
+        redis_client = getattr(app, 'redis_client', None)
+        pool = getattr(redis_client, 'connection_pool', None) if redis_client else None
+        if pool is not None:
+            redis_pool_connections.set(len(getattr(pool, '_in_use_connections', ())), state='in_use')
+            redis_pool_connections.set(len(getattr(pool, '_available_connections', ())), state='idle')
+            redis_pool_connections.set(getattr(pool, 'max_connections', 0), state='max')
+
+        engines = app.extensions['sqlalchemy'].engines if 'sqlalchemy' in app.extensions else {}
+        engine = engines.get(None)
+        pool = getattr(engine, 'pool', None)
+        #only QueuePool reports its size
+        if pool is not None and hasattr(pool, 'checkedout'):
+            db_pool_connections.set(pool.checkedout(), state='checked_out')
+            db_pool_connections.set(pool.checkedin(), state='idle')
+            db_pool_connections.set(pool.size() + max(pool.overflow(), 0), state='open')
+    return collect
+
+def init_instrumentation(app):
+    """Time every request and serve the metrics of all workers on /metrics/prometheus"""
+    if not MetricsConfig.ENABLED:
+        return None
+
+    @app.before_request
+    def start_request_timer():
+        g._metrics_start = time.perf_counter()
+        g._metrics_endpoint = request.endpoint or 'unmatched'
+        requests_in_flight.inc(endpoint=g._metrics_endpoint)
+
+    @app.after_request
+    def record_response_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request(exc):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return
+        endpoint = g.pop('_metrics_endpoint')
+        status = 500 if exc is not None else g.pop('_metrics_status', 500)
+        requests_in_flight.dec(endpoint=endpoint)
+        request_duration.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method, status=status)
+        if exc is not None or status >= 500:
+            request_errors.inc(endpoint=endpoint, status=status)
+
+    @app.route('/metrics/prometheus', methods=['GET'])
+    def prometheus_metrics():
+        redis_client = getattr(app, 'redis_client', None)
+        samples = None
+        if redis_client:
+            try:
+                samples = metrics_registry.collect_all(redis_client)
+            except Exception as e:
+                logger.error(f"Error reading metrics from redis, serving this process only: {str(e)}")
+        return Response(metrics_registry.render(samples), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    metrics_registry.on_collect(_collect_pools(app))
+    metrics_registry.start(app)
+    app.metrics_registry = metrics_registry
+    return metrics_registry
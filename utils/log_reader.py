@@ -0,0 +1,198 @@
+from datetime import datetime
+from array import array
+import threading
+import logging
+import json
+import re
+import os
+
+#matches the text file formatter in utils/logger_config.py
+LINE_PATTERN = re.compile(
+    r'^(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (?P<logger>\S+) - (?P<level>[A-Z]+) - (?P<message>.*)$'
+)
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S,%f'
+#upper bound for one /logs request
+MAX_TAIL_LINES = int(os.getenv('LOG_TAIL_MAX_LINES', '10000'))
+
+def parse_line(line):
+    """Record dict for a JSON or text log line, or None for a continuation line (e.g. a traceback)"""
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+            timestamp = datetime.fromisoformat(entry['timestamp'])
+        except (ValueError, KeyError, TypeError):
+            return None
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        return {**entry, 'timestamp': timestamp, 'line': line}
+
+    match = LINE_PATTERN.match(line)
+    if not match:
+        return None
+    return {
+        'timestamp': datetime.strptime(match.group('time'), TIME_FORMAT),
+        'logger': match.group('logger'),
+        'level': match.group('level'),
+        'message': match.group('message'),
+        'line': line
+    }
+
+class LogReader:
+    """
+    Tails log files from the end without reading them whole.
+
+    Lines are read backwards in blocks, from the live file through its
+    rotated backups (app.log, app.log.1, ...). Each file keeps an index of
+    the byte offsets of its last max_indexed_lines lines, keyed by inode so
+    it survives rotation; a repeated tail only reads what was appended
+    since the last call plus the lines it returns.
+    """
+
+    def __init__(self, log_dir='logs', block_size=64 * 1024, max_indexed_lines=20000):
+        self.log_dir = log_dir
+        self.block_size = block_size
+        self.max_indexed_lines = max_indexed_lines
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def log_files(self, name):
+        """Existing files of a log, newest first"""
+        base = os.path.join(self.log_dir, name)
+        files = [base] if os.path.exists(base) else []
+        backup = 1
+        while os.path.exists(f"{base}.{backup}"):
+            files.append(f"{base}.{backup}")
+            backup += 1
+        return files
+
+    def _line_starts_before(self, f, end, limit):
+        """Up to limit line start offsets before end, ascending"""
+        starts = []
+        pos = end
+        while pos > 0 and len(starts) < limit:
+            read_size = min(self.block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            block = f.read(read_size)
+            i = len(block)
+            while len(starts) < limit:
+                i = block.rfind(b'\n', 0, i)
+                if i == -1:
+                    break
+                if pos + i + 1 < end:
+                    starts.append(pos + i + 1)
+        if pos == 0 and end > 0 and len(starts) < limit:
+            starts.append(0)
+        starts.reverse()
+        return starts
+
+    def _get_index(self, path, f):
+        stat = os.fstat(f.fileno())
+        key = (stat.st_dev, stat.st_ino)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None or stat.st_size < index['size']:
+                #new file, or truncated in place
+                index = {
+                    'size': stat.st_size,
+                    'starts': array('Q', self._line_starts_before(f, stat.st_size, self.max_indexed_lines))
+                }
+                self._indexes[key] = index
+            elif stat.st_size > index['size']:
+                #only scan what was appended since the last call, plus the old last byte
+                #(a newline there makes the old size a line start)
+                offset = max(index['size'] - 1, 0)
+                f.seek(offset)
+                appended = f.read(stat.st_size - offset)
+                starts = index['starts']
+                if not starts:
+                    starts.append(0)
+                pos = appended.find(b'\n')
+                while pos != -1:
+                    if offset + pos + 1 < stat.st_size:
+                        starts.append(offset + pos + 1)
+                    pos = appended.find(b'\n', pos + 1)
+                if len(starts) > self.max_indexed_lines:
+                    del starts[:len(starts) - self.max_indexed_lines]
+                index['size'] = stat.st_size
+            return index['size'], array('Q', index['starts'])
+
+    def _scan_reverse(self, f, end):
+        """Lines ending before end, newest first, read backwards in blocks"""
+        pos = end
+        remainder = b''
+        while pos > 0:
+            read_size = min(self.block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            lines = (f.read(read_size) + remainder).split(b'\n')
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                yield line
+        if end > 0:
+            yield remainder
+
+    def iter_lines_reverse(self, path, batch_lines=256):
+        """Every line of a file, newest first"""
+        with open(path, 'rb') as f:
+            size, starts = self._get_index(path, f)
+            end = size
+            i = len(starts)
+            while i > 0:
+                j = max(0, i - batch_lines)
+                f.seek(starts[j])
+                chunk = f.read(end - starts[j])
+                for k in range(i - 1, j - 1, -1):
+                    line_end = starts[k + 1] if k + 1 < len(starts) else size
+                    yield chunk[starts[k] - starts[j]:line_end - starts[j]].rstrip(b'\n')
+                end = starts[j]
+                i = j
+            #older than the index: plain reverse scan (end is a line start, so skip its newline)
+            if starts and starts[0] > 0:
+                yield from self._scan_reverse(f, starts[0] - 1)
+
+    def iter_records(self, name):
+        """Parsed records of a log across rotated files, newest first"""
+        for path in self.log_files(name):
+            continuation = []
+            for raw in self.iter_lines_reverse(path):
+                line = raw.decode('utf-8', errors='replace').rstrip('\r')
+                if not line:
+                    continue
+                record = parse_line(line)
+                if record is None:
+                    continuation.append(line)
+                    continue
+                if continuation:
+                    record['line'] = '\n'.join([line] + continuation[::-1])
+                    continuation = []
+                yield record
+
+    def tail(self, name, lines=100, level=None, logger=None, since=None, until=None):
+        """
+        Newest matching records of a log, newest first.
+
+        level is a minimum severity name, logger matches the logger and its
+        children, since/until bound the timestamp. Scanning stops at the
+        first record older than since.
+        """
+        min_level = logging.getLevelName(level.upper()) if level else None
+        if isinstance(min_level, str):
+            raise ValueError(f"Unknown log level: {level}")
+
+        returned = 0
+        for record in self.iter_records(name):
+            if returned >= lines:
+                return
+            if since and record['timestamp'] < since:
+                return
+            if until and record['timestamp'] > until:
+                continue
+            if min_level is not None and logging.getLevelName(record['level']) < min_level:
+                continue
+            if logger and record['logger'] != logger and not record['logger'].startswith(f"{logger}."):
+                continue
+            returned += 1
+            yield record
+
+log_reader = LogReader()
@@ -1,15 +1,162 @@
+from datetime import datetime
 import logging.handlers
+import threading
+import logging
+import random
+import atexit
+import queue
+import copy
+import json
+import time
 import os
 
+class LoggingConfig:
+    """Logging pipeline settings"""
+    #records waiting for the writer thread; beyond this new records are dropped and counted
+    QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    #records per second allowed from one call site, by logger name (children included)
+    RATE_LIMITS = {
+        'auth.middleware': 5, #rate limit exceeded warnings
+        **json.loads(os.getenv('LOG_RATE_LIMITS', '{}'))
+    }
+    #fraction of DEBUG/INFO records kept, by logger name (children included)
+    SAMPLE_RATES = json.loads(os.getenv('LOG_SAMPLE_RATES', '{}'))
+    #json or text for the log files
+    FILE_FORMAT = os.getenv('LOG_FILE_FORMAT', 'json')
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, including any extra= fields"""
+
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED and not key.startswith('_'):
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+def _rule_for(rules, name):
+    """Setting for the most specific logger prefix of name, or None"""
+    while name:
+        if name in rules:
+            return rules[name]
+        name = name.rpartition('.')[0]
+    return None
+
+class LogThrottle(logging.Filter):
+    """
+    Sampling and per call site rate limiting for noisy loggers.
+
+    Records at WARNING and above are never sampled. Rate limits are token
+    buckets keyed by logger and source line, so f-string messages from one
+    call site share a bucket; the first record let through after a burst
+    carries a suppressed count. ERROR and above always pass.
+    """
+
+    def __init__(self, rate_limits=None, sample_rates=None):
+        super().__init__()
+        self.rate_limits = rate_limits or {}
+        self.sample_rates = sample_rates or {}
+        self.sampled_out = 0
+        self.rate_limited = 0
+        self._buckets = {}
+        self._rules = {}
+        self._lock = threading.Lock()
+
+    def _rules_for(self, name):
+        rules = self._rules.get(name)
+        if rules is None:
+            rules = (_rule_for(self.rate_limits, name), _rule_for(self.sample_rates, name))
+            self._rules[name] = rules
+        return rules
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        rate, sample_rate = self._rules_for(record.name)
+
+        if sample_rate is not None and record.levelno < logging.WARNING and random.random() >= sample_rate:
+            with self._lock:
+                self.sampled_out += 1
+            return False
+
+        if rate is None:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, suppressed = self._buckets.get(key, (rate, now, 0))
+            tokens = min(rate, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                self.rate_limited += 1
+                return False
+            self._buckets[key] = (tokens - 1, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer falls behind"""
+
+    def __init__(self, maxsize):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.enqueued = 0
+        self.dropped = 0
+        self._stats_lock = threading.Lock()
+
+    def prepare(self, record):
+        #merge the arguments now, they may change before the writer gets to them;
+        #formatting is left to the writer thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return
+        with self._stats_lock:
+            self.enqueued += 1
+
+_pipeline = {}
+
 def setup_logging(log_dir = 'logs'):
-    """Configure application-wide logging"""
+    """
+    Configure application-wide logging.
+
+    Loggers only put records on a bounded queue; a QueueListener thread
+    formats them and does the file and console I/O, so a log call in the
+    request path never waits on disk.
+    """
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
     #create formatters
-    file_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    if LoggingConfig.FILE_FORMAT == 'json':
+        file_formatter = JSONFormatter()
+    else:
+        file_formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
     console_formatter = logging.Formatter(
         '%(levelname)s - %(message)s'
     )
@@ -37,12 +184,22 @@ def setup_logging(log_dir = 'logs'):
     console_handler.setFormatter(console_formatter)
     console_handler.setLevel(logging.INFO)
 
-    #Root logger configuration
+    #Only the queue handler runs in the caller's thread
+    queue_handler = BoundedQueueHandler(LoggingConfig.QUEUE_SIZE)
+    throttle = LogThrottle(LoggingConfig.RATE_LIMITS, LoggingConfig.SAMPLE_RATES)
+    queue_handler.addFilter(throttle)
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, file_handler, error_handler, console_handler,
+        respect_handler_level=True
+    )
+
+    #Root logger configuration, replacing a previous pipeline
     root_logger = logging.getLogger()
+    stop_logging()
     root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(error_handler)
-    root_logger.addHandler(console_handler)
+    root_logger.addHandler(queue_handler)
+    listener.start()
+    _pipeline.update(handler=queue_handler, throttle=throttle, listener=listener)
 
     #Create separate loggers for different components
     loggers = {
@@ -55,3 +212,29 @@ def setup_logging(log_dir = 'logs'):
         logger.setLevel(logging.INFO)
 
     return loggers
+
+def stop_logging():
+    """Flush queued records and detach the pipeline"""
+    if not _pipeline:
+        return
+    logging.getLogger().removeHandler(_pipeline['handler'])
+    _pipeline['listener'].stop()
+    for handler in _pipeline['listener'].handlers:
+        handler.close()
+    _pipeline.clear()
+
+atexit.register(stop_logging)
+
+def get_logging_stats():
+    """Counters of the logging pipeline"""
+    if not _pipeline:
+        return None
+    handler, throttle = _pipeline['handler'], _pipeline['throttle']
+    return {
+        'enqueued': handler.enqueued,
+        'dropped': handler.dropped,
+        'sampled_out': throttle.sampled_out,
+        'rate_limited': throttle.rate_limited,
+        'queue_size': handler.queue.qsize(),
+        'queue_capacity': handler.queue.maxsize
+    }
@@ -0,0 +1,79 @@
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar,
+    Holiday,
+    GoodFriday,
+    USMartinLutherKingJr,
+    USPresidentsDay,
+    USMemorialDay,
+    USLaborDay,
+    USThanksgivingDay,
+    nearest_workday,
+    sunday_to_monday
+)
+from pandas.tseries.offsets import CustomBusinessDay
+
+#one-off exchange closures that no holiday rule covers
+SPECIAL_CLOSURES = [
+    '2001-09-11', '2001-09-12', '2001-09-13', '2001-09-14', #september 11
+    '2004-06-11', #reagan funeral
+    '2007-01-02', #ford funeral
+    '2012-10-29', '2012-10-30', #hurricane sandy
+    '2018-12-05', #bush funeral
+    '2025-01-09' #carter funeral
+]
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """Regular NYSE holidays for daily bar gap detection"""
+    rules = [
+        Holiday('New Years Day', month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday)
+    ]
+
+def trading_days(start_date, end_date):
+    """Return the expected trading sessions in [start_date, end_date)"""
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize()
+    if end <= start:
+        return pd.DatetimeIndex([])
+
+    holidays = NYSEHolidayCalendar().holidays(start, end).append(pd.DatetimeIndex(SPECIAL_CLOSURES))
+    sessions = pd.date_range(start, end - pd.Timedelta(days=1), freq=CustomBusinessDay(holidays=holidays))
+    return sessions
+
+def find_gaps(expected_days, available_days, merge_within=5):
+    """
+    Group the expected sessions that are missing from available_days into ranges.
+
+    Args:
+    expected_days (pd.DatetimeIndex): Sessions the range should contain
+    available_days (pd.DatetimeIndex): Sessions already present
+    merge_within (int): Join gaps separated by fewer than this many present sessions,
+        trading a few redundant rows for fewer provider requests
+
+    Returns:
+    list: (first_missing_day, last_missing_day) tuples in date order
+    """
+    missing = ~expected_days.isin(available_days)
+    positions = [i for i, is_missing in enumerate(missing) if is_missing]
+    if not positions:
+        return []
+
+    gaps = []
+    run_start = run_end = positions[0]
+    for position in positions[1:]:
+        if position - run_end <= merge_within:
+            run_end = position
+        else:
+            gaps.append((expected_days[run_start], expected_days[run_end]))
+            run_start = run_end = position
+    gaps.append((expected_days[run_start], expected_days[run_end]))
+    return gaps
@@ -0,0 +1,278 @@
+from flask import g, request, jsonify
+from contextlib import contextmanager
+from collections import deque
+from utils.instrumentation import metrics_registry
+import tracemalloc
+import threading
+import resource
+import logging
+import time
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+class MemoryConfig:
+    """Memory instrumentation settings"""
+    #alert when the mean RSS growth over an endpoint's last GROWTH_WINDOW requests exceeds this
+    GROWTH_ALERT_BYTES = int(os.getenv('MEMORY_GROWTH_ALERT_BYTES', str(1024 * 1024)))
+    GROWTH_WINDOW = int(os.getenv('MEMORY_GROWTH_WINDOW', '200'))
+    ALERT_COOLDOWN_SECONDS = float(os.getenv('MEMORY_ALERT_COOLDOWN_SECONDS', '600'))
+    #stack depth recorded by tracemalloc while it is on
+    TRACEMALLOC_FRAMES = int(os.getenv('MEMORY_TRACEMALLOC_FRAMES', '10'))
+    #model loads and other tracked events kept for the report
+    MAX_EVENTS = 50
+
+process_rss = metrics_registry.gauge(
+    'process_resident_memory_bytes', 'Resident set size of the worker processes')
+request_memory_growth = metrics_registry.counter(
+    'http_request_memory_growth_bytes_total', 'RSS growth observed across requests, by endpoint', ('endpoint',))
+memory_growth_alerts = metrics_registry.counter(
+    'memory_growth_alerts_total', 'Endpoints whose mean RSS growth per request went over the threshold', ('endpoint',))
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+#(pid, fd) of the open /proc/self/statm; a forked worker inherits the fd but it still describes the parent
+_statm = (None, None)
+
+def current_rss():
+    """Resident set size in bytes (peak RSS where /proc is unavailable)"""
+    global _statm
+    try:
+        pid, fd = _statm
+        if pid != os.getpid():
+            if fd is not None:
+                os.close(fd)
+            fd = os.open('/proc/self/statm', os.O_RDONLY)
+            _statm = (os.getpid(), fd)
+        return int(os.pread(fd, 128, 0).split()[1]) * _PAGE_SIZE
+    except (OSError, AttributeError):
+        return peak_rss()
+
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _traced_memory():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+#allocations of the instrumentation itself are left out of the top lists
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>')
+)
+
+def _describe_statistic(stat):
+    frame = stat.traceback[0]
+    return {
+        'location': f"{frame.filename}:{frame.lineno}",
+        'size': stat.size,
+        'count': stat.count,
+        'size_diff': getattr(stat, 'size_diff', None)
+    }
+
+class MemoryMonitor:
+    """
+    RSS and allocation tracking for the serving process.
+
+    Every request records the RSS change across it per endpoint (one
+    pread of /proc/self/statm at each end), and an endpoint whose mean
+    growth over its last window of requests exceeds the threshold is
+    reported as a probable leak. Concurrent requests share one process,
+    so attribution to endpoints is approximate; a leak shows up as
+    growth that does not even out. tracemalloc is off by default and can
+    be switched on through /admin/memory/tracemalloc to see the top
+    allocators and their growth since it was started.
+    """
+
+    def __init__(self, growth_alert_bytes=MemoryConfig.GROWTH_ALERT_BYTES, window=MemoryConfig.GROWTH_WINDOW,
+                 cooldown=MemoryConfig.ALERT_COOLDOWN_SECONDS):
+        self.growth_alert_bytes = growth_alert_bytes
+        self.window = window
+        self.cooldown = cooldown
+        self.endpoints = {}
+        self.alerts = deque(maxlen=MemoryConfig.MAX_EVENTS)
+        self.events = deque(maxlen=MemoryConfig.MAX_EVENTS)
+        self._size_providers = {}
+        self._last_alert = {}
+        self._baseline = None
+        self._lock = threading.Lock()
+
+    def register_size(self, name, provider):
+        """Report provider() (bytes, or a dict of sizes) under name in the memory report"""
+        self._size_providers[name] = provider
+
+    def sizes(self):
+        sizes = {}
+        for name, provider in self._size_providers.items():
+            try:
+                sizes[name] = provider()
+            except Exception as e:
+                logger.error(f"Error measuring {name}: {str(e)}")
+                sizes[name] = None
+        return sizes
+
+    def start_request(self):
+        return current_rss(), _traced_memory()
+
+    def finish_request(self, endpoint, start):
+        """Record the RSS (and traced) change of a request and check the endpoint's growth"""
+        rss_before, traced_before = start
+        growth = current_rss() - rss_before
+        traced = _traced_memory()
+        traced_growth = traced - traced_before if traced is not None and traced_before is not None else 0
+
+        if growth > 0:
+            request_memory_growth.inc(growth, endpoint=endpoint)
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {
+                    'requests': 0, 'rss_growth': 0, 'traced_growth': 0,
+                    'recent': deque(maxlen=self.window), 'recent_sum': 0
+                }
+            stats['requests'] += 1
+            stats['rss_growth'] += growth
+            stats['traced_growth'] += traced_growth
+            if len(stats['recent']) == self.window:
+                stats['recent_sum'] -= stats['recent'][0]
+            stats['recent'].append(growth)
+            stats['recent_sum'] += growth
+            full = len(stats['recent']) == self.window
+            mean_growth = stats['recent_sum'] / len(stats['recent'])
+
+        if full and mean_growth > self.growth_alert_bytes:
+            self._alert(endpoint, mean_growth)
+        return growth
+
+    def _alert(self, endpoint, mean_growth):
+        now = time.time()
+        with self._lock:
+            if now - self._last_alert.get(endpoint, 0) < self.cooldown:
+                return
+            self._last_alert[endpoint] = now
+            alert = {
+                'endpoint': endpoint,
+                'mean_growth_per_request': mean_growth,
+                'window': self.window,
+                'rss': current_rss(),
+                'at': now
+            }
+            self.alerts.append(alert)
+        memory_growth_alerts.inc(endpoint=endpoint)
+        logger.warning(f"Memory growth on {endpoint}: {mean_growth / 1024:.0f} KiB per request over the last "
+                       f"{self.window} requests, RSS now {alert['rss'] / 1024 ** 2:.0f} MiB")
+
+    @contextmanager
+    def track(self, label, top=10):
+        """Record RSS (and traced allocations while tracing) before and after a block, e.g. a model load"""
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS) if tracemalloc.is_tracing() else None
+        event = {'label': label, 'rss_before': current_rss(), 'started_at': time.time()}
+        start = time.perf_counter()
+        try:
+            yield event
+        finally:
+            event['seconds'] = time.perf_counter() - start
+            event['rss_after'] = current_rss()
+            event['rss_growth'] = event['rss_after'] - event['rss_before']
+            if snapshot is not None and tracemalloc.is_tracing():
+                after = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+                event['top_growth'] = [_describe_statistic(stat) for stat in after.compare_to(snapshot, 'lineno')[:top]]
+            self.events.append(event)
+            logger.info(f"{label}: RSS {event['rss_growth'] / 1024 ** 2:+.1f} MiB in {event['seconds']:.2f}s")
+
+    def start_tracing(self, frames=MemoryConfig.TRACEMALLOC_FRAMES):
+        """Turn tracemalloc on and keep a baseline for growth reports"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        logger.info(f"tracemalloc started with {frames} frames")
+
+    def stop_tracing(self):
+        self._baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+
+    def top_allocators(self, limit=20, group_by='lineno'):
+        """Largest live allocations and largest growth since tracing started"""
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+        top = {
+            'traced_current': current,
+            'traced_peak': peak,
+            'largest': [_describe_statistic(stat) for stat in snapshot.statistics(group_by)[:limit]]
+        }
+        if self._baseline is not None:
+            top['growth'] = [_describe_statistic(stat) for stat in snapshot.compare_to(self._baseline, group_by)[:limit]]
+        return top
+
+    def report(self, top=None):
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    'requests': stats['requests'],
+                    'rss_growth': stats['rss_growth'],
+                    'traced_growth': stats['traced_growth'],
+                    'recent_mean_growth': stats['recent_sum'] / len(stats['recent']) if stats['recent'] else 0
+                }
+                for endpoint, stats in self.endpoints.items()
+            }
+        report = {
+            'rss': current_rss(),
+            'peak_rss': peak_rss(),
+            'tracemalloc': tracemalloc.is_tracing(),
+            'growth_alert_bytes': self.growth_alert_bytes,
+            'endpoints': endpoints,
+            'alerts': list(self.alerts),
+            'events': list(self.events),
+            'sizes': self.sizes()
+        }
+        if top:
+            report['top_allocators'] = self.top_allocators(limit=top)
+        return report
+
+    def recent_alert(self):
+        """The last alert if it is still within the cooldown"""
+        if self.alerts and time.time() - self.alerts[-1]['at'] < self.cooldown:
+            return self.alerts[-1]
+        return None
+
+    def init_app(self, app):
+        """Track every request and register the /admin/memory endpoints"""
+        from auth.middleware import require_admin_token
+
+        @app.before_request
+        def start_memory_tracking():
+            g._memory_start = self.start_request()
+
+        @app.teardown_request
+        def finish_memory_tracking(exc):
+            start = g.pop('_memory_start', None)
+            if start is not None:
+                self.finish_request(request.endpoint or 'unmatched', start)
+
+        @app.route('/admin/memory', methods=['GET'])
+        @require_admin_token
+        def admin_memory():
+            return jsonify(self.report(top=int(request.args.get('top', 0)) or None))
+
+        @app.route('/admin/memory/tracemalloc', methods=['POST'])
+        @require_admin_token
+        def admin_tracemalloc():
+            data = request.get_json(silent=True) or {}
+            if data.get('enabled', True):
+                self.start_tracing(int(data.get('frames', MemoryConfig.TRACEMALLOC_FRAMES)))
+            else:
+                self.stop_tracing()
+            return jsonify({'tracemalloc': tracemalloc.is_tracing()})
+
+        metrics_registry.on_collect(lambda: process_rss.set(current_rss()))
+        app.memory_monitor = self
+        return self
+
+memory_monitor = MemoryMonitor()
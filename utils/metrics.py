@@ -2,6 +2,9 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import numpy as np
 import logging
 import json
+import threading
+import time
+import os
 from datetime import datetime
 
 class MetricsManager:
@@ -28,3 +31,209 @@ class MetricsManager:
         except Exception as e:
             self.logger.error(f"Error calculating metrics {str(e)}")
             raise
+
+class QualityConfig:
+    """Streaming model quality settings"""
+    #rolling windows reported for every ticker/model version, in days
+    WINDOW_DAYS = [int(days) for days in os.getenv('QUALITY_WINDOW_DAYS', '7,30,90').split(',')]
+    #window resolution; a window ends on a bucket boundary
+    BUCKET_SECONDS = int(os.getenv('QUALITY_BUCKET_SECONDS', '86400'))
+
+class RunningStats:
+    """
+    Running error sums of (actual, predicted) pairs.
+
+    The mean and squared deviation of the actual values are kept with
+    Welford's update so R2 stays accurate over long streams. Two stats merge
+    (and a merged one can be taken back out) with Chan's formula, which is
+    what lets a rolling window drop its oldest bucket without re-reading it.
+    """
+
+    __slots__ = ('count', 'mean_actual', 'm2_actual', 'sum_error', 'sum_sq_error', 'sum_abs_error',
+                 'direction_count', 'direction_hits')
+
+    def __init__(self):
+        self.count = 0
+        self.mean_actual = 0.0
+        self.m2_actual = 0.0
+        self.sum_error = 0.0
+        self.sum_sq_error = 0.0
+        self.sum_abs_error = 0.0
+        self.direction_count = 0
+        self.direction_hits = 0
+
+    def add(self, actual, predicted, reference=None):
+        """Add one outcome; reference is the last known price when the prediction was made"""
+        self.count += 1
+        delta = actual - self.mean_actual
+        self.mean_actual += delta / self.count
+        self.m2_actual += delta * (actual - self.mean_actual)
+
+        error = predicted - actual
+        self.sum_error += error
+        self.sum_sq_error += error * error
+        self.sum_abs_error += abs(error)
+
+        if reference is not None:
+            self.direction_count += 1
+            self.direction_hits += int(np.sign(predicted - reference) == np.sign(actual - reference))
+
+    def merge(self, other, sign=1):
+        """Add other's outcomes to these, or remove them with sign=-1"""
+        if not other.count:
+            return
+        count = self.count + sign * other.count
+        if count <= 0:
+            self.__init__()
+            return
+
+        if sign > 0:
+            delta = other.mean_actual - self.mean_actual
+            self.mean_actual += delta * other.count / count
+            self.m2_actual += other.m2_actual + delta * delta * self.count * other.count / count
+        else:
+            mean_actual = (self.count * self.mean_actual - other.count * other.mean_actual) / count
+            delta = other.mean_actual - mean_actual
+            self.m2_actual = max(0.0, self.m2_actual - other.m2_actual - delta * delta * count * other.count / self.count)
+            self.mean_actual = mean_actual
+        self.count = count
+
+        self.sum_error += sign * other.sum_error
+        self.sum_sq_error += sign * other.sum_sq_error
+        self.sum_abs_error += sign * other.sum_abs_error
+        self.direction_count += sign * other.direction_count
+        self.direction_hits += sign * other.direction_hits
+
+    def metrics(self):
+        if not self.count:
+            return {'count': 0}
+        mse = self.sum_sq_error / self.count
+        return {
+            'count': self.count,
+            'mse': mse,
+            'rmse': float(np.sqrt(mse)),
+            'mae': self.sum_abs_error / self.count,
+            'bias': self.sum_error / self.count,
+            'r2': 1 - self.sum_sq_error / self.m2_actual if self.m2_actual > 0 else None,
+            'directional_accuracy': self.direction_hits / self.direction_count if self.direction_count else None
+        }
+
+class _QualitySeries:
+    """Buckets and rolling window totals of one ticker/model version"""
+
+    def __init__(self, windows, bucket_seconds, now):
+        self.version = None
+        self.created_at = None
+        self.bucket_seconds = bucket_seconds
+        self.buckets = {} #bucket start -> RunningStats
+        self.since_start = RunningStats() #every outcome recorded, whatever its age
+        #window seconds -> [total, start of the oldest bucket in it], shortest first
+        self.windows = {seconds: [RunningStats(), self._cutoff(seconds, now)] for seconds in windows}
+
+    def _cutoff(self, seconds, now):
+        return (int(now - seconds) // self.bucket_seconds + 1) * self.bucket_seconds
+
+    def add(self, at, actual, predicted, reference):
+        self.since_start.add(actual, predicted, reference)
+        bucket = int(at) // self.bucket_seconds * self.bucket_seconds
+        longest_cutoff = self.windows[max(self.windows)][1]
+        if bucket < longest_cutoff:
+            return
+        stats = RunningStats()
+        stats.add(actual, predicted, reference)
+        self.buckets.setdefault(bucket, RunningStats()).merge(stats)
+        for total, cutoff in self.windows.values():
+            if bucket >= cutoff:
+                total.merge(stats)
+
+    def expire(self, now):
+        """Move every window forward to now, taking out the buckets that fell off"""
+        longest = max(self.windows)
+        for seconds, window in self.windows.items():
+            total, cutoff = window
+            new_cutoff = self._cutoff(seconds, now)
+            if new_cutoff - cutoff >= seconds:
+                #idle longer than the window; nothing of the old total survives
+                total.__init__()
+                for bucket, stats in self.buckets.items():
+                    if bucket >= new_cutoff:
+                        total.merge(stats)
+            else:
+                for bucket in range(cutoff, new_cutoff, self.bucket_seconds):
+                    if bucket in self.buckets:
+                        total.merge(self.buckets[bucket], sign=-1)
+            window[1] = max(cutoff, new_cutoff)
+            if seconds == longest:
+                for bucket in [b for b in self.buckets if b < window[1]]:
+                    del self.buckets[bucket]
+
+class ModelQualityTracker:
+    """
+    Streaming prediction accuracy per ticker and model.
+
+    Series are keyed by model_id rather than version string, since every
+    retrain of a ticker keeps the same version and would otherwise be
+    merged with the models before it.
+
+    record() is called as actual prices arrive for past predictions; each
+    outcome updates a since-start RunningStats, the bucket of its target
+    time and the total of every rolling window it falls in. Queries read those
+    totals, dropping buckets that aged out of a window since the last call,
+    so their cost does not depend on how many outcomes were recorded.
+    """
+
+    def __init__(self, window_days=QualityConfig.WINDOW_DAYS, bucket_seconds=QualityConfig.BUCKET_SECONDS):
+        self.windows = {f"{days}d": days * 86400 for days in sorted(window_days)}
+        self.bucket_seconds = bucket_seconds
+        self.started_at = time.time()
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, ticker, model_id, actual, predicted, reference=None, at=None, now=None,
+               version=None, created_at=None):
+        """Add the outcome of one prediction; at is its target time (epoch seconds), default now"""
+        now = time.time() if now is None else now
+        at = now if at is None else at
+        key = (ticker, model_id)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _QualitySeries(self.windows.values(), self.bucket_seconds, now)
+            series.version = version or series.version
+            series.created_at = created_at or series.created_at
+            series.expire(now)
+            series.add(at, float(actual), float(predicted), None if reference is None else float(reference))
+
+    def metrics(self, ticker, model_id, window=None, now=None):
+        """Metrics of one ticker/model over a window name ('7d') or since start; None if never recorded"""
+        now = time.time() if now is None else now
+        with self._lock:
+            series = self._series.get((ticker, model_id))
+            if series is None:
+                return None
+            if window is None:
+                return series.since_start.metrics()
+            series.expire(now)
+            return series.windows[self.windows[window]][0].metrics()
+
+    def report(self, ticker=None, model_id=None, version=None, now=None):
+        """Every window of the matching ticker/models, oldest model first"""
+        now = time.time() if now is None else now
+        with self._lock:
+            series = {key: (value.version, value.created_at) for key, value in self._series.items()
+                      if (ticker is None or key[0] == ticker) and (model_id is None or key[1] == model_id)
+                      and (version is None or value.version == version)}
+        report = []
+        for key, (model_version, created_at) in sorted(series.items(), key=lambda item: (item[0][0], item[1][1] or '', item[0][1])):
+            entry = {'ticker': key[0], 'model_id': key[1], 'model_version': model_version,
+                     'model_created_at': created_at, 'since_start': self.metrics(*key, now=now)}
+            for name in self.windows:
+                entry[name] = self.metrics(*key, window=name, now=now)
+            report.append(entry)
+        return report
+
+    def series_count(self):
+        with self._lock:
+            return len(self._series)
+
+model_quality = ModelQualityTracker()
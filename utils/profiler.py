@@ -0,0 +1,414 @@
+from flask import g, request, jsonify, Response
+from auth.middleware import require_admin_token, is_admin_request
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import threading
+import cProfile
+import pstats
+import logging
+import time
+import json
+import uuid
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+class ProfilerConfig:
+    """On-demand and background profiling settings"""
+    OUTPUT_DIR = os.getenv('PROFILE_DIR', 'logs/profiles')
+    #seconds between stack samples of a profiled request
+    SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+    #seconds between samples of the always-on sampler, 0 turns it off
+    BACKGROUND_INTERVAL = float(os.getenv('PROFILE_BACKGROUND_INTERVAL', '0.1'))
+    #distinct stacks kept by a sampler; samples of new stacks beyond this are only counted
+    MAX_STACKS = int(os.getenv('PROFILE_MAX_STACKS', '5000'))
+    #how often a worker looks for a session armed through another worker
+    POLL_SECONDS = float(os.getenv('PROFILE_POLL_SECONDS', '2'))
+    MAX_REQUESTS = 100
+    MAX_SECONDS = 3600
+
+MODES = ('sample', 'cprofile')
+
+#profiling run of the current request; pool jobs see it through their copy of the request's context
+_active_run = ContextVar('profile_run', default=None)
+
+def fold_stack(frame, limit=128):
+    """Frame chain as a folded stack (root first, ';' separated), the flame graph input format"""
+    parts = []
+    while frame is not None and len(parts) < limit:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+class StackSampler:
+    """
+    Statistical profiler that samples thread stacks from its own thread.
+
+    Every interval it reads sys._current_frames() and counts the folded
+    stack of each selected thread, so the profiled code runs unmodified
+    and the cost is paid by the sampler thread only.
+    """
+
+    def __init__(self, interval, thread_ids=None, max_stacks=ProfilerConfig.MAX_STACKS):
+        self.interval = interval
+        #a set of thread idents, or a callable returning one; None samples every thread
+        self.thread_ids = thread_ids
+        self.max_stacks = max_stacks
+        self.counts = Counter()
+        self.samples = 0
+        self.overflow = 0
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def sample(self):
+        own = threading.get_ident()
+        selected = self.thread_ids() if callable(self.thread_ids) else self.thread_ids
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (selected is not None and thread_id not in selected):
+                continue
+            stack = fold_stack(frame)
+            self.samples += 1
+            if stack in self.counts or len(self.counts) < self.max_stacks:
+                self.counts[stack] += 1
+            else:
+                self.overflow += 1
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.sample()
+
+    def folded(self):
+        """Folded stacks with counts, ready for flamegraph.pl or speedscope"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.counts.most_common()) + '\n'
+
+    def top_functions(self, limit=20):
+        """
+        Functions by share of samples on top of the stack (self), with their
+        share anywhere in it (total).
+
+        Ranking by self time keeps the server and framework frames that sit
+        under every request out of the list.
+        """
+        own, total = Counter(), Counter()
+        for stack, count in list(self.counts.items()):
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        samples = max(self.samples, 1)
+        ranked = sorted(own, key=lambda function: (own[function], total[function]), reverse=True)
+        return [
+            {'function': function, 'total': total[function] / samples, 'self': own[function] / samples}
+            for function in ranked[:limit]
+        ]
+
+class Profiler:
+    """
+    Profiles live requests on demand.
+
+    A session armed through /admin/profile (or a request sending
+    X-Profile with a valid X-Admin-Token) profiles the next N requests or
+    every request until a deadline, with the stack sampler or cProfile.
+    Sessions are shared through redis so every worker takes part; each
+    worker looks for one at most every POLL_SECONDS, so when no session
+    is armed a request only pays a clock comparison. Output goes to
+    OUTPUT_DIR/<session>/ as .folded (sampler) or .prof (cProfile) files.
+    """
+
+    SESSION_KEY = 'profiler:session'
+
+    def __init__(self, output_dir=ProfilerConfig.OUTPUT_DIR, poll_seconds=ProfilerConfig.POLL_SECONDS):
+        self.output_dir = output_dir
+        self.poll_seconds = poll_seconds
+        self.app = None
+        self.background = None
+        self._session = None
+        self._checked_at = None
+        self._local_remaining = 0
+        self._lock = threading.Lock()
+        #cProfile can only profile one request at a time
+        self._cprofile_lock = threading.Lock()
+        #threads currently serving a request, the background sampler only looks at these
+        self.request_threads = set()
+
+    @property
+    def redis_client(self):
+        return getattr(self.app, 'redis_client', None) if self.app is not None else None
+
+    def remaining_key(self, session_id):
+        return f"{self.SESSION_KEY}:{session_id}:remaining"
+
+    def arm(self, mode='sample', requests=None, seconds=None, endpoints=None):
+        """Start a profiling session for the next requests and/or a time window"""
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if not requests and not seconds:
+            requests = 1
+        requests = min(int(requests), ProfilerConfig.MAX_REQUESTS) if requests else None
+        seconds = min(float(seconds), ProfilerConfig.MAX_SECONDS) if seconds else None
+        session = {
+            'id': datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S') + '_' + uuid.uuid4().hex[:6],
+            'mode': mode,
+            'requests': requests,
+            'until': time.time() + seconds if seconds else None,
+            'endpoints': list(endpoints) if endpoints else None
+        }
+        ttl = int(seconds or ProfilerConfig.MAX_SECONDS)
+
+        shared = False
+        redis_client = self.redis_client
+        if redis_client:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.set(self.SESSION_KEY, json.dumps(session), ex=ttl)
+                if requests:
+                    pipe.set(self.remaining_key(session['id']), requests, ex=ttl)
+                pipe.execute()
+                shared = True
+            except Exception as e:
+                logger.error(f"Error sharing profiling session, profiling this worker only: {str(e)}")
+        session['shared'] = shared
+        with self._lock:
+            self._local_remaining = requests or 0
+            self._session = session
+            self._checked_at = time.monotonic()
+        logger.info(f"Profiling session {session['id']} armed: {mode}, requests={requests}, seconds={seconds}")
+        return session
+
+    def disarm(self):
+        redis_client = self.redis_client
+        if redis_client:
+            try:
+                redis_client.delete(self.SESSION_KEY)
+            except Exception as e:
+                logger.error(f"Error removing profiling session: {str(e)}")
+        with self._lock:
+            self._session = None
+            self._checked_at = time.monotonic()
+
+    def current_session(self):
+        """The armed session, read from redis at most every poll_seconds"""
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.poll_seconds:
+            self._checked_at = now
+            redis_client = self.redis_client
+            if redis_client and (self._session is None or self._session.get('shared')):
+                try:
+                    value = redis_client.get(self.SESSION_KEY)
+                    self._session = json.loads(value) if value else None
+                except Exception as e:
+                    logger.error(f"Error reading profiling session: {str(e)}")
+        session = self._session
+        if session and session['until'] and time.time() > session['until']:
+            return None
+        return session
+
+    def _claim(self, session):
+        """Take one of the session's remaining requests"""
+        if not session['requests']:
+            return True
+        redis_client = self.redis_client
+        if redis_client and session.get('shared'):
+            remaining = redis_client.decr(self.remaining_key(session['id']))
+            if remaining <= 0:
+                #this process stops looking right away; others notice within poll_seconds
+                redis_client.delete(self.SESSION_KEY)
+                self._session = None
+            return remaining >= 0
+        with self._lock:
+            self._local_remaining -= 1
+            if self._local_remaining <= 0:
+                self._session = None
+            return self._local_remaining >= 0
+
+    def start_request(self, endpoint):
+        """Start profiling the current request if a session or X-Profile asks for it"""
+        mode = request.headers.get('X-Profile')
+        session = None
+        if mode:
+            if mode not in MODES or not is_admin_request():
+                return None
+        else:
+            session = self.current_session()
+            if session is None:
+                return None
+            if session['endpoints'] and endpoint not in session['endpoints']:
+                return None
+            mode = session['mode']
+
+        if mode == 'cprofile' and not self._cprofile_lock.acquire(blocking=False):
+            return None
+        try:
+            claimed = session is None or self._claim(session)
+        except Exception as e:
+            logger.error(f"Error claiming a profiled request: {str(e)}")
+            claimed = False
+        if not claimed:
+            if mode == 'cprofile':
+                self._cprofile_lock.release()
+            return None
+
+        run = {'mode': mode, 'session_id': session['id'] if session else 'adhoc', 'endpoint': endpoint}
+        if mode == 'cprofile':
+            run['profile'] = cProfile.Profile()
+            run['helpers'] = []
+            run['profile'].enable()
+        else:
+            run['sampler'] = StackSampler(ProfilerConfig.SAMPLE_INTERVAL, {threading.get_ident()}).start()
+        return run
+
+    @contextmanager
+    def follow(self):
+        """
+        Profile the calling thread as part of the request that handed it work.
+
+        Worker pools run jobs with a copy of the request's context, so the
+        job finds the request's run: its sampler also samples this thread,
+        or a cProfile run gets this thread's profile merged in. The
+        background sampler looks at the thread while the job runs.
+        """
+        ident = threading.get_ident()
+        run = _active_run.get()
+        profile = None
+        self.request_threads.add(ident)
+        if run is not None:
+            if run['mode'] == 'cprofile':
+                profile = cProfile.Profile()
+                profile.enable()
+            else:
+                run['sampler'].thread_ids.add(ident)
+        try:
+            yield
+        finally:
+            self.request_threads.discard(ident)
+            if profile is not None:
+                profile.disable()
+                run['helpers'].append(profile)
+            elif run is not None:
+                run['sampler'].thread_ids.discard(ident)
+
+    def finish_request(self, run):
+        """Stop a request's profiler and write its output file"""
+        directory = os.path.join(self.output_dir, run['session_id'])
+        name = f"{datetime.now(timezone.utc).strftime('%H%M%S_%f')}_{run['endpoint']}_{os.getpid()}"
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if run['mode'] == 'cprofile':
+                run['profile'].disable()
+                path = os.path.join(directory, f"{name}.prof")
+                stats = pstats.Stats(run['profile'])
+                for profile in list(run['helpers']):
+                    stats.add(profile)
+                stats.dump_stats(path)
+            else:
+                run['sampler'].stop()
+                path = os.path.join(directory, f"{name}.folded")
+                with open(path, 'w') as f:
+                    f.write(run['sampler'].folded())
+            return path
+        except Exception as e:
+            logger.error(f"Error writing profile: {str(e)}")
+            return None
+        finally:
+            if run['mode'] == 'cprofile':
+                self._cprofile_lock.release()
+
+    def list_profiles(self, session_id=None):
+        """Profile files written so far, newest session first"""
+        if not os.path.isdir(self.output_dir):
+            return []
+        sessions = [session_id] if session_id else sorted(os.listdir(self.output_dir), reverse=True)
+        files = []
+        for session in sessions:
+            directory = os.path.join(self.output_dir, session)
+            if os.path.isdir(directory):
+                files.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory)))
+        return files
+
+    def init_app(self, app):
+        """Hook requests and register the /admin/profile endpoints"""
+        self.app = app
+
+        @app.before_request
+        def start_request_profile():
+            self.request_threads.add(threading.get_ident())
+            run = self.start_request(request.endpoint or 'unmatched')
+            if run is not None:
+                g._profile_run = run
+                g._profile_token = _active_run.set(run)
+
+        @app.teardown_request
+        def finish_request_profile(exc):
+            self.request_threads.discard(threading.get_ident())
+            run = g.pop('_profile_run', None)
+            if run is not None:
+                token = g.pop('_profile_token', None)
+                if token is not None:
+                    try:
+                        _active_run.reset(token)
+                    except ValueError:
+                        #teardown ran in a different context than before_request
+                        _active_run.set(None)
+                path = self.finish_request(run)
+                if path:
+                    logger.info(f"Request profile written to {path}")
+
+        @app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+        @require_admin_token
+        def admin_profile():
+            if request.method == 'POST':
+                data = request.get_json(silent=True) or {}
+                try:
+                    session = self.arm(
+                        mode=data.get('mode', 'sample'),
+                        requests=data.get('requests'),
+                        seconds=data.get('seconds'),
+                        endpoints=data.get('endpoints')
+                    )
+                except (TypeError, ValueError) as e:
+                    return jsonify({'error': str(e)}), 400
+                return jsonify({'session': session}), 201
+            if request.method == 'DELETE':
+                self.disarm()
+                return jsonify({'message': 'Profiling session stopped'})
+            return jsonify({
+                'session': self.current_session(),
+                'profiles': self.list_profiles(request.args.get('session'))
+            })
+
+        @app.route('/admin/profile/hot', methods=['GET'])
+        @require_admin_token
+        def admin_profile_hot():
+            if self.background is None:
+                return jsonify({'error': 'Background sampler is disabled'}), 404
+            if request.args.get('format') == 'folded':
+                return Response(self.background.folded(), mimetype='text/plain')
+            return jsonify({
+                'interval': self.background.interval,
+                'samples': self.background.samples,
+                'distinct_stacks': len(self.background.counts),
+                'overflow': self.background.overflow,
+                'functions': self.background.top_functions(int(request.args.get('limit', 20)))
+            })
+
+        if ProfilerConfig.BACKGROUND_INTERVAL > 0 and self.background is None:
+            #only threads serving a request, idle workers would drown out the hot paths
+            self.background = StackSampler(ProfilerConfig.BACKGROUND_INTERVAL, lambda: self.request_threads).start()
+        app.profiler = self
+        return self
+
+profiler = Profiler()
@@ -0,0 +1,115 @@
+from flask import g, request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from utils.instrumentation import metrics_registry
+import time
+import os
+
+#add a Server-Timing header to every response, not only to requests asking for it with ?timing=true
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+
+stage_duration = metrics_registry.histogram(
+    'pipeline_stage_seconds', 'Wall time of a StockPredictor pipeline stage', ('pipeline', 'stage'))
+stage_cpu = metrics_registry.counter(
+    'pipeline_stage_cpu_seconds_total', 'CPU time of the calling thread in a pipeline stage', ('pipeline', 'stage'))
+stage_rows = metrics_registry.counter(
+    'pipeline_stage_rows_total', 'Rows produced by a pipeline stage', ('pipeline', 'stage'))
+stage_bytes = metrics_registry.counter(
+    'pipeline_stage_bytes_total', 'Bytes of the data produced by a pipeline stage', ('pipeline', 'stage'))
+
+#spans of the current request, None outside a traced request
+_current_spans = ContextVar('current_spans', default=None)
+
+def describe_output(output):
+    """Rows and bytes of a stage's result (the first item of a tuple)"""
+    if isinstance(output, tuple) and output:
+        output = output[0]
+    if hasattr(output, 'memory_usage') and hasattr(output, 'shape'):
+        #DataFrame; shallow usage is cheap and counts the numeric blocks
+        return output.shape[0], int(output.memory_usage(index=True).sum())
+    if hasattr(output, 'nbytes') and hasattr(output, 'shape'):
+        return (output.shape[0] if output.shape else 1), int(output.nbytes)
+    return None, None
+
+@contextmanager
+def span(pipeline, stage):
+    """
+    Time one pipeline stage.
+
+    Wall and CPU time are measured around the block; the block can set
+    'rows' and 'bytes' on the yielded dict (see describe_output). The span
+    is added to the stage metrics and, inside a traced request, to the
+    request's spans.
+    """
+    record = {'pipeline': pipeline, 'stage': stage, 'rows': None, 'bytes': None}
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield record
+    finally:
+        record['wall_ms'] = (time.perf_counter() - wall_start) * 1000
+        record['cpu_ms'] = (time.thread_time() - cpu_start) * 1000
+
+        stage_duration.observe(record['wall_ms'] / 1000, pipeline=pipeline, stage=stage)
+        stage_cpu.inc(record['cpu_ms'] / 1000, pipeline=pipeline, stage=stage)
+        if record['rows'] is not None:
+            stage_rows.inc(record['rows'], pipeline=pipeline, stage=stage)
+        if record['bytes'] is not None:
+            stage_bytes.inc(record['bytes'], pipeline=pipeline, stage=stage)
+
+        spans = _current_spans.get()
+        if spans is not None:
+            spans.append(record)
+
+def run_stage(pipeline, fn, *args, **kwargs):
+    """Call fn inside a span named after it and record the size of its result"""
+    with span(pipeline, fn.__name__) as record:
+        result = fn(*args, **kwargs)
+        record['rows'], record['bytes'] = describe_output(result)
+    return result
+
+def start_trace():
+    """Collect spans for the current context until end_trace()"""
+    return _current_spans.set([])
+
+def end_trace(token):
+    spans = _current_spans.get()
+    try:
+        _current_spans.reset(token)
+    except ValueError:
+        #ended from another context (e.g. after a streamed response)
+        _current_spans.set(None)
+    return spans or []
+
+def get_spans():
+    """Spans recorded so far in the current request"""
+    return list(_current_spans.get() or [])
+
+def server_timing(spans):
+    """Server-Timing header value, one metric per span in the order they ran"""
+    return ', '.join(
+        f"{record['pipeline']}-{record['stage']};dur={record['wall_ms']:.1f}" for record in spans
+    )
+
+def timing_requested():
+    return request.args.get('timing', 'false').lower() == 'true'
+
+def init_tracing(app):
+    """Collect pipeline spans per request and report them in a Server-Timing header"""
+
+    @app.before_request
+    def start_request_trace():
+        g._trace_token = start_trace()
+
+    @app.after_request
+    def add_server_timing(response):
+        spans = get_spans()
+        if spans and (SERVER_TIMING_ENABLED or timing_requested()):
+            response.headers['Server-Timing'] = server_timing(spans)
+        return response
+
+    @app.teardown_request
+    def end_request_trace(exc):
+        token = g.pop('_trace_token', None)
+        if token is not None:
+            end_trace(token)